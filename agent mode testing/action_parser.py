@@ -0,0 +1,116 @@
+# action_parser.py
+# Incremental extraction of JSON file actions from a streamed agent reply
+
+import json
+import re
+
+ACTIONS = ("create_file", "modify_file")
+
+# Characters that can change the scanner's state
+_SPECIAL = re.compile(r'[{}"\\]')
+_FILENAME = re.compile(r'"filename"\s*:\s*"((?:[^"\\]|\\.)*)"')
+
+class ActionParser:
+    """Finds complete action objects in a reply while it is still streaming.
+
+    ``feed`` scans only the new text, tracking brace depth and string state,
+    so the total cost is linear in the reply. When a top-level object
+    closes, just that span is decoded; if it is a ``create_file`` or
+    ``modify_file`` action it is returned at once, so several actions in
+    one reply are found one by one as the model produces them. A ``{`` in
+    prose that does not begin a JSON object (``{x}``, ``{ like this``) is
+    dropped as soon as its next character shows it is not one.
+
+    ``pending_filename`` names the file of the action being streamed, for
+    progress display, and ``text`` collects everything outside actions.
+    """
+
+    def __init__(self):
+        self.depth = 0
+        self.in_string = False
+        self.escape = False
+        self.pending_filename = None
+        self._object = []  # chunks of the object being scanned
+        self._fresh = False  # just saw the opening brace of a candidate
+        self._prose = []
+
+    @property
+    def text(self):
+        return "".join(self._prose)
+
+    def feed(self, chunk):
+        """Scan ``chunk``; returns the list of actions completed by it."""
+        actions = []
+        start = 0  # start of the part of ``chunk`` not yet copied out
+        pos = 0
+        while pos < len(chunk):
+            if self._fresh:
+                stripped = chunk[pos:].lstrip()
+                if not stripped:
+                    break
+                self._fresh = False
+                if stripped[0] not in '"}':
+                    # Not a JSON object after all; it was prose
+                    self._prose.append("".join(self._object) + chunk[start:pos])
+                    self._object = []
+                    self.depth = 0
+                    continue
+            if self.depth == 0:
+                brace = chunk.find("{", pos)
+                if brace == -1:
+                    self._prose.append(chunk[pos:])
+                    return actions
+                self._prose.append(chunk[pos:brace])
+                start, pos = brace, brace + 1
+                self.depth = 1
+                self._object = []
+                self._fresh = True
+                continue
+            if self.escape:
+                # The character after a backslash, possibly at the start of this chunk
+                self.escape = False
+                pos += 1
+                continue
+            match = _SPECIAL.search(chunk, pos)
+            if match is None:
+                break
+            char, pos = match.group(), match.end()
+            if self.in_string:
+                if char == "\\":
+                    self.escape = True
+                elif char == '"':
+                    self.in_string = False
+            elif char == '"':
+                self.in_string = True
+            elif char == "{":
+                self.depth += 1
+            elif char == "}":
+                self.depth -= 1
+                if self.depth == 0:
+                    self._object.append(chunk[start:pos])
+                    action = self._decode("".join(self._object))
+                    self._object = []
+                    self.pending_filename = None
+                    if action is not None:
+                        actions.append(action)
+                    start = pos
+        if self.depth:
+            self._object.append(chunk[start:])
+            # Only the head of an object is searched, so a huge object
+            # without a filename does not make this quadratic
+            if self.pending_filename is None and len(self._object) < 128:
+                found = _FILENAME.search("".join(self._object))
+                if found:
+                    self.pending_filename = found.group(1)
+        return actions
+
+    def _decode(self, span):
+        try:
+            data = json.loads(span)
+        except ValueError:
+            self._prose.append(span)
+            return None
+        if isinstance(data, dict) and data.get("action") in ACTIONS:
+            return data
+        self._prose.append(span)
+        return None
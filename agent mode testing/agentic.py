@@ -2,10 +2,14 @@
 # Manages agentic workflows for PyLlamaUI, implementing the Offline System Agent persona
 
 from collections import deque
-import json
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 import os
-import re
+import threading
+import time
+from action_parser import ActionParser
 from api import OllamaAPI
+from tracing import Tracer
+from workspace import Workspace, WorkspaceError
 
 SYSTEM_PROMPT = """You are an OFFLINE SYSTEM AGENT embedded inside a Python desktop application named PyLlamaUI.
 
@@ -71,95 +75,286 @@ Decision rules:
 """
 
 class AgenticWorkflow:
-    def __init__(self, api: OllamaAPI):
-        """Initialize the agentic workflow."""
+    def __init__(self, api: OllamaAPI, options: dict = None, max_parallel: int = 2,
+                 max_results: int = 100, workspace: Workspace = None, tracer: Tracer = None,
+                 deadline: float = None):
+        """Initialize the agentic workflow.
+
+        ``options`` are Ollama generation options sent with every request;
+        a fixed ``seed`` or ``temperature`` 0 makes runs repeatable and lets
+        the API's response cache answer repeated tasks.
+
+        The persona is sent as Ollama's ``system`` field rather than pasted
+        in front of each prompt. It is the same leading text on every
+        request, so after ``prime`` has evaluated it once Ollama reuses it
+        from its KV cache and only the user's text needs prompt evaluation.
+
+        Up to ``max_parallel`` independent tasks run at once; match it to
+        the number of requests Ollama serves in parallel
+        (``OLLAMA_NUM_PARALLEL``). The last ``max_results`` finished tasks
+        are kept in ``results``.
+
+        File actions can only touch paths inside ``workspace`` (by default
+        the current directory), and all actions of one reply are written as
+        a single transaction.
+
+        Every task is traced as a span in ``tracer`` with its queue wait,
+        time to first token, generation, parse and write times and Ollama's
+        token counts; pass a ``Tracer(path)`` to stream them to a JSONL file.
+
+        ``deadline`` bounds each task's generation in seconds of wall-clock
+        time; a task that runs past it is closed like a stopped one and
+        fails without writing anything.
+        """
         self.api = api
+        self.options = options
+        self.system = SYSTEM_PROMPT
+        self.primed = False
+        self.prime_stats = {}
+        self.max_parallel = max_parallel
         self.task_queue = deque()
-        self.results = []
+        self.results = deque(maxlen=max_results)
+        self.last_run = []
+        self._next_id = 0
+        self.workspace = workspace or Workspace(os.getcwd())
+        self.tracer = tracer or Tracer()
+        self.deadline = deadline
+
+    def add_task(self, task_type: str, prompt: str, depends_on=None):
+        """Add a task to the queue and return its id.
 
-    def add_task(self, task_type: str, prompt: str, depends_on: int = None):
-        """Add a task to the queue. 
-        Note: task_type and depends_on are kept for compatibility but 'process' is the main logic now.
+        ``depends_on`` is a task id or a list of them; the task starts once
+        those have finished, and their outputs are appended to its prompt.
         """
+        if depends_on is None:
+            depends_on = []
+        elif isinstance(depends_on, int):
+            depends_on = [depends_on]
+        queued = {task['id'] for task in self.task_queue}
+        for dep in depends_on:
+            if dep not in queued and self._finished(dep) is None:
+                raise ValueError(f"Task depends on unknown task {dep}")
+        task_id = self._next_id
+        self._next_id += 1
         self.task_queue.append({
+            'id': task_id,
             'type': task_type,
             'prompt': prompt,
-            'depends_on': depends_on
+            'depends_on': list(depends_on),
         })
+        return task_id
+
+    def _finished(self, task_id):
+        for record in self.results:
+            if record['id'] == task_id:
+                return record
+        return None
+
+    def _fields(self, **options):
+        options = {**(self.options or {}), **options}
+        return {"system": self.system, "options": options} if options else {"system": self.system}
+
+    def prime(self):
+        """Evaluate the persona once so later tasks find it in the KV cache."""
+        span = self.tracer.start("prime")
+        fields = self._fields(num_predict=1)
+        # Without a seed or temperature 0 the reply is not cacheable: a cached
+        # one would leave the server without the persona in its KV cache
+        fields["options"] = {name: value for name, value in fields["options"].items()
+                             if name not in ("seed", "temperature")}
+        response, stats = self.api.generate("Ready?", **fields)
+        self.primed = not response.startswith("Error:")
+        if self.primed:
+            self.prime_stats = stats
+        span.ollama(stats)
+        self.tracer.finish(span, status="done" if self.primed else "failed")
+        return self.primed
+
+    def prompt_eval_summary(self, records=None):
+        """One line of prompt-eval totals for task ``records`` (default: the last run)."""
+        records = [r for r in (self.last_run if records is None else records) if r.get('stats')]
+        if not records:
+            return ""
+        tokens = sum(r['stats'].get("prompt_eval_count", 0) for r in records)
+        ms = sum(r['stats'].get("prompt_eval_duration", 0) for r in records) / 1e6
+        return f"Prompt eval: {tokens} tokens in {ms:.0f} ms over {len(records)} task(s)"
 
-    def run_tasks(self):
-        """Process tasks in the queue."""
-        while self.task_queue:
-            task = self.task_queue.popleft()
-            result = self._process_request(task['prompt'])
-            self.results.append(result)
-            yield result
-
-    def _process_request(self, user_prompt: str):
-        """Send prompt to LLM with System Prompt and handle response (JSON or Text)."""
-        full_prompt = f"{SYSTEM_PROMPT}\n\nUser: \"{user_prompt}\""
-        
-        # Send to API (non-streaming for logic handling)
-        response = self.api.send_prompt(full_prompt, stream=False)
-        
-        if isinstance(response, str) and "Error" in response:
-            return response
-
-        # Attempt to detect and parse JSON for file operations
+    def run_tasks(self, stop=None, progress=None):
+        """Run the queued tasks and yield each result as soon as it is ready.
+
+        Tasks form a DAG through ``depends_on``; every task whose
+        dependencies are done is started, up to ``max_parallel`` at a time.
+        A task whose dependency failed or was cancelled is skipped. Setting
+        ``stop`` (a ``threading.Event``) cancels the tasks not yet started
+        and closes the connections of those running at once, so Ollama
+        stops generating for them. ``progress`` is called
+        from worker threads with short status lines while tasks generate.
+        """
+        tasks = {task['id']: task for task in self.task_queue}
+        self.task_queue.clear()
+        self.last_run = []
+        # Spans start now, so queue wait includes waiting for dependencies
+        spans = {task['id']: self.tracer.start("task", id=task['id'], type=task['type'],
+                                               depends_on=task['depends_on'])
+                 for task in tasks.values()}
+        if not self.primed and tasks:
+            self.prime()
+        # Dependencies on earlier runs are looked up once, now: ``results`` is
+        # bounded, and a record evicted while this run goes on would leave
+        # its dependants waiting forever
+        earlier = {dep: self._finished(dep) or {'id': dep, 'status': "unknown", 'output': None}
+                   for task in tasks.values() for dep in task['depends_on'] if dep not in tasks}
+        waiting = dict(tasks)
+        running = {}
+        with ThreadPoolExecutor(max_workers=self.max_parallel, thread_name_prefix="agent") as pool:
+            while waiting or running:
+                if stop is not None and stop.is_set():
+                    for task_id in waiting:
+                        yield self._store(tasks[task_id], "cancelled", "**Cancelled**", span=spans[task_id])
+                    waiting.clear()
+                for task_id in list(waiting):
+                    if len(running) >= self.max_parallel:
+                        break
+                    deps = [self._dependency(dep, tasks, earlier) for dep in tasks[task_id]['depends_on']]
+                    if any(dep is None for dep in deps):
+                        continue
+                    del waiting[task_id]
+                    failed = [dep for dep in deps if dep['status'] != "done"]
+                    if failed:
+                        yield self._store(tasks[task_id], "skipped",
+                                          f"**Skipped**: task {failed[0]['id']} did not complete.",
+                                          span=spans[task_id])
+                        continue
+                    future = pool.submit(self._run_task, tasks[task_id], deps, stop, progress, spans[task_id])
+                    running[future] = task_id
+                if not running:
+                    continue
+                done, _ = wait(running, timeout=0.1, return_when=FIRST_COMPLETED)
+                for future in done:
+                    task = tasks[running.pop(future)]
+                    output, stats, result = future.result()
+                    status = "cancelled" if stop is not None and stop.is_set() else \
+                        ("failed" if output is None else "done")
+                    yield self._store(task, status, result, output, stats, spans[task['id']])
+
+    def _dependency(self, task_id, tasks, earlier):
+        """The finished record of ``task_id``, or None while it is still pending.
+
+        ``earlier`` holds the records of dependencies from previous runs; one
+        no longer in ``results`` counts as not completed.
+        """
+        if task_id not in tasks:
+            return earlier[task_id]
+        for record in self.last_run:
+            if record['id'] == task_id:
+                return record
+        return None
+
+    def _store(self, task, status, result, output=None, stats=None, span=None):
+        record = {'id': task['id'], 'prompt': task['prompt'], 'status': status,
+                  'output': output, 'result': result, 'stats': stats or {}}
+        if span is not None:
+            span.ollama(record['stats'])
+            self.tracer.finish(span, status=status)
+        self.results.append(record)
+        self.last_run.append(record)
+        return result
+
+    def _run_task(self, task, deps, stop, progress=None, span=None):
+        """Worker thread: returns ``(raw output or None, stats, result text)``.
+
+        The reply is streamed through an ``ActionParser``; each file action
+        is staged in a workspace transaction as soon as its JSON object
+        closes, while the model is still generating the rest, and reported
+        through ``progress``. The transaction is committed once the reply is
+        complete and rolled back if it is cancelled or fails.
+        """
+        span = span or self.tracer.start("task", id=task['id'], type=task['type'])
+        started = time.perf_counter()
+        span.thread = threading.current_thread().name
+        span.phase("queue_wait", span.start, started)
+        prompt = task['prompt']
+        if deps:
+            upstream = "\n\n".join(f"Task {dep['id']} result:\n{dep['output']}" for dep in deps)
+            prompt = f"{prompt}\n\nResults of earlier tasks:\n{upstream}"
+        parser = ActionParser()
+        transaction = self.workspace.transaction()
+        done = []
+        announced = None
+        stats = {}
+        parts = []
+        first = None
+        # Stop closes the connection straight away, even before the first chunk
+        stream = self.api.generate_stream(prompt, stats=stats, cancel=stop, deadline=self.deadline,
+                                          **self._fields())
         try:
-            # We look for a JSON object in the response
-            # This regex finds the first outer-most JSON object
-            json_match = re.search(r'\{.*\}', response, re.DOTALL)
-            
-            if json_match:
-                json_str = json_match.group(0)
-                data = json.loads(json_str)
-                
-                if data.get("action") in ["create_file", "modify_file"]:
-                    return self._handle_file_op(data)
-            
-            # If no valid JSON action found, return as plain text
-            return f"**Agent Response**:\n{response}"
-            
-        except json.JSONDecodeError:
-            # If JSON parsing fails, treat as plain text
-            return f"**Agent Response**:\n{response}"
-        except Exception as e:
-            return f"**Error processing response**: {str(e)}"
-
-    def _handle_file_op(self, data):
-        """Execute file creation or modification safely."""
+            for chunk in stream:
+                if stop is not None and stop.is_set():
+                    break
+                if first is None:
+                    first = time.perf_counter()
+                    span.phase("ttft", started, first)
+                parts.append(chunk)
+                mark = time.perf_counter()
+                actions = parser.feed(chunk)
+                span.add("parse", time.perf_counter() - mark)
+                for action in actions:
+                    mark = time.perf_counter()
+                    done.append(self._stage_file_op(transaction, action))
+                    span.add("write", time.perf_counter() - mark)
+                    self._report(progress, task, done[-1])
+                if parser.pending_filename and parser.pending_filename != announced:
+                    announced = parser.pending_filename
+                    self._report(progress, task, f"writing `{announced}`...")
+        except BaseException:
+            transaction.rollback()
+            raise
+        finally:
+            stream.close()
+        if first is not None:
+            span.phase("generation", first)
+        response = "".join(parts)
+        if stop is not None and stop.is_set():
+            transaction.rollback()
+            return None, stats, "**Cancelled**"
+        if response.startswith("Error:"):
+            transaction.rollback()
+            return None, stats, response
+        if stats.get("done_reason") == "deadline":
+            transaction.rollback()
+            return None, stats, f"**Timed out**: no complete reply within {self.deadline:g} s."
+        if not done:
+            transaction.rollback()
+            return response, stats, f"**Agent Response**:\n{response}"
+        mark = time.perf_counter()
+        try:
+            written = transaction.commit()
+        except WorkspaceError as e:
+            return None, stats, f"**File Operation Error**: {str(e)}"
+        finally:
+            span.phase("commit", mark)
+            span.add("write", time.perf_counter() - mark)
+        span.set(files_written=written['files_written'], bytes_written=written['bytes_written'])
+        done.append(f"**Success**: wrote {written['files_written']} file(s), {written['bytes_written']} bytes "
+                    f"in {written['elapsed_ms']:.1f} ms; {written['files_unchanged']} unchanged.")
+        return response, stats, "\n".join(done)
+
+    @staticmethod
+    def _report(progress, task, message):
+        if progress is not None:
+            progress(f"[task {task['id']}] {message}")
+
+    def _stage_file_op(self, transaction, data):
+        """Stage one file action in ``transaction``; returns a status line."""
+        action = data.get("action")
+        filename = data.get("filename")
+        content = data.get("content")
+        if not filename or not isinstance(filename, str) or not isinstance(content, str):
+            return "**Error**: JSON missing 'filename' or 'content'."
         try:
-            action = data.get("action")
-            filename = data.get("filename")
-            content = data.get("content")
-            
-            if not filename or not content:
-                return "**Error**: JSON missing 'filename' or 'content'."
-
-            # Security check: prevent ../.. directory traversal or absolute paths outside strictly?
-            # For now, we allow relative paths in current working dir (or subdirs).
-            # We reject absolute paths for safety if they are not in the CWD (not fully implemented here, relying on relative paths).
-            if os.path.isabs(filename):
-                # Basic safety: Ensure it's inside the current directory if possible, or just allow CWD relative.
-                # Ideally, we convert to relative or check common path.
-                # For this implementation, let's strictly prefer relative paths.
-                pass 
-
-            # Create directories if needed
-            directory = os.path.dirname(filename)
-            if directory and not os.path.exists(directory):
-                os.makedirs(directory)
-
-            mode = 'w' if action == "create_file" else 'w' # modify_file essentially overwrites or we could use 'a'? 
-            # The prompt implies "modify existing files", which usually means "rewrite" or "edit". 
-            # "content": "<complete file content>" implies we overwrite the file with new full content.
-            # So 'w' is appropriate for both based on the schema "<complete file content>".
-
-            with open(filename, mode, encoding='utf-8') as f:
-                f.write(content)
-
-            return f"**Success**: executed `{action}` on `{filename}`.\nCode language: {data.get('language')}"
-            
-        except Exception as e:
+            status = transaction.stage(filename, content)
+        except (WorkspaceError, OSError, ValueError) as e:
             return f"**File Operation Error**: {str(e)}"
+        if status == "unchanged":
+            return f"**Unchanged**: `{filename}` already has this content."
+        return f"**Staged**: `{action}` on `{filename}` ({data.get('language')})"
@@ -0,0 +1,493 @@
+# async_api.py
+# Asyncio-native Ollama client, plus a single background event loop for the UI
+
+import asyncio
+import json
+import ssl
+import threading
+from urllib.parse import urlsplit
+
+from api import DEFAULT_TIMEOUT, StopControls, extract_stats, frame_text
+from response_cache import model_digests, replay, tagged
+
+class HTTPStatusError(Exception):
+    """Raised when Ollama answers with a 4xx/5xx status."""
+
+class _Connection:
+    """One keep-alive HTTP/1.1 connection to Ollama."""
+
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+
+    @property
+    def usable(self):
+        return not self.writer.is_closing() and not self.reader.at_eof()
+
+    def abort(self):
+        """Drop the socket immediately so the server sees the client go away."""
+        transport = self.writer.transport
+        if transport is not None:
+            transport.abort()
+
+class _Response:
+    """Response head plus a body reader bound to the connection it came from."""
+
+    def __init__(self, conn, status, headers, read_timeout):
+        self.conn = conn
+        self.status = status
+        self.headers = headers
+        self.read_timeout = read_timeout
+        self.complete = False
+        self.controls = None  # StopControls whose deadline also bounds each read
+
+    async def _read(self, awaitable):
+        timeout = self.read_timeout
+        if self.controls is not None and self.controls.expires is not None:
+            timeout = min(timeout, self.controls.remaining())
+        return await asyncio.wait_for(awaitable, timeout)
+
+    async def iter_bytes(self):
+        """Yield body bytes as they arrive (chunked or Content-Length framed)."""
+        reader = self.conn.reader
+        if self.headers.get("transfer-encoding", "").lower() == "chunked":
+            while True:
+                size_line = await self._read(reader.readline())
+                size = int(size_line.split(b";", 1)[0], 16)
+                if size == 0:
+                    await self._read(reader.readline())  # trailing CRLF
+                    break
+                data = await self._read(reader.readexactly(size + 2))
+                yield data[:-2]
+        elif "content-length" in self.headers:
+            length = int(self.headers["content-length"])
+            if length:
+                yield await self._read(reader.readexactly(length))
+        else:
+            while True:
+                data = await self._read(reader.read(65536))
+                if not data:
+                    break
+                yield data
+        self.complete = True
+
+    async def read(self):
+        return b"".join([data async for data in self.iter_bytes()])
+
+    async def iter_ndjson(self):
+        """Yield decoded JSON frames, splitting the raw byte stream on newlines."""
+        buffer = b""
+        async for data in self.iter_bytes():
+            buffer += data
+            start = 0
+            newline = buffer.find(b"\n")
+            while newline != -1:
+                if newline > start:
+                    yield json.loads(buffer[start:newline])
+                start = newline + 1
+                newline = buffer.find(b"\n", start)
+            buffer = buffer[start:]
+        if buffer.strip():
+            yield json.loads(buffer)
+
+class _Flight:
+    """Asyncio counterpart of ``response_cache.Flight``; lives on one event loop."""
+
+    def __init__(self):
+        self.chunks = []
+        self.stats = {}
+        self.done = False
+        self.failed = False
+        self._changed = asyncio.Event()
+
+    def _wake(self):
+        changed, self._changed = self._changed, asyncio.Event()
+        changed.set()
+
+    def add(self, chunk):
+        self.chunks.append(chunk)
+        self._wake()
+
+    def finish(self, stats):
+        self.stats = stats
+        self.done = True
+        self._wake()
+
+    def fail(self):
+        self.failed = True
+        self._wake()
+
+    async def follow(self):
+        index = 0
+        while True:
+            if index < len(self.chunks):
+                index += 1
+                yield self.chunks[index - 1]
+            elif self.done or self.failed:
+                return
+            else:
+                await self._changed.wait()
+
+class AsyncOllamaAPI:
+    def __init__(self, base_url="http://localhost:11434", timeout=DEFAULT_TIMEOUT,
+                 max_concurrency=4, pool_maxsize=8, cache=None):
+        """Initialize the asyncio Ollama client.
+
+        At most ``max_concurrency`` requests are in flight at once; the rest
+        wait on a semaphore. Cancelling a task aborts its HTTP connection, so
+        Ollama stops generating for it. ``cache`` is an optional
+        ``ResponseCache``, used as in ``OllamaAPI``.
+        """
+        parts = urlsplit(base_url)
+        if parts.scheme not in ("http", "https"):
+            raise ValueError(f"Unsupported Ollama URL {base_url!r}: expected http:// or https://")
+        self.base_url = base_url
+        self.host = parts.hostname or "localhost"
+        self.port = parts.port or (443 if parts.scheme == "https" else 80)
+        # TLS for https, e.g. Ollama behind a reverse proxy, which may also
+        # serve it under a path prefix
+        self.ssl = ssl.create_default_context() if parts.scheme == "https" else None
+        self.prefix = parts.path.rstrip("/")
+        self.model = "tinyllama"
+        self.connect_timeout, self.read_timeout = timeout
+        self.pool_maxsize = pool_maxsize
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._idle = []
+        self.cache = cache
+        self._digests = {}
+        self._flights = {}
+
+    async def _connect(self):
+        reader, writer = await asyncio.wait_for(
+            asyncio.open_connection(self.host, self.port, ssl=self.ssl), self.connect_timeout)
+        return _Connection(reader, writer)
+
+    def _release(self, conn, response):
+        if response.complete and conn.usable and len(self._idle) < self.pool_maxsize \
+                and response.headers.get("connection", "").lower() != "close":
+            self._idle.append(conn)
+        else:
+            conn.abort()
+
+    async def _send(self, conn, method, path, body):
+        head = (f"{method} {self.prefix}{path} HTTP/1.1\r\n"
+                f"Host: {self.host}:{self.port}\r\n"
+                "Connection: keep-alive\r\n")
+        if body is not None:
+            head += f"Content-Type: application/json\r\nContent-Length: {len(body)}\r\n"
+        conn.writer.write(head.encode() + b"\r\n" + (body or b""))
+        await conn.writer.drain()
+        raw = await asyncio.wait_for(conn.reader.readuntil(b"\r\n\r\n"), self.read_timeout)
+        lines = raw.decode("latin-1").split("\r\n")
+        status = int(lines[0].split(" ", 2)[1])
+        headers = {}
+        for line in lines[1:]:
+            if ":" in line:
+                key, value = line.split(":", 1)
+                headers[key.strip().lower()] = value.strip()
+        return _Response(conn, status, headers, self.read_timeout)
+
+    async def _open(self, method, path, payload=None):
+        """Send a request on a pooled connection and return the response head.
+
+        A reused keep-alive connection may have been closed by the server in
+        the meantime; in that case the request is sent once more on a fresh
+        connection.
+        """
+        body = json.dumps(payload).encode() if payload is not None else None
+        while self._idle:
+            conn = self._idle.pop()
+            if not conn.usable:
+                conn.abort()
+                continue
+            try:
+                return await self._send(conn, method, path, body)
+            except (ConnectionError, asyncio.IncompleteReadError):
+                conn.abort()
+            except BaseException:
+                # Cancelled or timed out waiting for the head: drop the
+                # connection so the server sees the client go away
+                conn.abort()
+                raise
+        conn = await self._connect()
+        try:
+            return await self._send(conn, method, path, body)
+        except BaseException:
+            conn.abort()
+            raise
+
+    async def _request(self, method, path, payload=None):
+        """Perform a request and return the decoded JSON body."""
+        response = await self._open(method, path, payload)
+        try:
+            body = await response.read()
+        finally:
+            self._release(response.conn, response)
+        data = json.loads(body) if body else {}
+        if response.status >= 400:
+            raise HTTPStatusError(data.get("error") or f"HTTP {response.status}")
+        return data
+
+    def _payload(self, prompt, model, stream, fields):
+        payload = {"model": model or self.model, "prompt": prompt, "stream": stream}
+        payload.update(fields)
+        return payload
+
+    def _chat_payload(self, messages, model, stream, fields):
+        payload = {"model": model or self.model, "messages": messages, "stream": stream}
+        payload.update(fields)
+        return payload
+
+    async def list_models(self):
+        """Retrieve list of available models from Ollama."""
+        try:
+            async with self._semaphore:
+                data = await self._request("GET", "/api/tags")
+            return data.get("models", [])
+        except (OSError, asyncio.TimeoutError, HTTPStatusError, ValueError) as e:
+            return {"error": f"Failed to fetch models: {str(e)}"}
+
+    async def show_model(self, name):
+        """Fetch ``/api/show`` metadata for one model, or ``{"error": ...}``."""
+        try:
+            async with self._semaphore:
+                return await self._request("POST", "/api/show", {"model": name})
+        except (OSError, asyncio.TimeoutError, HTTPStatusError, ValueError) as e:
+            return {"error": f"Failed to fetch model info: {str(e)}"}
+
+    async def running_models(self):
+        """Models currently loaded by Ollama (``/api/ps``), or ``{"error": ...}``."""
+        try:
+            async with self._semaphore:
+                data = await self._request("GET", "/api/ps")
+            return data.get("models", [])
+        except (OSError, asyncio.TimeoutError, HTTPStatusError, ValueError) as e:
+            return {"error": f"Failed to fetch running models: {str(e)}"}
+
+    async def load_model(self, model=None, keep_alive=None):
+        """Load a model into memory without generating; returns ``(text, stats)``.
+
+        ``keep_alive`` (seconds or a duration such as ``"30m"``) sets how long
+        Ollama keeps it resident afterwards; ``0`` unloads it instead.
+        """
+        payload = {"model": model or self.model, "stream": False}
+        if keep_alive is not None:
+            payload["keep_alive"] = keep_alive
+        return await self._post("/api/generate", payload)
+
+    async def unload_model(self, model=None):
+        """Evict a model from memory now; returns ``(text, stats)``."""
+        return await self.load_model(model, keep_alive=0)
+
+    async def _cache_key(self, path, payload):
+        if self.cache is None or not self.cache.deterministic(payload):
+            return None
+        model = tagged(payload.get("model"))
+        if model not in self._digests:
+            models = await self.list_models()
+            if not isinstance(models, list):
+                return None
+            self._digests.update(model_digests(models))
+            # Remember a model Ollama does not list, so it costs one lookup, not one per call
+            self._digests.setdefault(model, None)
+        digest = self._digests[model]
+        # Without a digest a re-pulled model could be answered from stale entries
+        return self.cache.key(digest, path, payload) if digest else None
+
+    def _land(self, key, flight, text, stats):
+        del self._flights[key]
+        if stats:
+            self.cache.put(key, text, stats)
+            flight.finish(stats)
+        else:
+            flight.fail()
+
+    async def _post(self, path, payload):
+        key = await self._cache_key(path, payload)
+        if key is None:
+            return await self._fetch(path, payload)
+        cached = self.cache.get(key)
+        if cached is not None:
+            return cached
+        flight = self._flights.get(key)
+        if flight is not None:
+            text = "".join([chunk async for chunk in flight.follow()])
+            if flight.done:
+                return text, flight.stats
+            return await self._fetch(path, payload)
+        flight = self._flights[key] = _Flight()
+        text, stats = "", {}
+        try:
+            text, stats = await self._fetch(path, payload)
+            if not text.startswith("Error:"):
+                flight.add(text)
+        finally:
+            self._land(key, flight, text, stats)
+        return text, stats
+
+    async def _fetch(self, path, payload):
+        try:
+            async with self._semaphore:
+                data = await self._request("POST", path, payload)
+        except HTTPStatusError as e:
+            return f"Error: {e}", {}
+        except ValueError as e:
+            return f"Error: Invalid reply from Ollama ({str(e)})", {}
+        except (OSError, asyncio.TimeoutError) as e:
+            return f"Error: Could not connect to Ollama. Is it running? ({str(e)})", {}
+        return frame_text(data), extract_stats(data)
+
+    async def _post_stream(self, path, payload, stats, controls=None):
+        key = await self._cache_key(path, payload)
+        if key is None:
+            async for chunk in self._stream(path, payload, stats, controls):
+                yield chunk
+            return
+        cached = self.cache.get(key)
+        if cached is not None:
+            text, cached_stats = cached
+            if stats is not None:
+                stats.update(cached_stats)
+            for chunk in replay(text):
+                yield chunk
+            return
+        flight = self._flights.get(key)
+        if flight is None:
+            async for chunk in self._lead_stream(key, path, payload, stats, controls):
+                yield chunk
+            return
+        sent = 0
+        async for chunk in flight.follow():
+            sent += len(chunk)
+            yield chunk
+        if flight.done:
+            if stats is not None:
+                stats.update(flight.stats)
+        else:
+            # The leader stopped early; regenerate and skip what was already sent
+            async for chunk in self._post_stream(path, payload, stats, controls):
+                if sent >= len(chunk):
+                    sent -= len(chunk)
+                    continue
+                yield chunk[sent:]
+                sent = 0
+
+    async def _lead_stream(self, key, path, payload, stats, controls=None):
+        flight = self._flights[key] = _Flight()
+        parts = []
+        done_stats = {}
+        try:
+            async for chunk in self._stream(path, payload, done_stats, controls):
+                if chunk.startswith("Error:") and not parts:
+                    done_stats.clear()
+                else:
+                    parts.append(chunk)
+                    flight.add(chunk)
+                yield chunk
+        finally:
+            # Cancelling or closing early, or a stream cut by its
+            # StopControls, leaves the flight unfinished
+            cut = controls is not None and controls.closed
+            self._land(key, flight, "".join(parts), {} if cut else done_stats)
+        if stats is not None:
+            stats.update(done_stats)
+
+    async def _stream(self, path, payload, stats, controls=None):
+        async with self._semaphore:
+            try:
+                opening = self._open("POST", path, payload)
+                if controls is not None and controls.expires is not None:
+                    opening = asyncio.wait_for(opening, controls.remaining())
+                response = await opening
+            except (OSError, asyncio.TimeoutError) as e:
+                if controls is not None and controls.expired():
+                    controls.finish(stats)
+                else:
+                    yield f"Error: Could not connect to Ollama. Is it running? ({str(e)})"
+                return
+            response.controls = controls
+            try:
+                if response.status >= 400:
+                    body = await response.read()
+                    yield f"Error: {json.loads(body).get('error') if body else response.status}"
+                    return
+                async for frame in response.iter_ndjson():
+                    if "error" in frame:
+                        yield f"Error: {frame['error']}"
+                        return
+                    if controls is not None and controls.over(frame):
+                        # The half-read response is released below, which
+                        # aborts the connection and makes Ollama stop
+                        break
+                    chunk = frame_text(frame)
+                    if controls is not None:
+                        chunk = controls.feed(chunk) + (controls.flush() if frame.get("done") else "")
+                    if chunk:
+                        yield chunk
+                    if frame.get("done") and stats is not None:
+                        stats.update(extract_stats(frame))
+            except (OSError, asyncio.TimeoutError) as e:
+                if controls is None or not controls.expired():
+                    yield f"Error: Connection to Ollama lost ({str(e)})"
+            except ValueError as e:
+                yield f"Error: Invalid reply from Ollama ({str(e)})"
+            finally:
+                self._release(response.conn, response)
+                if controls is not None:
+                    controls.finish(stats)
+
+    async def generate(self, prompt, model=None, **fields):
+        """Send a prompt and wait for the complete response; returns ``(text, stats)``."""
+        return await self._post("/api/generate", self._payload(prompt, model, False, fields))
+
+    def generate_stream(self, prompt, model=None, stats=None, **fields):
+        """Send a prompt and asynchronously yield response chunks as they arrive.
+
+        If ``stats`` is a dict it is filled in from the final ``done`` frame.
+        Leaving the loop early or cancelling the task closes the connection.
+        ``num_predict`` and ``stop`` options and a ``deadline`` in seconds
+        are enforced as in ``OllamaAPI.generate_stream``.
+        """
+        controls = StopControls.pop(fields)
+        return self._post_stream("/api/generate", self._payload(prompt, model, True, fields), stats, controls)
+
+    async def chat(self, messages, model=None, **fields):
+        """Send a ``/api/chat`` message list and return ``(text, stats)``."""
+        return await self._post("/api/chat", self._chat_payload(messages, model, False, fields))
+
+    def chat_stream(self, messages, model=None, stats=None, **fields):
+        """Send a ``/api/chat`` message list and asynchronously yield reply chunks."""
+        controls = StopControls.pop(fields)
+        return self._post_stream("/api/chat", self._chat_payload(messages, model, True, fields), stats, controls)
+
+    async def aclose(self):
+        """Close all pooled connections."""
+        while self._idle:
+            self._idle.pop().abort()
+
+class LoopThread:
+    """One asyncio event loop running in one daemon thread.
+
+    The Tk main loop hands coroutines to it with ``submit`` instead of
+    starting a new thread per prompt.
+    """
+
+    def __init__(self, name="pyllamaui-loop"):
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+    def submit(self, coro):
+        """Schedule a coroutine; returns a ``concurrent.futures.Future``.
+
+        Calling ``cancel()`` on the future cancels the task inside the loop.
+        """
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def stop(self):
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join(timeout=1)
@@ -0,0 +1,226 @@
+# comparison.py
+# Sends one prompt to several models at once and streams each reply into its own pane
+
+import asyncio
+import tkinter as tk
+from tkinter import scrolledtext
+
+from markdown_render import configure_markdown_tags
+from metrics import Metrics, format_status
+from transcript import Transcript, TranscriptView
+from ui_dispatch import UIDispatcher, StartMessage, AppendText, EndMessage, Call
+
+class Lane:
+    """One model's reply within a comparison.
+
+    ``state`` moves from ``queued`` to ``streaming`` and ends as ``done``,
+    ``error`` or ``cancelled``. ``record`` holds the finished request's TTFT
+    and tokens per second.
+    """
+
+    def __init__(self, model):
+        self.model = model
+        self.state = "queued"
+        self.parts = []
+        self.stats = {}
+        self.timer = None
+        self.record = {}
+        self._task = None
+
+    @property
+    def text(self):
+        return "".join(self.parts)
+
+    @property
+    def finished(self):
+        return self.state in ("done", "error", "cancelled")
+
+class Comparison:
+    """Streams ``prompt`` from every model in ``models`` on the shared event loop.
+
+    At most ``max_concurrent`` lanes stream at a time, so Ollama is not
+    asked to run more models in parallel than it can hold; the others wait
+    their turn. All lanes go through the one pooled ``AsyncOllamaAPI``.
+    ``on_chunk(lane, text)`` and ``on_state(lane)`` are called on the loop
+    thread. ``cancel`` stops one lane, or all of them, and closes the
+    corresponding connections.
+    """
+
+    def __init__(self, async_api, loop, prompt, models, max_concurrent=2, metrics=None,
+                 on_chunk=None, on_state=None, **fields):
+        self.async_api = async_api
+        self.loop = loop
+        self.prompt = prompt
+        self.lanes = [Lane(model) for model in models]
+        self.max_concurrent = max_concurrent
+        self.metrics = metrics or Metrics()
+        self.on_chunk = on_chunk
+        self.on_state = on_state
+        self.fields = fields
+        self.future = None
+
+    def start(self):
+        self.future = self.loop.submit(self._run())
+        return self.future
+
+    def lane(self, model):
+        for lane in self.lanes:
+            if lane.model == model:
+                return lane
+        raise KeyError(model)
+
+    def cancel(self, model=None):
+        """Stop the lane for ``model``, or every lane; safe to call from any thread."""
+        lanes = self.lanes if model is None else [self.lane(model)]
+        for lane in lanes:
+            self.loop.loop.call_soon_threadsafe(self._cancel, lane)
+
+    def _cancel(self, lane):
+        if lane.finished:
+            return
+        if lane._task is not None:
+            lane._task.cancel()
+        else:
+            self._set_state(lane, "cancelled")
+
+    def _set_state(self, lane, state):
+        lane.state = state
+        if self.on_state is not None:
+            self.on_state(lane)
+
+    async def _run(self):
+        semaphore = asyncio.Semaphore(self.max_concurrent)
+        for lane in self.lanes:
+            lane._task = asyncio.ensure_future(self._stream(lane, semaphore))
+        await asyncio.gather(*(lane._task for lane in self.lanes), return_exceptions=True)
+        return self.lanes
+
+    async def _stream(self, lane, semaphore):
+        try:
+            async with semaphore:
+                self._set_state(lane, "streaming")
+                lane.timer = self.metrics.request(lane.model)
+                async for chunk in self.async_api.generate_stream(self.prompt, model=lane.model,
+                                                                  stats=lane.stats, **self.fields):
+                    lane.timer.chunk()
+                    lane.parts.append(chunk)
+                    if self.on_chunk is not None:
+                        self.on_chunk(lane, chunk)
+            if lane.text.startswith("Error:"):
+                self._set_state(lane, "error")
+                return
+            lane.record = lane.timer.finish(lane.stats)
+            self._set_state(lane, "done")
+        except asyncio.CancelledError:
+            if lane.timer is not None:
+                lane.record = lane.timer.snapshot()
+            self._set_state(lane, "cancelled")
+
+class ComparisonView:
+    """A window with one pane per model of a ``Comparison``.
+
+    Each pane renders its reply through its own ``TranscriptView`` and
+    ``UIDispatcher``, like the main chat, and has a header with the lane's
+    state, TTFT and tokens per second and a Stop button for that model.
+    """
+
+    def __init__(self, root, comparison):
+        self.comparison = comparison
+        self.window = tk.Toplevel(root)
+        self.window.title(f"Compare: {comparison.prompt[:60]}")
+        self.window.geometry(f"{min(1600, 420 * len(comparison.lanes))}x600")
+        self.window.protocol("WM_DELETE_WINDOW", self.close)
+        self.window.grid_rowconfigure(1, weight=1)
+        self.panes = {}
+        for column, lane in enumerate(comparison.lanes):
+            self.window.grid_columnconfigure(column, weight=1, uniform="pane")
+            header = tk.Frame(self.window)
+            header.grid(row=0, column=column, sticky="ew", padx=4, pady=(4, 0))
+            label = tk.Label(header, text=f"{lane.model}\nqueued", justify="left", anchor="w")
+            label.pack(side="left", fill="x", expand=True)
+            stop = tk.Button(header, text="Stop", command=lambda m=lane.model: comparison.cancel(m))
+            stop.pack(side="right")
+            text = scrolledtext.ScrolledText(self.window, wrap=tk.WORD, state="disabled",
+                                             font=("Arial", 11), bg="#2b2b2b", fg="#ffffff")
+            text.grid(row=1, column=column, sticky="nsew", padx=4, pady=4)
+            text.tag_config("left", justify="left")
+            text.tag_config("bold", font=("Arial", 11, "bold"))
+            text.tag_config("bot_color", foreground="#A0C0FF")
+            configure_markdown_tags(text)
+            view = TranscriptView(text, Transcript())
+            ui = UIDispatcher(self.window, {
+                StartMessage: lambda speaker, body, align, kind, v=view: v.add(speaker, kind, body, align=align, open=True),
+                AppendText: view.append_text,
+                EndMessage: view.close,
+            })
+            ui.start()
+            ui.post(StartMessage(lane.model, "", "left", "bot"))
+            self.panes[lane.model] = (label, stop, view, ui)
+        tk.Button(self.window, text="Stop all", command=comparison.cancel).grid(
+            row=2, column=0, columnspan=len(comparison.lanes), pady=(0, 6))
+        comparison.on_chunk = self._on_chunk
+        comparison.on_state = self._on_state
+
+    def _on_chunk(self, lane, chunk):
+        """Loop thread: stream into the lane's pane; show TTFT once the first chunk is in."""
+        ui = self.panes[lane.model][3]
+        ui.append_text(chunk)
+        if lane.timer.chunks == 1:
+            ui.post(Call(lambda: self._update_header(lane)))
+
+    def _on_state(self, lane):
+        """Loop thread: refresh the lane's header on the main thread."""
+        ui = self.panes[lane.model][3]
+        if lane.finished:
+            ui.post(EndMessage())
+        ui.post(Call(lambda: self._update_header(lane)))
+
+    def _update_header(self, lane):
+        label, stop, _, _ = self.panes[lane.model]
+        record = lane.record or (lane.timer.snapshot() if lane.timer is not None else {})
+        status = format_status(record)
+        label.configure(text=f"{lane.model}\n{lane.state}" + (f" · {status}" if status else ""))
+        if lane.finished:
+            stop.configure(state="disabled")
+
+    def close(self):
+        self.comparison.cancel()
+        for _, _, _, ui in self.panes.values():
+            ui.stop()
+        self.window.destroy()
+
+class ModelPicker:
+    """Dialog for choosing the models and concurrency limit of a comparison."""
+
+    def __init__(self, root, models, on_compare, max_concurrent=2):
+        self.on_compare = on_compare
+        self.dialog = tk.Toplevel(root)
+        self.dialog.title("Compare models")
+        self.dialog.resizable(False, False)
+        tk.Label(self.dialog, text="Send the prompt to:", font=("Arial", 11, "bold")).pack(
+            anchor="w", padx=10, pady=(10, 4))
+        self.choices = {}
+        for name in models:
+            var = tk.BooleanVar(value=False)
+            tk.Checkbutton(self.dialog, text=name, variable=var).pack(anchor="w", padx=16)
+            self.choices[name] = var
+        row = tk.Frame(self.dialog)
+        row.pack(anchor="w", padx=10, pady=6)
+        tk.Label(row, text="At most").pack(side="left")
+        self.limit = tk.Spinbox(row, from_=1, to=max(1, len(models)), width=3)
+        self.limit.delete(0, tk.END)
+        self.limit.insert(0, str(max_concurrent))
+        self.limit.pack(side="left", padx=4)
+        tk.Label(row, text="streams at once").pack(side="left")
+        tk.Button(self.dialog, text="Compare", command=self._compare).pack(pady=(0, 10))
+
+    def _compare(self):
+        models = [name for name, var in self.choices.items() if var.get()]
+        if not models:
+            return
+        try:
+            limit = max(1, int(self.limit.get()))
+        except ValueError:
+            limit = 1
+        self.dialog.destroy()
+        self.on_compare(models, limit)
@@ -0,0 +1,116 @@
+# conversation.py
+# Conversation state for PyLlamaUI, so each turn only sends what is new
+
+class ConversationSession:
+    """History of one chat, kept in a form Ollama can reuse between turns.
+
+    In ``chat`` mode the session keeps a ``/api/chat`` message list; the
+    prefix of that list is identical from turn to turn, so Ollama's KV cache
+    covers everything but the newest message. In ``context`` mode it keeps
+    the ``context`` token array returned by ``/api/generate`` and hands it
+    back with the next prompt, so earlier turns are never re-tokenized.
+
+    ``turns`` holds ``(prompt, response)`` pairs and ``undone`` is the redo
+    stack; ``ChatHistory`` keeps both in step with the transcript.
+    """
+
+    def __init__(self, mode="chat", system=None):
+        if mode not in ("chat", "context"):
+            raise ValueError(f"Unknown conversation mode: {mode}")
+        self.mode = mode
+        self.system = system
+        self.turns = []
+        self.undone = []
+        # Context token array after each turn, parallel to ``turns``. Each
+        # entry is (model, context) because context tokens are model specific.
+        self._contexts = []
+
+    def begin(self, prompt):
+        """Start a new turn. A new prompt invalidates anything that was undone."""
+        self.turns.append((prompt, ""))
+        self._contexts.append(self._contexts[-1] if self._contexts else None)
+        self.undone.clear()
+
+    def complete(self, response, stats=None, model=None):
+        """Record the reply for the current turn and the server context after it."""
+        prompt, _ = self.turns[-1]
+        self.turns[-1] = (prompt, response)
+        if stats and "context" in stats:
+            self._contexts[-1] = (model, stats["context"])
+
+    def context(self, model=None):
+        """Context tokens to send with the current prompt, or None.
+
+        A turn starts out with the previous turn's context; a reply that was
+        stopped early keeps it, since the server returned no new one.
+        """
+        if not self._contexts or self._contexts[-1] is None:
+            return None
+        context_model, tokens = self._contexts[-1]
+        return tokens if context_model == model else None
+
+    def messages(self):
+        """``/api/chat`` message list for the conversation so far."""
+        messages = [{"role": "system", "content": self.system}] if self.system else []
+        for prompt, response in self.turns[:-1]:
+            messages.append({"role": "user", "content": prompt})
+            messages.append({"role": "assistant", "content": response})
+        if self.turns:
+            messages.append({"role": "user", "content": self.turns[-1][0]})
+        return messages
+
+    def stream(self, api, model=None, stats=None, **fields):
+        """Open a reply stream for the current turn on ``api``.
+
+        Works with both ``OllamaAPI`` and ``AsyncOllamaAPI``; the return value
+        is whatever their ``*_stream`` method returns.
+        """
+        model = model or api.model
+        if self.mode == "chat":
+            return api.chat_stream(self.messages(), model=model, stats=stats, **fields)
+        context = self.context(model)
+        if context is not None:
+            fields["context"] = context
+        if self.system:
+            fields.setdefault("system", self.system)
+        return api.generate_stream(self.turns[-1][0], model=model, stats=stats, **fields)
+
+    def undo(self):
+        """Remove the last turn; returns it, or None if there is nothing to undo."""
+        if not self.turns:
+            return None
+        turn = self.turns.pop()
+        self.undone.append((turn, self._contexts.pop()))
+        return turn
+
+    def redo(self):
+        """Restore the last undone turn; returns it, or None."""
+        if not self.undone:
+            return None
+        turn, context = self.undone.pop()
+        self.turns.append(turn)
+        self._contexts.append(context)
+        return turn
+
+    def truncate(self, index):
+        """Drop turn ``index`` and every turn after it (edit and regenerate)."""
+        del self.turns[index:]
+        del self._contexts[index:]
+        self.undone.clear()
+
+    def remove(self, index):
+        """Drop a single turn from the middle of the conversation.
+
+        Later context arrays still encode the removed turn, so they are
+        discarded; the next context-mode turn starts fresh.
+        """
+        del self.turns[index]
+        del self._contexts[index]
+        if index < len(self._contexts):
+            self._contexts = [None] * len(self._contexts)
+        self.undone.clear()
+
+    def clear(self):
+        self.turns.clear()
+        self.undone.clear()
+        self._contexts.clear()
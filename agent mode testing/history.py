@@ -0,0 +1,130 @@
+# history.py
+# Undo/redo history of chat turns, indexed by the messages that display them
+
+class ChatHistory:
+    """Turns of a conversation together with the transcript messages showing them.
+
+    Replaces the old ``prompt_stack``/``undo_stack`` pair. Each turn is
+    recorded as ``[prompt_id, reply_id]`` when its messages are created, so
+    undo, redo, edit-and-regenerate and deleting a single message are range
+    operations on the ``TranscriptView`` index instead of guesses about how
+    many lines to remove. The ``ConversationSession`` is kept in step so the
+    next request sees exactly what is on screen. Agent runs ("agent_prompt"
+    and "agent" messages) are not turns: they never reach the session, and
+    undo leaves them on screen.
+    """
+
+    def __init__(self, session, view):
+        self.session = session
+        self.view = view
+        self.turn_ids = []  # [prompt_id, reply_id] per turn, parallel to session.turns
+        self._turn_of = {}  # message id -> index into turn_ids
+
+    @property
+    def turns(self):
+        return self.session.turns
+
+    def _reindex(self, start=0):
+        for index in range(start, len(self.turn_ids)):
+            for msg_id in self.turn_ids[index]:
+                if msg_id is not None:
+                    self._turn_of[msg_id] = index
+
+    def _forget(self, ids):
+        for msg_id in ids:
+            self._turn_of.pop(msg_id, None)
+
+    def restore(self):
+        """Rebuild the turns from the messages loaded into the transcript.
+
+        Used after a conversation is loaded from the history store: each user
+        message followed by a bot message becomes one turn again, so undo,
+        edit and the model's context pick up where the last session ended;
+        agent runs are skipped. A page that is not the end of its
+        conversation (a jump to a search result) gets no turns, so undo and
+        edit cannot cut history there.
+        """
+        self.session.clear()
+        self.turn_ids = []
+        self._turn_of = {}
+        prompt = None
+        transcript = self.view.transcript
+        for message in ([] if transcript.has_newer else transcript.messages):
+            if message.kind == "user":
+                prompt = message
+            elif message.kind == "bot" and prompt is not None:
+                self.session.begin(prompt.text)
+                self.session.complete(message.text)
+                self.turn_ids.append([prompt.id, message.id])
+                prompt = None
+        self._reindex()
+
+    def add_prompt(self, prompt):
+        """Show a user prompt and start a new turn for it."""
+        message = self.view.add("You", "user", prompt, align="right")
+        self.session.begin(prompt)
+        self.turn_ids.append([message.id, None])
+        self._turn_of[message.id] = len(self.turn_ids) - 1
+        return message
+
+    def attach_reply(self):
+        """Record the streaming message as the reply of the latest turn."""
+        message = self.view.transcript.open_message
+        if message is not None and self.turn_ids:
+            self.turn_ids[-1][1] = message.id
+            self._turn_of[message.id] = len(self.turn_ids) - 1
+
+    def undo(self):
+        """Remove the last turn from screen and session; returns it or None."""
+        if not self.turn_ids:
+            return None
+        prompt_id, reply_id = self.turn_ids.pop()
+        self._forget((prompt_id, reply_id))
+        # Only the turn's own messages: agent runs after it stay
+        for msg_id in (reply_id, prompt_id):
+            message = self.view.transcript.get(msg_id)
+            if message is not None:
+                self.view.remove(message)
+        return self.session.undo()
+
+    def redo(self):
+        """Put the last undone turn back; returns it or None."""
+        turn = self.session.redo()
+        if turn is None:
+            return None
+        prompt, response = turn
+        prompt_message = self.view.add("You", "user", prompt, align="right")
+        reply_message = self.view.add("PyLlamaUI", "bot", response)
+        self.turn_ids.append([prompt_message.id, reply_message.id])
+        self._reindex(len(self.turn_ids) - 1)
+        return turn
+
+    def edit(self, message):
+        """Cut the conversation back to before ``message``'s turn.
+
+        Returns the prompt of that turn so it can be edited and sent again,
+        or None if the message does not belong to a turn.
+        """
+        index = self._turn_of.get(message.id)
+        if index is None:
+            return None
+        prompt = self.session.turns[index][0]
+        prompt_message = self.view.transcript.get(self.turn_ids[index][0])
+        self.view.truncate(prompt_message or message)
+        for ids in self.turn_ids[index:]:
+            self._forget(ids)
+        del self.turn_ids[index:]
+        self.session.truncate(index)
+        return prompt
+
+    def delete(self, message):
+        """Delete one message. Its turn is dropped from what the model sees."""
+        index = self._turn_of.get(message.id)
+        self.view.remove(message)
+        if index is None:
+            return
+        ids = self.turn_ids[index]
+        self._forget(ids)
+        del self.turn_ids[index]
+        self.session.remove(index)
+        self._reindex(index)
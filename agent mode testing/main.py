@@ -1,24 +1,53 @@
 # main.py
 # Entry point for PyLlamaUI, initializes the GUI and connects components
 
+import os
+import time
 import tkinter as tk
 from ui_components import ChatApp
-from api import OllamaAPI
+from api import OllamaAPI, env_number
+from async_api import AsyncOllamaAPI
+from response_cache import ResponseCache
+from router import Router, RoutedOllamaAPI, RoutedAsyncOllamaAPI
 from agentic import AgenticWorkflow
+from tracing import Tracer
 
 def main():
     # Initialize the main Tkinter window
     root = tk.Tk()
     
-    # Create Ollama API instance
-    api = OllamaAPI(base_url="http://localhost:11434")
+    # Opt-in cache for deterministic generations (temperature 0 or a fixed seed)
+    cache = ResponseCache() if os.environ.get("PYLLAMAUI_RESPONSE_CACHE") else None
+
+    # Create Ollama API instance; PYLLAMAUI_ENDPOINTS lists several Ollama
+    # instances (comma-separated URLs) to spread requests over
+    endpoints = [url.strip() for url in os.environ.get("PYLLAMAUI_ENDPOINTS", "").split(",") if url.strip()]
+    if len(endpoints) > 1:
+        router = Router(endpoints).start()
+        api = RoutedOllamaAPI(router, cache=cache)
+        async_api = RoutedAsyncOllamaAPI(router, cache=cache)
+    else:
+        api = OllamaAPI(base_url=endpoints[0] if endpoints else "http://localhost:11434", cache=cache)
+        async_api = AsyncOllamaAPI(base_url=api.base_url, cache=cache)
     
     # Create agentic workflow instance
-    agent = AgenticWorkflow(api)
+    # With the cache on, agent runs use a fixed seed so repeated tasks hit it
+    # PYLLAMAUI_TRACE=<file> appends a JSONL span per agent task for offline profiling
+    tracer = Tracer(os.environ.get("PYLLAMAUI_TRACE"))
+    # PYLLAMAUI_TASK_DEADLINE=<seconds> fails agent tasks that generate for longer
+    agent = AgenticWorkflow(api, options={"seed": 42} if cache else None, tracer=tracer,
+                            deadline=env_number(os.environ, "PYLLAMAUI_TASK_DEADLINE"))
     
     # Create and start the chat application with agent support
-    app = ChatApp(root, api, agent)
+    app = ChatApp(root, api, agent, async_api=async_api)
     
+    if os.environ.get("PYLLAMAUI_STARTUP_PROBE"):
+        # Used by benchmarks/bench_startup.py: report the first painted frame and exit
+        def probe():
+            print(f"first_frame {time.time()}", flush=True)
+            root.destroy()
+        root.after_idle(lambda: root.after(0, probe))
+
     # Start the Tkinter event loop
     root.mainloop()
 
@@ -0,0 +1,145 @@
+# model_catalog.py
+# Cached, background-refreshed catalogue of the models Ollama has installed
+
+import json
+import os
+import time
+
+from paths import cache_dir
+
+class ModelCatalog:
+    """Model list and per-model metadata, served from cache without blocking.
+
+    ``models()`` always returns immediately with the last known list and
+    starts a background refresh from ``/api/tags`` when it is older than
+    ``ttl`` seconds. ``details(name)`` returns ``/api/show`` metadata
+    (parameter size, quantization, context length) if known and otherwise
+    fetches it in the background. Both are kept in a JSON file keyed by
+    model digest, so a restart shows the previous list at once and never
+    refetches metadata for a model that has not changed.
+
+    Network work runs as coroutines on the UI's ``LoopThread``. Functions in
+    ``listeners`` are called on that loop after the list or any metadata
+    changes; UI code should hand them to its dispatcher.
+    """
+
+    def __init__(self, async_api, loop, ttl=60, cache_file=None):
+        self.async_api = async_api
+        self.loop = loop
+        self.ttl = ttl
+        self.cache_file = cache_file or os.path.join(cache_dir(), "models.json")
+        self.listeners = []
+        self.error = None
+        self._models, self._details = self._load()
+        self._fetched_at = None  # the disk copy always counts as stale
+        self._refresh_future = None
+        self._pending = set()
+
+    def _load(self):
+        try:
+            with open(self.cache_file, encoding="utf-8") as f:
+                data = json.load(f)
+            return data.get("models", []), data.get("details", {})
+        except (OSError, ValueError):
+            return [], {}
+
+    def _save(self):
+        # Only keep metadata for models that are still installed
+        keys = {self._key(model) for model in self._models}
+        self._details = {key: value for key, value in self._details.items() if key in keys}
+        tmp = self.cache_file + ".tmp"
+        try:
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump({"models": self._models, "details": self._details}, f)
+            os.replace(tmp, self.cache_file)
+        except OSError:
+            pass
+
+    def _notify(self):
+        for listener in self.listeners:
+            listener()
+
+    @staticmethod
+    def _key(model):
+        return model.get("digest") or model.get("name")
+
+    @property
+    def stale(self):
+        return self._fetched_at is None or time.monotonic() - self._fetched_at > self.ttl
+
+    def models(self):
+        """Last known model list (dicts from ``/api/tags``); refreshes if stale."""
+        if self.stale:
+            self.refresh()
+        return list(self._models)
+
+    def names(self):
+        return [model.get("name", "") for model in self.models()]
+
+    def refresh(self):
+        """Start a background refresh unless one is already running."""
+        if self._refresh_future is None or self._refresh_future.done():
+            self._refresh_future = self.loop.submit(self._refresh())
+        return self._refresh_future
+
+    async def _refresh(self):
+        models = await self.async_api.list_models()
+        if isinstance(models, dict):
+            self.error = models.get("error")
+        else:
+            self.error = None
+            self._models = [model for model in models if isinstance(model, dict)]
+            self._fetched_at = time.monotonic()
+            self._save()
+        self._notify()
+
+    def _find(self, name):
+        for model in self._models:
+            if model.get("name") == name:
+                return model
+        return {"name": name}
+
+    def details(self, name):
+        """Cached metadata for ``name``, or None while it is being fetched."""
+        key = self._key(self._find(name))
+        if key in self._details:
+            return self._details[key]
+        if key not in self._pending:
+            self._pending.add(key)
+            self.loop.submit(self._fetch_details(name, key))
+        return None
+
+    async def _fetch_details(self, name, key):
+        try:
+            info = await self.async_api.show_model(name)
+            if "error" in info:
+                return
+            self._details[key] = parse_show(info)
+            self._save()
+            self._notify()
+        finally:
+            self._pending.discard(key)
+
+def parse_show(info):
+    """Reduce an ``/api/show`` response to the fields the UI displays."""
+    details = info.get("details") or {}
+    context_length = None
+    for field, value in (info.get("model_info") or {}).items():
+        if field.endswith(".context_length"):
+            context_length = value
+            break
+    return {
+        "family": details.get("family"),
+        "parameter_size": details.get("parameter_size"),
+        "quantization": details.get("quantization_level"),
+        "context_length": context_length,
+    }
+
+def describe(details):
+    """Short human-readable summary, e.g. ``8.0B · Q4_0 · ctx 8192``."""
+    if not details:
+        return ""
+    parts = [details.get("parameter_size"), details.get("quantization")]
+    if details.get("context_length"):
+        parts.append(f"ctx {details['context_length']}")
+    return " · ".join(part for part in parts if part)
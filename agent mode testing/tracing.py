@@ -0,0 +1,146 @@
+# tracing.py
+# Per-task spans for the agent pipeline, exported as JSONL or Chrome trace events
+#
+# Convert a JSONL trace for chrome://tracing or Perfetto:
+#     python tracing.py agent-trace.jsonl agent-trace.json
+
+from collections import deque
+import json
+import sys
+import threading
+import time
+
+# Token counts and durations copied from Ollama's final frame
+_OLLAMA_COUNTS = ("prompt_eval_count", "eval_count")
+_OLLAMA_DURATIONS = ("load_duration", "prompt_eval_duration", "eval_duration", "total_duration")
+
+class Span:
+    """Timing of one unit of work.
+
+    ``phase`` records a named interval (queue wait, time to first token,
+    generation, commit); ``add`` accumulates time spent in work that is
+    interleaved with others, such as parsing each chunk as it arrives.
+    Times are ``time.perf_counter()`` values.
+    """
+
+    def __init__(self, name, start=None, **attrs):
+        self.name = name
+        self.start = time.perf_counter() if start is None else start
+        self.end = None
+        self.attrs = attrs
+        self.phases = []
+        self.totals = {}
+        self.thread = None
+
+    def phase(self, name, start, end=None):
+        self.phases.append((name, start, time.perf_counter() if end is None else end))
+
+    def add(self, name, seconds):
+        self.totals[name] = self.totals.get(name, 0.0) + seconds
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def ollama(self, stats):
+        """Copy token counts and server-side durations from an Ollama stats dict."""
+        for key in _OLLAMA_COUNTS:
+            if key in stats:
+                self.attrs[key] = stats[key]
+        for key in _OLLAMA_DURATIONS:
+            if key in stats:
+                self.attrs["ollama_" + key.replace("_duration", "_ms")] = round(stats[key] / 1e6, 3)
+
+class Tracer:
+    """Collects finished spans; the last ``max_spans`` are kept in ``records``.
+
+    With ``path`` set, every finished span is also appended to that file as
+    one JSON line straight away, so a long run can be profiled offline
+    without holding it all in memory.
+    """
+
+    def __init__(self, path=None, max_spans=10000):
+        self.path = path
+        self.records = deque(maxlen=max_spans)
+        self._lock = threading.Lock()
+        self._file = None
+        # perf_counter() + offset = Unix time
+        self._offset = time.time() - time.perf_counter()
+
+    def start(self, name, start=None, **attrs):
+        return Span(name, start, **attrs)
+
+    def finish(self, span, **attrs):
+        span.end = time.perf_counter()
+        span.attrs.update(attrs)
+        record = self._record(span)
+        line = json.dumps(record)
+        with self._lock:
+            self.records.append(record)
+            if self.path:
+                if self._file is None:
+                    self._file = open(self.path, "a", encoding="utf-8")
+                self._file.write(line + "\n")
+                self._file.flush()
+        return record
+
+    def _record(self, span):
+        ms = lambda seconds: round(seconds * 1000, 3)
+        record = {"name": span.name, "ts": self._offset + span.start, "dur_ms": ms(span.end - span.start),
+                  "thread": span.thread}
+        record.update(span.attrs)
+        for name, start, end in span.phases:
+            record[f"{name}_ms"] = ms(end - start)
+        for name, seconds in span.totals.items():
+            record[f"{name}_ms"] = ms(seconds)
+        record["phases"] = [[name, ms(start - span.start), ms(end - start)] for name, start, end in span.phases]
+        return record
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def export_jsonl(self, path):
+        with open(path, "w", encoding="utf-8") as f:
+            for record in list(self.records):
+                f.write(json.dumps(record) + "\n")
+
+    def export_chrome(self, path):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(chrome_trace(list(self.records)), f)
+
+    def summary(self, name="task"):
+        """p50/p95 of each timed field over the recorded ``name`` spans, one line each."""
+        records = [r for r in list(self.records) if r["name"] == name]
+        fields = sorted({key for r in records for key in r if key.endswith("_ms") and key != "dur_ms"})
+        lines = []
+        for key in fields:
+            values = sorted(r[key] for r in records if key in r)
+            p50 = values[len(values) // 2]
+            p95 = values[min(len(values) - 1, int(len(values) * 0.95))]
+            lines.append(f"{key[:-3]:<22} p50 {p50:9.1f} ms   p95 {p95:9.1f} ms   (n={len(values)})")
+        return "\n".join(lines)
+
+def chrome_trace(records):
+    """Trace Event Format for ``records``: one row per span, its phases nested inside."""
+    events = []
+    for row, record in enumerate(records):
+        label = f"{record['name']} {record['id']}" if "id" in record else record["name"]
+        start = record["ts"] * 1e6
+        args = {k: v for k, v in record.items() if k not in ("ts", "dur_ms", "phases")}
+        events.append({"name": "thread_name", "ph": "M", "pid": 1, "tid": row, "args": {"name": label}})
+        events.append({"name": label, "ph": "X", "pid": 1, "tid": row, "ts": start,
+                       "dur": record["dur_ms"] * 1000, "args": args})
+        for name, offset_ms, dur_ms in record.get("phases", []):
+            events.append({"name": name, "ph": "X", "pid": 1, "tid": row,
+                           "ts": start + offset_ms * 1000, "dur": dur_ms * 1000})
+    return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3:
+        sys.exit("usage: python tracing.py TRACE.jsonl OUT.json")
+    with open(sys.argv[1], encoding="utf-8") as f:
+        records = [json.loads(line) for line in f if line.strip()]
+    with open(sys.argv[2], "w", encoding="utf-8") as f:
+        json.dump(chrome_trace(records), f)
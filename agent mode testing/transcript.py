@@ -0,0 +1,416 @@
+# transcript.py
+# Chat transcript model, and a view that renders only a bounded window of it
+
+import sys
+
+from markdown_render import MARKDOWN_TAGS, IncrementalMarkdown, render_markdown
+
+class Message:
+    """One chat message. Slots keep per-message overhead small in long sessions.
+
+    ``kind`` is "user" or "bot" for chat turns, and "agent_prompt" or
+    "agent" for agent runs, which are shown alike but are not chat turns.
+    """
+
+    __slots__ = ("id", "speaker", "kind", "align", "text")
+
+    def __init__(self, msg_id, speaker, kind, align, text):
+        self.id = msg_id
+        self.speaker = speaker
+        self.kind = kind
+        self.align = align
+        self.text = text
+
+class Transcript:
+    """Every message of the conversation, independent of any widget.
+
+    Speaker names, kinds and alignments are interned so thousands of
+    messages share a handful of string objects. A message that is still
+    streaming collects its chunks in a list and is joined once on ``close``.
+
+    With a ``HistoryStore`` every change is also written to conversation
+    ``conversation_id``, and message ids are the store's row ids. ``messages``
+    then holds only what has been loaded: ``load`` reads the newest page (or
+    a page around one message, for search results) and ``load_older`` and
+    ``load_newer`` extend it while ``has_older`` / ``has_newer`` are true.
+    """
+
+    def __init__(self, store=None, conversation_id=None):
+        self.messages = []
+        self._by_id = {}
+        self._next_id = 0
+        self._open_parts = None
+        self.store = store
+        self.conversation_id = conversation_id
+        self.has_older = False
+        self.has_newer = False
+
+    def __len__(self):
+        return len(self.messages)
+
+    def get(self, msg_id):
+        return self._by_id.get(msg_id)
+
+    def _message(self, msg_id, speaker, kind, align, text):
+        return Message(msg_id, sys.intern(speaker or ""), sys.intern(kind), sys.intern(align), text)
+
+    def add(self, speaker, kind, text="", align="left", open=False):
+        self.close()
+        if self.store is not None:
+            msg_id = self.store.add(self.conversation_id, speaker or "", kind, align, text, complete=not open)
+        else:
+            msg_id = self._next_id
+            self._next_id += 1
+        message = self._message(msg_id, speaker, kind, align, text)
+        self.messages.append(message)
+        self._by_id[message.id] = message
+        if open:
+            self._open_parts = [text] if text else []
+        return message
+
+    @property
+    def open_message(self):
+        return self.messages[-1] if self._open_parts is not None else None
+
+    def append_text(self, text):
+        self._open_parts.append(text)
+        if self.store is not None:
+            self.store.append(self.messages[-1].id, text)
+
+    def close(self):
+        """Finish the streaming message, if any; returns it."""
+        if self._open_parts is None:
+            return None
+        message = self.messages[-1]
+        message.text = "".join(self._open_parts)
+        self._open_parts = None
+        if self.store is not None:
+            self.store.finish(message.id)
+        return message
+
+    def pop(self):
+        self.close()
+        message = self.messages.pop()
+        del self._by_id[message.id]
+        if self.store is not None:
+            self.store.delete(message.id)
+        return message
+
+    def remove(self, msg_id):
+        """Remove one message; returns it."""
+        message = self._by_id.pop(msg_id)
+        if message is self.open_message:
+            self._open_parts = None
+        self.messages.remove(message)
+        if self.store is not None:
+            self.store.delete(message.id)
+        return message
+
+    def truncate(self, msg_id):
+        """Remove ``msg_id`` and every message after it; returns the removed list."""
+        self.close()
+        index = self.messages.index(self._by_id[msg_id])
+        removed = self.messages[index:]
+        del self.messages[index:]
+        for message in removed:
+            del self._by_id[message.id]
+        if self.store is not None:
+            self.store.truncate(self.conversation_id, msg_id)
+        return removed
+
+    def load(self, limit=50, around=None):
+        """Replace the loaded messages with ``limit`` from the store.
+
+        Normally these are the newest; with ``around`` (a message id) they are
+        the page centred on that message.
+        """
+        if around is None:
+            older_limit, newer_limit = limit, 0
+            older, newer = self.store.recent(self.conversation_id, limit), []
+        else:
+            newer_limit = limit // 2
+            older_limit = limit - newer_limit
+            older = self.store.older(self.conversation_id, around + 1, older_limit)
+            newer = self.store.newer(self.conversation_id, around, newer_limit)
+        self.messages = [self._message(*row) for row in older + newer]
+        self._by_id = {message.id: message for message in self.messages}
+        self._open_parts = None
+        self.has_older = len(older) == older_limit
+        self.has_newer = newer_limit > 0 and len(newer) == newer_limit
+        return self.messages
+
+    def load_older(self, limit=50):
+        """Prepend up to ``limit`` earlier messages from the store; returns how many."""
+        if not self.has_older:
+            return 0
+        before = self.messages[0].id if self.messages else None
+        rows = self.store.older(self.conversation_id, before, limit)
+        older = [self._message(*row) for row in rows]
+        for message in older:
+            self._by_id[message.id] = message
+        self.messages[:0] = older
+        self.has_older = len(rows) == limit
+        return len(older)
+
+    def load_newer(self, limit=50):
+        """Append up to ``limit`` later messages from the store; returns how many."""
+        if not self.has_newer:
+            return 0
+        rows = self.store.newer(self.conversation_id, self.messages[-1].id, limit)
+        newer = [self._message(*row) for row in rows]
+        for message in newer:
+            self._by_id[message.id] = message
+        self.messages.extend(newer)
+        self.has_newer = len(rows) == limit
+        return len(newer)
+
+class TranscriptView:
+    """Renders the tail of a ``Transcript`` into a Tk Text widget.
+
+    At most ``window`` messages are kept in the widget; older ones are
+    dropped from the top as new ones arrive and are loaded back a ``page``
+    at a time when the user scrolls to the top.
+
+    Every rendered message is bracketed by two marks, ``msg<id>`` and
+    ``msg<id>.end``, set when it is inserted. They form the message index:
+    finding, deleting or truncating at a message is a single range
+    operation on the widget, never a line count. The end mark has right
+    gravity only while the message is still streaming, so appended text
+    lands inside it.
+
+    Bot messages are styled as Markdown when ``markdown`` is on; a message
+    that is streaming is styled incrementally as chunks arrive.
+    """
+
+    def __init__(self, widget, transcript, window=200, page=50, markdown=True):
+        self.widget = widget
+        self.transcript = transcript
+        self.window = window
+        self.page = page
+        self.markdown = markdown
+        self.first = 0  # index in transcript.messages of the first rendered message
+        self._loading = False
+        self._md = None  # IncrementalMarkdown for the open message
+
+    @staticmethod
+    def mark(message):
+        return f"msg{message.id}"
+
+    @staticmethod
+    def end_mark(message):
+        return f"msg{message.id}.end"
+
+    def range(self, message):
+        """``(start, end)`` widget indices of a rendered message."""
+        return self.mark(message), self.end_mark(message)
+
+    def _unset(self, messages):
+        for message in messages:
+            self.widget.mark_unset(self.mark(message), self.end_mark(message))
+
+    def _insert(self, index, message, closed=True):
+        """Insert ``message`` at ``index`` (a mark with right gravity, or "end")."""
+        widget = self.widget
+        position = "end-1c" if index == "end" else index
+        widget.mark_set(self.mark(message), position)
+        widget.mark_gravity(self.mark(message), "left")
+        if message.kind == "note":
+            widget.insert(index, message.text + "\n", ("bold",))
+        else:
+            if message.speaker:
+                color = "user_color" if message.kind in ("user", "agent_prompt") else "bot_color"
+                widget.insert(index, message.speaker, (message.align, "bold", color))
+                widget.insert(index, ": ", (message.align,))
+            widget.insert(index, message.text + ("\n" if closed else ""), (message.align,))
+        widget.mark_set(self.end_mark(message), position)
+        widget.mark_gravity(self.end_mark(message), "left" if closed else "right")
+        if self.markdown and message.kind in ("bot", "agent"):
+            if not closed:
+                self._md = IncrementalMarkdown()
+                if message.text:
+                    self._style_tail(self._md.feed(message.text))
+            elif message.text:
+                # Text ends just before the trailing newline
+                end, length = self.end_mark(message), len(message.text) + 1
+                for start, stop, tag in render_markdown(message.text):
+                    widget.tag_add(tag, f"{end}-{length - start}c", f"{end}-{length - stop}c")
+
+    def _style_tail(self, update):
+        """Re-style the open message from ``restyle_from`` to the end of the widget."""
+        restyle_from, spans = update
+        widget, length = self.widget, self._md.length
+        start = f"end-1c-{length - restyle_from}c"
+        for tag in MARKDOWN_TAGS:
+            widget.tag_remove(tag, start, "end")
+        for begin, stop, tag in spans:
+            widget.tag_add(tag, f"end-1c-{length - begin}c", f"end-1c-{length - stop}c")
+
+    def _edit(self):
+        self.widget.configure(state="normal")
+
+    def _done(self, scroll=True):
+        if scroll:
+            self.widget.see("end")
+        self.widget.configure(state="disabled")
+
+    def add(self, speaker, kind, text="", align="left", open=False):
+        """Append a message to the transcript and render it at the bottom."""
+        self._edit()
+        if self.transcript.open_message is not None:
+            self._close_open()
+        message = self.transcript.add(speaker, kind, text, align, open)
+        self._insert("end", message, closed=not open)
+        self._trim()
+        self._done()
+        return message
+
+    def append_text(self, text):
+        """Stream more text into the open message."""
+        message = self.transcript.open_message
+        if message is None:
+            return
+        self.transcript.append_text(text)
+        self._edit()
+        self.widget.insert("end", text, (message.align,))
+        if self._md is not None:
+            self._style_tail(self._md.feed(text))
+        self._done()
+
+    def _close_open(self):
+        message = self.transcript.open_message
+        self.widget.insert("end", "\n", (message.align,))
+        self.widget.mark_gravity(self.end_mark(message), "left")
+        self._md = None
+        return self.transcript.close()
+
+    def close(self):
+        """Finish the open message with its trailing newline."""
+        if self.transcript.open_message is not None:
+            self._edit()
+            self._close_open()
+            self._done()
+
+    def remove(self, message):
+        """Delete one message from the widget and the transcript."""
+        start, end = self.range(message)
+        self._edit()
+        self.widget.delete(start, end)
+        self._unset([message])
+        if message is self.transcript.open_message:
+            self._md = None
+        self.transcript.remove(message.id)
+        self._done(scroll=False)
+
+    def truncate(self, message):
+        """Delete ``message`` and everything after it."""
+        self._edit()
+        self.widget.delete(self.mark(message), "end")
+        self._md = None
+        self._unset(self.transcript.truncate(message.id))
+        self._done()
+
+    def message_at(self, index):
+        """The rendered message containing widget ``index``, or None."""
+        name = self.widget.mark_previous(f"{index}+1c")
+        while name:
+            if name.startswith("msg") and not name.endswith(".end"):
+                return self.transcript.get(int(name[3:]))
+            name = self.widget.mark_previous(name)
+        return None
+
+    def _trim(self):
+        """Drop the oldest rendered messages once the window is exceeded."""
+        messages = self.transcript.messages
+        excess = len(messages) - self.first - self.window
+        if excess <= 0:
+            return
+        keep_from = messages[self.first + excess]
+        self.widget.delete("1.0", self.mark(keep_from))
+        self._unset(messages[self.first:self.first + excess])
+        self.first += excess
+
+    def load_older(self):
+        """Render the previous page above the current window; returns how many.
+
+        Once every loaded message is on screen, the next page is read from
+        the transcript's store, if it has one.
+        """
+        if self._loading:
+            return 0
+        if self.first == 0:
+            if not self.transcript.has_older:
+                return 0
+            self.first = self.transcript.load_older(self.page)
+            if self.first == 0:
+                return 0
+        self._loading = True
+        try:
+            messages = self.transcript.messages
+            start = max(0, self.first - self.page)
+            anchor = messages[self.first]
+            widget = self.widget
+            self._edit()
+            widget.mark_set("loading", "1.0")
+            widget.mark_gravity("loading", "right")
+            for message in messages[start:self.first]:
+                self._insert("loading", message)
+            # The old first mark sat at 1.0 with left gravity; move it back
+            # behind the text that was just inserted in front of it.
+            widget.mark_set(self.mark(anchor), "loading")
+            widget.mark_unset("loading")
+            self._done(scroll=False)
+            widget.yview(self.mark(anchor))
+            count = self.first - start
+            self.first = start
+            return count
+        finally:
+            self._loading = False
+
+    def load(self, around=None):
+        """Replace what is shown with the newest page from the transcript's store,
+        or with the page around message id ``around``."""
+        self._unset(self.transcript.messages[self.first:])
+        self.transcript.load(self.page, around)
+        self.first = 0
+        self.rerender()
+
+    def load_newer(self):
+        """Render the next page below the window after a jump into the past."""
+        count = self.transcript.load_newer(self.page)
+        if count:
+            self._edit()
+            for message in self.transcript.messages[-count:]:
+                self._insert("end", message)
+            self._trim()
+            self._done(scroll=False)
+        return count
+
+    def show(self, message):
+        """Scroll to a rendered message and highlight it."""
+        start, end = self.range(message)
+        self.widget.tag_remove("highlight", "1.0", "end")
+        self.widget.tag_add("highlight", start, end)
+        self.widget.see(end)
+        self.widget.see(start)
+
+    def rerender(self):
+        """Redraw the newest ``window`` messages from the model."""
+        messages = self.transcript.messages
+        self._edit()
+        self._unset(messages[self.first:])
+        self._md = None
+        self.widget.delete("1.0", "end")
+        self.first = max(0, len(messages) - self.window)
+        open_message = self.transcript.open_message
+        for message in messages[self.first:]:
+            if message is open_message:
+                message.text = "".join(self.transcript._open_parts)
+            self._insert("end", message, closed=message is not open_message)
+        self._done()
+
+    def on_scroll(self, first, last):
+        """``yscrollcommand`` hook: load more messages when the top or bottom is reached."""
+        if float(first) <= 0.0 and (self.first > 0 or self.transcript.has_older):
+            self.widget.after_idle(self.load_older)
+        elif float(last) >= 1.0 and self.transcript.has_newer:
+            self.widget.after_idle(self.load_newer)
@@ -4,16 +4,41 @@
 import tkinter as tk
 import customtkinter as ctk
 from tkinter import scrolledtext
-import markdown2
+import importlib
+import logging
+import os
 import threading
-import time
 from settings import SettingsDialog
+from api import early_stop_fields
+from async_api import AsyncOllamaAPI, LoopThread
+from conversation import ConversationSession
+from ui_dispatch import UIDispatcher, StartMessage, AppendText, EndMessage, SetBusy
+from transcript import Transcript, TranscriptView
+from markdown_render import configure_markdown_tags
+from history import ChatHistory
+from history_store import HistoryStore
+from model_catalog import ModelCatalog, describe
+from model_lifecycle import ModelLifecycle, format_size, parse_size
+from metrics import Metrics, format_status
+from comparison import Comparison, ComparisonView, ModelPicker
+from paths import data_dir
+
+log = logging.getLogger(__name__)
 
 class ChatApp:
-    def __init__(self, root, api, agent=None):
+    def __init__(self, root, api, agent=None, async_api=None):
         """Initialize the chat application GUI with Markdown and agentic support."""
         self.root = root
         self.api = api
+        # One event loop in one background thread serves every prompt
+        self.async_api = async_api or AsyncOllamaAPI(base_url=api.base_url)
+        self.loop = LoopThread()
+        self._stream_future = None
+        # Model list and metadata, refreshed in the background and cached on disk
+        self.catalog = ModelCatalog(self.async_api, self.loop)
+        # Preloads the selected model and tracks what Ollama has in memory;
+        # PYLLAMAUI_MEMORY_BUDGET (e.g. "12G") unloads idle models past that size
+        self.lifecycle = ModelLifecycle(self.async_api, self.loop, memory_budget=self._memory_budget())
         self.agent = agent  # AgenticWorkflow instance, optional
         self.root.title("PyLlamaUI")
         self.root.geometry("600x500")
@@ -22,9 +47,16 @@ class ChatApp:
         self._stop_stream = threading.Event()
         self._streaming = False
 
-        # Undo/redo stacks for normal mode
-        self.prompt_stack = []
-        self.undo_stack = []
+        # Conversation state sent to Ollama (Normal mode)
+        self.session = ConversationSession()
+
+        # TTFT, tokens/s and render lag per request; one-minute histograms
+        # are appended to metrics.jsonl for later analysis
+        self.metrics = Metrics(os.environ.get("PYLLAMAUI_METRICS") or os.path.join(data_dir(), "metrics.jsonl"))
+
+        # Optional early-stop limits for every reply: a token cap, stop
+        # sequences and a wall-clock deadline (see early_stop_fields)
+        self.limits = early_stop_fields(os.environ)
 
         # Set customtkinter theme
         ctk.set_appearance_mode("dark")
@@ -82,6 +114,39 @@ class ChatApp:
         self.chat_display.tag_config("bold", font=("Arial", 11, "bold"))
         self.chat_display.tag_config("user_color", foreground="#D0A0FF") # Light Violet
         self.chat_display.tag_config("bot_color", foreground="#A0C0FF") # Light Blue
+        configure_markdown_tags(self.chat_display)
+        self.chat_display.tag_config("highlight", background="#4B2A7A")
+
+        # Messages live in the transcript model, which writes them to the
+        # history store as they happen; the widget only shows a bounded
+        # window of them and loads older ones on scroll
+        self.store = HistoryStore()
+        conversation = self.store.latest_conversation() or self.store.new_conversation()
+        self.transcript = Transcript(self.store, conversation)
+        self.view = TranscriptView(self.chat_display, self.transcript)
+        self.chat_display.configure(yscrollcommand=self._on_chat_scroll)
+        # Undo/redo history, indexed by the messages each turn created
+        self.history = ChatHistory(self.session, self.view)
+        self._load_conversation()
+        self.chat_display.bind("<Button-3>", self._show_message_menu)
+        self.root.bind("<Control-n>", lambda event: self.new_conversation())
+        self.root.protocol("WM_DELETE_WINDOW", self._on_close)
+
+        # Every widget update from a worker goes through the dispatcher,
+        # which applies it on the main loop once per frame
+        self.ui = UIDispatcher(self.root, {
+            StartMessage: self._start_message,
+            AppendText: self.view.append_text,
+            EndMessage: self.view.close,
+            SetBusy: self._set_busy,
+        }, metrics=self.metrics)
+        self.ui.start()
+        self.catalog.listeners.append(lambda: self.ui.call(self._on_models_change))
+        self.lifecycle.listeners.append(lambda: self.ui.call(self._on_models_change))
+
+        # Non-critical work (logo decoding, heavy imports) waits until the
+        # window has been painted once
+        self.root.after_idle(lambda: self.root.after(0, self._after_first_paint))
 
         # Prompt input
         self.prompt_entry = ctk.CTkEntry(
@@ -153,9 +218,44 @@ class ChatApp:
         )
         self.redo_button.grid(row=0, column=5, padx=(0,5))
 
+        # Search across every stored conversation
+        self.search_entry = ctk.CTkEntry(self.button_frame, placeholder_text="Search history...", width=150)
+        self.search_entry.grid(row=0, column=6, padx=(0,5))
+        self.search_entry.bind("<Return>", lambda event: self.show_search_results())
+        self.root.bind("<Control-f>", lambda event: self.search_entry.focus_set())
+
         # Bind Enter key to send message or run agent
         self.prompt_entry.bind("<Return>", lambda event: self.send_or_stop())
 
+        # Optional performance status bar, toggled with Ctrl+M
+        self.status_label = ctk.CTkLabel(self.main_frame, text="", font=("Arial", 10), text_color="gray")
+        self.status_label.grid(row=5, column=0, sticky="w", padx=5)
+        self.root.bind("<Control-m>", lambda event: self.toggle_status_bar())
+        self._status_visible = True
+        if not os.environ.get("PYLLAMAUI_STATUS_BAR"):
+            self.toggle_status_bar()
+
+    @staticmethod
+    def _memory_budget():
+        """``PYLLAMAUI_MEMORY_BUDGET`` in bytes; a value that cannot be read means no budget."""
+        value = os.environ.get("PYLLAMAUI_MEMORY_BUDGET")
+        try:
+            return parse_size(value)
+        except ValueError:
+            log.warning("Ignoring PYLLAMAUI_MEMORY_BUDGET=%r: expected a size such as 12G", value)
+            return None
+
+    def _after_first_paint(self):
+        """Deferred startup work, run once the first frame is on screen."""
+        # Warm the HTTP stack in the background and fetch the model list
+        # so the model menu opens instantly
+        threading.Thread(target=importlib.import_module, args=("requests",), daemon=True).start()
+        self.catalog.refresh()
+        self.lifecycle.select(self.async_api.model)
+        if self.agent:
+            # Evaluate the agent persona now so the first task only pays for its own text
+            threading.Thread(target=self.agent.prime, daemon=True).start()
+
     def open_settings(self):
         SettingsDialog(self.root)
 
@@ -188,19 +288,31 @@ class ChatApp:
         self.theme_button.configure(text=f"Theme: {new_theme}")
 
     def show_model_menu(self):
-        """Show a dropdown menu to select the model from Ollama."""
-        models = self.api.get_available_models()
-        if isinstance(models, dict) and "error" in models:
-            self._show_popup("Model Error", models["error"])
-            return
-        model_names = [m["name"] if isinstance(m, dict) and "name" in m else str(m) for m in models]
-        if not model_names:
-            self._show_popup("Model Error", "No models found from Ollama.")
-            return
-
+        """Show a dropdown menu to select the model from the cached catalogue."""
+        models = self.catalog.models()
+        self.lifecycle.refresh()
         menu = tk.Menu(self.root, tearoff=0)
-        for name in model_names:
-            menu.add_command(label=name, command=lambda n=name: self.set_model(n))
+        if not models:
+            if self.catalog.error:
+                self._show_popup("Model Error", self.catalog.error)
+                return
+            menu.add_command(label="Loading models…", state="disabled")
+        for model in models:
+            name = model.get("name", "")
+            caption = describe(self.catalog.details(name))
+            label = f"{name}  ({caption})" if caption else name
+            if self.lifecycle.is_loaded(name):
+                label = "● " + label
+            menu.add_command(label=label, command=lambda n=name: self.set_model(n))
+        if self.lifecycle.resident:
+            menu.add_separator()
+            menu.add_command(label=f"Loaded: {format_size(self.lifecycle.memory_in_use())}", state="disabled")
+            for entry in self.lifecycle.resident:
+                size = format_size(entry.get("size_vram") or entry.get("size", 0))
+                menu.add_command(label=f"  {entry.get('name')} — {size}", state="disabled")
+        if len(models) > 1:
+            menu.add_separator()
+            menu.add_command(label="Compare models…", command=self.compare_models)
         x = self.model_button.winfo_rootx()
         y = self.model_button.winfo_rooty() + self.model_button.winfo_height()
         menu.tk_popup(x, y)
@@ -208,8 +320,42 @@ class ChatApp:
     def set_model(self, model_name):
         """Set the selected model for the API and update UI label/button."""
         self.api.model = model_name
-        self.model_label.configure(text=f"Model: {model_name}")
+        self.async_api.model = model_name
         self.model_button.configure(text=model_name)
+        self._update_model_label()
+        # Load it now so the first prompt does not wait for it
+        self.lifecycle.select(model_name)
+
+    def compare_models(self):
+        """Pick models and stream the current prompt from all of them side by side."""
+        prompt = self.prompt_entry.get().strip()
+        if not prompt:
+            self._show_popup("Compare models", "Type a prompt first, then choose the models to compare.")
+            return
+        ModelPicker(self.root, self.catalog.names(),
+                    lambda models, limit: self._start_comparison(prompt, models, limit))
+
+    def _start_comparison(self, prompt, models, limit):
+        for model in models:
+            self.lifecycle.touch(model)
+        comparison = Comparison(self.async_api, self.loop, prompt, models,
+                                max_concurrent=limit, metrics=self.metrics, **self.limits)
+        ComparisonView(self.root, comparison)
+        comparison.start()
+
+    def _update_model_label(self):
+        model_name = self.async_api.model
+        caption = describe(self.catalog.details(model_name))
+        text = f"Model: {model_name}"
+        if caption:
+            text += f" ({caption})"
+        if self.lifecycle.is_loaded(model_name):
+            text += " ●"
+        self.model_label.configure(text=text)
+
+    def _on_models_change(self):
+        """The catalogue or the set of loaded models changed (main thread)."""
+        self._update_model_label()
 
     def _show_popup(self, title, message):
         popup = tk.Toplevel(self.root)
@@ -236,49 +382,64 @@ class ChatApp:
         if not prompt.strip():
             return
 
+        self._show_latest()
         # Display user prompt (right-aligned)
-        self._display_message("You", f": {prompt}\n", align="right", speaker_type="user")
-        self.prompt_stack.append((prompt, ""))
-        self.undo_stack.clear()
+        self.history.add_prompt(prompt)
 
         # Clear input
         self.prompt_entry.delete(0, tk.END)
 
         # Prepare for streaming
-        self.prompt_entry.configure(state="disabled")
         self._stop_stream.clear()
-        self._streaming = True
-        self.send_button.configure(text="Stop", state="normal")
+        self._set_busy(True)
 
-        # Start streaming response in a separate thread
-        threading.Thread(target=self._stream_response, args=(prompt,), daemon=True).start()
+        # Stream the response on the shared background event loop
+        self._stream_future = self.loop.submit(self._stream_response(prompt, self.api.model))
 
     def stop_streaming(self):
-        """Signal the streaming thread to stop."""
+        """Signal the streaming task to stop and abort its HTTP stream."""
         self._stop_stream.set()
+        if self._stream_future is not None:
+            self._stream_future.cancel()
         self.send_button.configure(state="disabled")
 
-    def _stream_response(self, prompt):
-        """Stream and display the Ollama response with a typing effect (Normal mode)."""
-        response_text = ""
-        self._display_message("PyLlamaUI", ": ", align="left", speaker_type="bot")
+    async def _stream_response(self, prompt, model):
+        """Stream the Ollama response into the chat display (Normal mode).
 
-        for chunk in self.api.send_prompt(prompt, stream=True):
-            if self._stop_stream.is_set():
-                break
-            response_text += chunk
-            self._display_message(None, chunk, align="left", append=True, speaker_type="bot")
-            time.sleep(0.01) # Faster typing usually feels better
-
-        if not self._stop_stream.is_set():
-            self._display_message(None, "\n", align="left", append=True, speaker_type="bot")
-            self.prompt_stack[-1] = (prompt, response_text)
-
-        def reset():
-            self.prompt_entry.configure(state="normal")
-            self.send_button.configure(text="Send", state="normal")
-            self._streaming = False
-        self.root.after(0, reset)
+        Runs on the background loop; all widget updates go through the
+        dispatcher so Tk is only touched from the main thread.
+        """
+        response_text = ""
+        stats = {}
+        timer = self.metrics.request(model)
+        shown = 0.0
+        self.ui.post(StartMessage("PyLlamaUI", "", "left", "bot"))
+        self.ui.call(self.history.attach_reply)
+        self.lifecycle.touch(model)
+
+        try:
+            async for chunk in self.session.stream(self.async_api, model=model, stats=stats,
+                                                   keep_alive=self.lifecycle.keep_alive_for(model),
+                                                   **self.limits):
+                if self._stop_stream.is_set():
+                    break
+                response_text += chunk
+                self.ui.append_text(chunk)
+                now = timer.chunk()
+                if self._status_visible and now - shown > 0.5:
+                    shown = now
+                    snapshot = timer.snapshot()
+                    self.ui.call(lambda: self._update_status_bar(snapshot))
+
+            if not self._stop_stream.is_set():
+                record = timer.finish(stats)
+                self.ui.call(lambda: self._update_status_bar(record))
+        finally:
+            # Stopped or not, the turn keeps the text shown so far, so the
+            # next request does not see a prompt without its reply
+            self.ui.post(EndMessage())
+            self.session.complete(response_text, stats, model)
+            self.ui.post(SetBusy(False))
 
     def run_agent(self):
         """Run an agentic workflow based on the prompt (Agentic mode)."""
@@ -290,69 +451,152 @@ class ChatApp:
         if not prompt.strip():
             return
 
-        self._display_message("You", f": {prompt}\n", align="right", speaker_type="user")
+        self._show_latest()
+        # Agent runs are not chat turns: kept out of ChatHistory and the session
+        self.view.add("You", "agent_prompt", prompt, align="right")
         self.prompt_entry.delete(0, tk.END)
 
-        self.prompt_entry.configure(state="disabled")
         self._stop_stream.clear()
-        self._streaming = True
-        self.send_button.configure(text="Stop", state="normal")
+        self._set_busy(True)
 
         threading.Thread(target=self._run_agent_tasks, args=(prompt,), daemon=True).start()
 
     def _run_agent_tasks(self, prompt):
-        """Execute agentic tasks and display results."""
-        self._display_message("PyLlamaUI", ": Processing...\n", align="left", speaker_type="bot")
+        """Execute agentic tasks and display results (worker thread)."""
+        self.ui.post(StartMessage("PyLlamaUI", "Processing...", "left", "agent"))
         self.agent.add_task("process", prompt)
 
-        for result in self.agent.run_tasks():
-            if self._stop_stream.is_set():
-                break
-            self._display_message(None, result + "\n", align="left", speaker_type="bot")
-
-        def reset():
-            self.prompt_entry.configure(state="normal")
-            self.send_button.configure(text="Send", state="normal")
-            self._streaming = False
-        self.root.after(0, reset)
+        try:
+            # Results arrive as tasks finish; Stop cancels queued and running tasks
+            progress = lambda line: self.ui.append_text("\n" + line)
+            for result in self.agent.run_tasks(stop=self._stop_stream, progress=progress):
+                if self._stop_stream.is_set():
+                    break
+                self.ui.append_text("\n" + result)
+
+            summary = self.agent.prompt_eval_summary()
+            if summary:
+                self.ui.append_text("\n" + summary)
+        except Exception as e:
+            self.ui.append_text(f"\n**Error**: {str(e)}")
+        finally:
+            # Always give the Send button back, even if a task blew up
+            self.ui.post(EndMessage())
+            self.ui.post(SetBusy(False))
 
     def undo(self):
         """Undo the last prompt and response in Normal mode."""
-        if self.prompt_stack:
-            prompt, response = self.prompt_stack.pop()
-            self.undo_stack.append((prompt, response))
-            self.chat_display.configure(state="normal")
-            # Attempt to delete last interaction. 
-            # With formatting, precise deletion is tricky. 
-            # We'll just delete from end.
-            # Ideally we'd mark ranges, but for this quick UI task:
-            self.chat_display.delete("end-50l", tk.END) # Delete last few lines (approx)
-            # This is not precise, but Tkinter text navigation for "last 2 messages" is complex without markers.
-            self.chat_display.insert(tk.END, "[Undo Action Performed - History Cleared]\n", "bold")
-            self.chat_display.configure(state="disabled")
+        if not self._streaming:
+            self.history.undo()
 
     def redo(self):
         """Redo the last undone prompt and response in Normal mode."""
-        if self.undo_stack:
-            prompt, response = self.undo_stack.pop()
-            self.prompt_stack.append((prompt, response))
-            self._display_message("You", f": {prompt}\n", align="right", speaker_type="user")
-            self._display_message("PyLlamaUI", f": {response}\n", align="left", speaker_type="bot")
-
-    def _display_message(self, speaker_name, text_content, align="left", append=False, speaker_type="bot"):
-        """Display a message in the chat window with alignment and styling."""
-        self.chat_display.configure(state="normal")
-        
-        # Tags to apply
-        base_tags = [align]
-        
-        if speaker_name:
-            name_tags = tuple(base_tags + ["bold", "user_color" if speaker_type == "user" else "bot_color"])
-            self.chat_display.insert(tk.END, speaker_name, name_tags)
-        
-        if text_content:
-            # We handle simple formatting
-            self.chat_display.insert(tk.END, text_content, tuple(base_tags))
-        
-        self.chat_display.see(tk.END)
-        self.chat_display.configure(state="disabled")
+        if not self._streaming:
+            self.history.redo()
+
+    def _load_conversation(self):
+        """Show the newest page of the current conversation and rebuild its turns."""
+        self.view.load()
+        self.history.restore()
+
+    def _show_latest(self):
+        """Go back to the end of the conversation before adding to it."""
+        if self.transcript.has_newer:
+            self._load_conversation()
+
+    def show_search_results(self):
+        """Search all stored messages and list the best matches in a menu."""
+        query = self.search_entry.get()
+        if not query.strip():
+            return
+        menu = tk.Menu(self.root, tearoff=0)
+        results = self.store.search(query)
+        if not results:
+            menu.add_command(label="No matches", state="disabled")
+        for msg_id, conversation_id, speaker, snippet in results:
+            label = f"{speaker}: {' '.join(snippet.split())}"
+            menu.add_command(label=label[:100],
+                             command=lambda c=conversation_id, m=msg_id: self.jump_to_message(c, m))
+        x = self.search_entry.winfo_rootx()
+        y = self.search_entry.winfo_rooty() + self.search_entry.winfo_height()
+        menu.tk_popup(x, y)
+
+    def jump_to_message(self, conversation_id, msg_id):
+        """Show stored message ``msg_id``, loading its conversation and page if needed."""
+        if self._streaming:
+            return
+        message = None
+        if conversation_id == self.transcript.conversation_id:
+            message = self.transcript.get(msg_id)
+            if message is not None and self.transcript.messages.index(message) < self.view.first:
+                message = None  # loaded but scrolled out of the rendered window
+        if message is None:
+            self.transcript.conversation_id = conversation_id
+            self.view.load(around=msg_id)
+            self.history.restore()
+            message = self.transcript.get(msg_id)
+        if message is not None:
+            self.view.show(message)
+
+    def new_conversation(self):
+        """Start an empty conversation; the previous one stays in the store."""
+        if self._streaming:
+            return
+        self.transcript.conversation_id = self.store.new_conversation()
+        self._load_conversation()
+
+    def toggle_status_bar(self):
+        """Show or hide the TTFT / tokens per second status bar."""
+        self._status_visible = not self._status_visible
+        if self._status_visible:
+            self.status_label.grid()
+            self._update_status_bar(self.metrics.last)
+        else:
+            self.status_label.grid_remove()
+
+    def _update_status_bar(self, record):
+        if self._status_visible:
+            text = format_status(record, self.metrics.percentile("render_lag_ms", 0.95))
+            self.status_label.configure(text=text or "No requests yet")
+
+    def _on_close(self):
+        self.metrics.flush()
+        self.ui.stop()
+        self.store.close()
+        self.root.destroy()
+
+    def _show_message_menu(self, event):
+        """Right-click menu for the message under the pointer."""
+        if self._streaming:
+            return
+        message = self.view.message_at(self.chat_display.index(f"@{event.x},{event.y}"))
+        if message is None:
+            return
+        menu = tk.Menu(self.root, tearoff=0)
+        if message.kind == "user":
+            menu.add_command(label="Edit and regenerate", command=lambda: self._edit_message(message))
+        menu.add_command(label="Delete message", command=lambda: self.history.delete(message))
+        menu.add_separator()
+        menu.add_command(label="New conversation", command=self.new_conversation)
+        menu.tk_popup(event.x_root, event.y_root)
+
+    def _edit_message(self, message):
+        """Cut the chat back to ``message`` and put its prompt in the entry for resending."""
+        prompt = self.history.edit(message)
+        if prompt is not None:
+            self.prompt_entry.delete(0, tk.END)
+            self.prompt_entry.insert(0, prompt)
+            self.prompt_entry.focus_set()
+
+    def _set_busy(self, busy):
+        """Switch between the idle (Send) and busy (Stop) input states."""
+        self._streaming = busy
+        self.prompt_entry.configure(state="disabled" if busy else "normal")
+        self.send_button.configure(text="Stop" if busy else "Send", state="normal")
+
+    def _start_message(self, speaker, text, align, speaker_type):
+        self.view.add(speaker, speaker_type, text, align=align, open=True)
+
+    def _on_chat_scroll(self, first, last):
+        self.chat_display.vbar.set(first, last)
+        self.view.on_scroll(first, last)
@@ -0,0 +1,155 @@
+# ui_dispatch.py
+# Thread-safe dispatch of UI commands from worker threads onto the Tk main loop
+
+from collections import namedtuple
+import logging
+import queue
+import time
+
+log = logging.getLogger(__name__)
+
+# Commands workers may post. The dispatcher looks up a handler per type.
+StartMessage = namedtuple("StartMessage", "speaker text align speaker_type")
+AppendText = namedtuple("AppendText", "text")
+EndMessage = namedtuple("EndMessage", "")
+SetBusy = namedtuple("SetBusy", "busy")
+Call = namedtuple("Call", "fn")
+
+class UIDispatcher:
+    """Single entry point for every widget update made off the main thread.
+
+    Workers ``post`` commands into a ``queue.SimpleQueue``; one pump on the
+    Tk main loop drains it every ``frame_ms``. Consecutive ``AppendText``
+    commands are merged, so a burst of tokens becomes one insert per frame.
+    ``handlers`` maps each command type to the function that applies it.
+
+    With ``typing_effect`` on, at most ``chars_per_frame`` characters of
+    appended text are revealed per frame; this is purely cosmetic and never
+    slows the worker down.
+
+    With ``metrics`` set, how late each frame that renders text runs is
+    recorded as ``render_lag_ms``.
+
+    A handler that raises (a ``TclError`` from a destroyed widget, say) is
+    logged and skipped; the pump keeps running for the commands after it.
+    """
+
+    def __init__(self, root, handlers, frame_ms=16, idle_ms=50,
+                 typing_effect=False, chars_per_frame=12, metrics=None):
+        self.root = root
+        self.handlers = dict(handlers)
+        self.handlers.setdefault(Call, lambda fn: fn())
+        self.frame_ms = frame_ms
+        self.idle_ms = idle_ms
+        self.typing_effect = typing_effect
+        self.chars_per_frame = chars_per_frame
+        self.metrics = metrics
+        self._queue = queue.SimpleQueue()
+        self._backlog = []  # commands drained but held back by the typing effect
+        self._after_id = None
+        self._due = None
+        # Instrumentation
+        self.frames = 0
+        self.commands = 0
+        self.chars_rendered = 0
+        self.max_queue_depth = 0
+        self.worst_pump_latency = 0.0
+        self.worst_pump_duration = 0.0
+
+    def post(self, command):
+        """Queue a command for the main thread. Safe to call from any thread."""
+        self._queue.put(command)
+
+    def append_text(self, text):
+        if text:
+            self._queue.put(AppendText(text))
+
+    def call(self, fn):
+        """Run ``fn`` on the main thread after everything posted before it."""
+        self._queue.put(Call(fn))
+
+    def start(self):
+        if self._after_id is None:
+            self._schedule(self.frame_ms)
+
+    def stop(self):
+        if self._after_id is not None:
+            self.root.after_cancel(self._after_id)
+            self._after_id = None
+
+    def stats(self):
+        """Snapshot of queue depth and pump timings (milliseconds)."""
+        return {
+            "queue_depth": self._queue.qsize(),
+            "max_queue_depth": self.max_queue_depth,
+            "worst_pump_latency_ms": self.worst_pump_latency * 1000,
+            "worst_pump_duration_ms": self.worst_pump_duration * 1000,
+            "frames": self.frames,
+            "commands": self.commands,
+        }
+
+    def _schedule(self, ms):
+        self._due = time.perf_counter() + ms / 1000
+        self._after_id = self.root.after(ms, self._pump)
+
+    def _drain(self):
+        items = self._backlog
+        self._backlog = []
+        depth = self._queue.qsize()
+        if depth > self.max_queue_depth:
+            self.max_queue_depth = depth
+        try:
+            while True:
+                items.append(self._queue.get_nowait())
+        except queue.Empty:
+            pass
+        return items
+
+    def _pump(self):
+        started = time.perf_counter()
+        lag = started - self._due
+        self.worst_pump_latency = max(self.worst_pump_latency, lag)
+        frames = self.frames
+        items = []
+        try:
+            items = self._drain()
+            budget = self.chars_per_frame if self.typing_effect else None
+            pending = []
+            for index, command in enumerate(items):
+                if type(command) is not AppendText:
+                    self._flush(pending)
+                    pending = []
+                    self._apply(type(command), *command)
+                    self.commands += 1
+                    continue
+                text = command.text
+                if budget is not None:
+                    if budget <= 0:
+                        self._backlog = items[index:]
+                        break
+                    if len(text) > budget:
+                        self._backlog = [AppendText(text[budget:])] + items[index + 1:]
+                        text = text[:budget]
+                    budget -= len(text)
+                pending.append(text)
+                self.commands += 1
+            self._flush(pending)
+            if self.metrics is not None and self.frames != frames:
+                self.metrics.record("render_lag_ms", lag * 1000)
+            self.worst_pump_duration = max(self.worst_pump_duration, time.perf_counter() - started)
+        finally:
+            # Whatever went wrong, later commands must still reach the widgets
+            self._schedule(self.frame_ms if items else self.idle_ms)
+
+    def _apply(self, kind, *args):
+        try:
+            self.handlers[kind](*args)
+        except Exception:
+            log.exception("UI handler for %s failed", kind.__name__)
+
+    def _flush(self, pending):
+        if pending:
+            text = "".join(pending)
+            self._apply(AppendText, text)
+            self.frames += 1
+            self.chars_rendered += len(text)
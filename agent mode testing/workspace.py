@@ -0,0 +1,211 @@
+# workspace.py
+# Sandboxed, transactional file writes for agent actions
+
+import hashlib
+import os
+import shutil
+import time
+
+class WorkspaceError(Exception):
+    """A path escapes the workspace, or a transaction could not be applied."""
+
+def _sha256_file(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 16), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def _fsync_dir(path):
+    # Makes renames durable on POSIX; directories cannot be opened on Windows
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return False
+    try:
+        os.fsync(fd)
+    except OSError:
+        return False
+    finally:
+        os.close(fd)
+    return True
+
+class Workspace:
+    """A directory the agent may write to, and nothing outside it.
+
+    Every path is resolved against ``root`` with symlinks followed; a path
+    that ends up outside it (``../x``, an absolute path elsewhere, a link
+    pointing out) raises ``WorkspaceError``.
+    """
+
+    def __init__(self, root):
+        self.root = os.path.realpath(root)
+
+    def resolve(self, path):
+        if not isinstance(path, str) or not path:
+            raise WorkspaceError(f"Invalid path: {path!r}")
+        try:
+            full = os.path.realpath(os.path.join(self.root, path))
+        except ValueError as e:  # e.g. an embedded NUL byte
+            raise WorkspaceError(f"Invalid path {path!r}: {e}") from None
+        if os.path.commonpath([self.root, full]) != self.root or full == self.root:
+            raise WorkspaceError(f"Path is outside the workspace: {path}")
+        return full
+
+    def transaction(self):
+        return Transaction(self)
+
+class Transaction:
+    """A set of file writes applied all together or not at all.
+
+    ``stage`` writes the new content to a temporary file next to its target
+    right away, so writing overlaps with whatever produces the next file;
+    content identical to what is on disk (by SHA-256) is skipped. ``commit``
+    fsyncs all staged files in one pass, keeps a hard link (or copy) of each
+    existing target as a backup, renames the temporary files over the
+    targets and fsyncs each directory once. A target is never missing, even
+    if the process dies half-way; replaced files keep their mode.
+    If any step fails, every target is restored. ``rollback`` discards
+    staged files. Used as a context manager it commits on success and rolls
+    back on an exception.
+
+    ``stats`` reports files written and unchanged, bytes written, fsync
+    calls and milliseconds spent in ``stage`` and ``commit``.
+    """
+
+    def __init__(self, workspace):
+        self.workspace = workspace
+        self._staged = {}  # target -> temporary file
+        self._created_dirs = []
+        self._closed = False
+        self.stats = {"files_written": 0, "files_unchanged": 0, "bytes_written": 0,
+                      "fsyncs": 0, "elapsed_ms": 0.0}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.commit()
+        else:
+            self.rollback()
+
+    def _make_dirs(self, directory):
+        missing = []
+        while not os.path.isdir(directory):
+            missing.append(directory)
+            directory = os.path.dirname(directory)
+        for path in reversed(missing):
+            os.mkdir(path)
+            self._created_dirs.append(path)
+
+    def stage(self, path, content):
+        """Write ``content`` for workspace-relative ``path``; returns "staged" or "unchanged"."""
+        if self._closed:
+            raise WorkspaceError("Transaction is already finished")
+        started = time.perf_counter()
+        target = self.workspace.resolve(path)
+        if os.path.isdir(target):
+            raise WorkspaceError(f"Path is a directory: {path}")
+        if not isinstance(content, str):
+            raise WorkspaceError(f"Content for {path} is not text")
+        try:
+            data = content.encode("utf-8")
+        except UnicodeError as e:
+            raise WorkspaceError(f"Content for {path} cannot be encoded: {e}") from None
+        try:
+            if os.path.isfile(target) and _sha256_file(target) == hashlib.sha256(data).hexdigest():
+                self._discard(target)
+                self.stats["files_unchanged"] += 1
+                return "unchanged"
+            self._make_dirs(os.path.dirname(target))
+            tmp = f"{target}.{os.getpid()}.{id(self)}.tmp"
+            with open(tmp, "wb") as f:
+                f.write(data)
+            if os.path.isfile(target):
+                # Keep the permission bits, e.g. of an executable script
+                shutil.copymode(target, tmp)
+            self._discard(target)
+            self._staged[target] = tmp
+            return "staged"
+        finally:
+            self.stats["elapsed_ms"] += (time.perf_counter() - started) * 1000
+
+    def _discard(self, target):
+        # A later action in the same reply replaces an earlier one for the same file
+        tmp = self._staged.pop(target, None)
+        if tmp is not None:
+            os.remove(tmp)
+
+    def commit(self):
+        """Apply every staged write atomically; raises ``WorkspaceError`` after restoring on failure."""
+        if self._closed:
+            raise WorkspaceError("Transaction is already finished")
+        self._closed = True
+        started = time.perf_counter()
+        try:
+            self._apply()
+        finally:
+            self.stats["elapsed_ms"] += (time.perf_counter() - started) * 1000
+        return self.stats
+
+    def _apply(self):
+        moved = []  # (target, backup or None) in the order they were replaced
+        try:
+            for tmp in self._staged.values():
+                with open(tmp, "rb+") as f:
+                    os.fsync(f.fileno())
+                self.stats["fsyncs"] += 1
+            for target, tmp in self._staged.items():
+                backup = None
+                if os.path.exists(target):
+                    # A second name for the old file, so the target itself is
+                    # only ever swapped by the one atomic rename below
+                    backup = tmp + ".bak"
+                    try:
+                        os.link(target, backup)
+                    except OSError:
+                        shutil.copy2(target, backup)
+                moved.append((target, backup))
+                os.replace(tmp, target)
+                self.stats["bytes_written"] += os.path.getsize(target)
+                self.stats["files_written"] += 1
+        except OSError as e:
+            self._restore(moved)
+            self._cleanup()
+            raise WorkspaceError(f"Could not write files, nothing was changed: {e}") from e
+        for _target, backup in moved:
+            if backup is not None:
+                os.remove(backup)
+        for directory in {os.path.dirname(target) for target in self._staged}:
+            if _fsync_dir(directory):
+                self.stats["fsyncs"] += 1
+
+    def _restore(self, moved):
+        for target, backup in reversed(moved):
+            try:
+                if backup is not None:
+                    os.replace(backup, target)
+                elif os.path.exists(target):
+                    os.remove(target)
+            except OSError:
+                pass
+
+    def _cleanup(self):
+        for tmp in self._staged.values():
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
+        for directory in reversed(self._created_dirs):
+            try:
+                os.rmdir(directory)
+            except OSError:
+                pass
+
+    def rollback(self):
+        """Discard everything staged; the workspace is left as it was."""
+        if self._closed:
+            return
+        self._closed = True
+        self._cleanup()
@@ -0,0 +1,72 @@
+# bench_action_parser.py
+# Agent reply parsing: the old wait-for-everything greedy regex against the
+# incremental ActionParser, for correctness, CPU cost and time to first action.
+#
+# Usage: python benchmarks/bench_action_parser.py
+
+import json
+import os
+import re
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, "..", "agent mode testing"))
+
+from action_parser import ActionParser
+from api import OllamaAPI
+from stub_server import StubConfig, StubOllamaServer
+
+def _reply(files=3, size=2000):
+    actions = [{"action": "create_file", "filename": f"pkg/module{i}.py", "language": "python",
+                "content": f"def handler_{i}(event):\n    return {{'id': {i}}}\n" + "# padding\n" * (size // 10)}
+               for i in range(files)]
+    prose = "I will create the files (note: config uses {placeholders}).\n"
+    return prose + "\n".join("```json\n" + json.dumps(a) + "\n```" for a in actions) + "\nDone.", actions
+
+def _greedy(text):
+    match = re.search(r'\{.*\}', text, re.DOTALL)
+    try:
+        data = json.loads(match.group(0)) if match else None
+    except ValueError:
+        return []
+    return [data] if isinstance(data, dict) and data.get("action") else []
+
+def _incremental(text, chunk=4):
+    parser = ActionParser()
+    found = []
+    for i in range(0, len(text), chunk):
+        found += parser.feed(text[i:i + chunk])
+    return found
+
+def main():
+    text, actions = _reply()
+    print(f"reply of {len(text)} chars with {len(actions)} actions and a {{placeholder}} in prose")
+    for label, fn in (("greedy regex (old)", _greedy), ("ActionParser, 4-char chunks", _incremental)):
+        start = time.perf_counter()
+        found = fn(text)
+        elapsed = (time.perf_counter() - start) * 1000
+        print(f"{label:<28} {elapsed:8.3f} ms, {len(found)} of {len(actions)} actions found")
+
+    big, _ = _reply(files=20, size=50_000)
+    start = time.perf_counter()
+    _incremental(big)
+    elapsed = time.perf_counter() - start
+    print(f"ActionParser throughput on {len(big) / 1e6:.1f} MB: {len(big) / elapsed / 1e6:.1f} MB/s")
+
+    # Time to first action while the reply streams at 2000 chunks/s
+    config = StubConfig(response=text, chunk_chars=4, tokens_per_sec=2000)
+    with StubOllamaServer(config) as server:
+        api = OllamaAPI(base_url=server.base_url)
+        parser = ActionParser()
+        first = None
+        start = time.perf_counter()
+        for chunk in api.generate_stream("make files"):
+            if parser.feed(chunk) and first is None:
+                first = time.perf_counter() - start
+        total = time.perf_counter() - start
+        print(f"streamed reply: first action ready after {first * 1000:.0f} ms, "
+              f"reply complete after {total * 1000:.0f} ms (the old parser waited for the end)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+# bench_agent_dag.py
+# Wall time of an agent task graph run sequentially (the old run_tasks) and
+# by the DAG scheduler, plus how fast Stop ends a run.
+#
+# Usage: python benchmarks/bench_agent_dag.py [max_parallel]
+
+import os
+import sys
+import threading
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, "..", "agent mode testing"))
+
+from agentic import AgenticWorkflow
+from api import OllamaAPI
+from stub_server import StubConfig, StubOllamaServer
+
+class _RecordingAPI(OllamaAPI):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.prompts = []
+
+    def generate_stream(self, prompt, *args, **kwargs):
+        self.prompts.append(prompt)
+        return super().generate_stream(prompt, *args, **kwargs)
+
+def _graph(agent):
+    """Four independent research tasks feeding one summary task."""
+    parts = [agent.add_task("process", f"Describe component {name}") for name in "ABCD"]
+    agent.add_task("process", "Write a summary of the components", depends_on=parts)
+
+def _run(agent, stop=None):
+    start = time.perf_counter()
+    order = []
+    for _ in agent.run_tasks(stop=stop):
+        order.append(agent.last_run[-1]["id"])
+    return time.perf_counter() - start, order
+
+def main(max_parallel=4):
+    config = StubConfig(tokens=40, tokens_per_sec=200)
+    with StubOllamaServer(config) as server:
+        api = OllamaAPI(base_url=server.base_url)
+        for parallel in (1, max_parallel):
+            agent = AgenticWorkflow(api, max_parallel=parallel)
+            agent.prime()
+            _graph(agent)
+            elapsed, order = _run(agent)
+            summary = agent.last_run[-1]
+            print(f"max_parallel={parallel}: {elapsed * 1000:7.1f} ms for 5 tasks, finish order {order}, "
+                  f"summary status {summary['status']}")
+
+        # Upstream outputs are appended to the downstream prompt
+        recording = _RecordingAPI(base_url=server.base_url)
+        agent = AgenticWorkflow(recording, max_parallel=max_parallel)
+        agent.primed = True
+        first = agent.add_task("process", "Step one")
+        agent.add_task("process", "Step two", depends_on=first)
+        _run(agent)
+        print(f"downstream prompt carries upstream result: {'Task 0 result:' in recording.prompts[-1]}")
+
+        # Stop shortly after starting: pending tasks are cancelled, running streams closed
+        agent = AgenticWorkflow(api, max_parallel=max_parallel)
+        agent.primed = True
+        _graph(agent)
+        stop = threading.Event()
+        threading.Timer(0.05, stop.set).start()
+        aborted = server.aborted
+        elapsed, _ = _run(agent, stop)
+        time.sleep(0.2)
+        statuses = [record["status"] for record in agent.last_run]
+        print(f"stop after 50 ms: run ended after {elapsed * 1000:.1f} ms, statuses {statuses}, "
+              f"server saw {server.aborted - aborted} aborted streams")
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 4)
@@ -0,0 +1,60 @@
+# bench_agent_prompt.py
+# Prompt-eval tokens and time per agent task: the persona pasted in front of
+# every prompt (the old AgenticWorkflow) against the system field plus a
+# primed KV cache.
+#
+# Usage: python benchmarks/bench_agent_prompt.py [tasks]
+
+import os
+import sys
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, "..", "agent mode testing"))
+
+from agentic import SYSTEM_PROMPT, AgenticWorkflow
+from api import OllamaAPI
+from stub_server import StubConfig, StubOllamaServer
+
+TASKS = [
+    "Write a Python function that reverses a string",
+    "Explain what a binary search does",
+    "Create hello.c that prints hello world",
+    "What is the difference between a list and a tuple?",
+]
+
+def _row(label, stats):
+    def mean(entries, field, scale=1):
+        return sum(e.get(field, 0) for e in entries) / max(len(entries), 1) / scale
+    first, rest = stats[:1], stats[1:]
+    print(f"{label:<26} first task {mean(first, 'prompt_eval_count'):5.0f} tokens "
+          f"{mean(first, 'prompt_eval_duration', 1e6):7.2f} ms   later tasks "
+          f"{mean(rest, 'prompt_eval_count'):5.1f} tokens {mean(rest, 'prompt_eval_duration', 1e6):7.2f} ms")
+
+def main(tasks=8):
+    # 0.2 ms per prompt token, roughly a small model on CPU
+    config = StubConfig(tokens=16, prompt_token_cost=0.0002)
+    prompts = [TASKS[i % len(TASKS)] for i in range(tasks)]
+    with StubOllamaServer(config) as server:
+        api = OllamaAPI(base_url=server.base_url)
+        before = []
+        for prompt in prompts:
+            _, stats = api.generate(f"{SYSTEM_PROMPT}\n\nUser: \"{prompt}\"")
+            before.append(stats)
+        server.kv_cache.clear()
+
+        agent = AgenticWorkflow(api, max_parallel=1)
+        agent.prime()
+        after = []
+        for prompt in prompts:
+            agent.add_task("process", prompt)
+            list(agent.run_tasks())
+            after += [record["stats"] for record in agent.last_run]
+        prime = agent.prime_stats
+
+        _row("persona in every prompt", before)
+        _row("system field, primed", after)
+        print(f"priming at startup: {prime['prompt_eval_count']} tokens, "
+              f"{prime['prompt_eval_duration'] / 1e6:.2f} ms")
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 8)
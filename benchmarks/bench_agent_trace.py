@@ -0,0 +1,78 @@
+# bench_agent_trace.py
+# Traces a run of many agent tasks against the stub server, prints where
+# the time went per phase and writes the trace as JSONL and Chrome trace.
+#
+# Usage: python benchmarks/bench_agent_trace.py [tasks] [out_dir]
+# Open <out_dir>/agent-trace.json in chrome://tracing or ui.perfetto.dev.
+
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, "..", "agent mode testing"))
+
+from agentic import AgenticWorkflow
+from api import OllamaAPI
+from stub_server import StubConfig, StubOllamaServer
+from tracing import Tracer
+from workspace import Workspace
+
+def _reply():
+    action = {"action": "create_file", "filename": "out/module.py", "language": "python",
+              "content": "def main():\n    return 0\n" * 20}
+    return "Creating the module.\n" + json.dumps(action)
+
+def main(count=200, out_dir=None):
+    out_dir = out_dir or tempfile.mkdtemp(prefix="pyllamaui-trace-")
+    root = tempfile.mkdtemp(prefix="pyllamaui-ws-")
+    config = StubConfig(response=_reply(), chunk_chars=8, tokens_per_sec=2000, ttft=0.01,
+                        prompt_token_cost=0.0002)
+    try:
+        with StubOllamaServer(config) as server:
+            jsonl = os.path.join(out_dir, "agent-trace.jsonl")
+            if os.path.exists(jsonl):
+                os.remove(jsonl)
+            tracer = Tracer(jsonl)
+            agent = AgenticWorkflow(OllamaAPI(base_url=server.base_url), max_parallel=4,
+                                    workspace=Workspace(root), tracer=tracer)
+            previous = None
+            for i in range(count):
+                # Every tenth task builds on the one before it
+                depends_on = previous if i % 10 == 9 else None
+                previous = agent.add_task("process", f"Write module {i}", depends_on=depends_on)
+            start = time.perf_counter()
+            statuses = [agent.last_run[-1]["status"] for _ in agent.run_tasks()]
+            elapsed = time.perf_counter() - start
+            tracer.close()
+
+        print(f"{count} tasks, max_parallel=4: {elapsed:.2f} s, {statuses.count('done')} done")
+        print(tracer.summary())
+        records = [r for r in tracer.records if r["name"] == "task"]
+        tokens = sum(r.get("eval_count", 0) for r in records)
+        print(f"generated tokens: {tokens}, prompt tokens: {sum(r.get('prompt_eval_count', 0) for r in records)}")
+
+        chrome = os.path.join(out_dir, "agent-trace.json")
+        tracer.export_chrome(chrome)
+        with open(jsonl) as f:
+            lines = sum(1 for _ in f)
+        print(f"wrote {lines} spans to {jsonl} and {chrome}")
+
+        # Cost of tracing itself: one span with four phases, finished to memory
+        probe = Tracer()
+        start = time.perf_counter()
+        for _ in range(10000):
+            span = probe.start("task", id=0)
+            for name in ("queue_wait", "ttft", "generation", "commit"):
+                span.phase(name, span.start)
+            span.add("parse", 0.001)
+            probe.finish(span, status="done")
+        print(f"tracing overhead: {(time.perf_counter() - start) / 10000 * 1e6:.1f} us per task")
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 200, sys.argv[2] if len(sys.argv) > 2 else None)
@@ -0,0 +1,58 @@
+# bench_cache.py
+# Repeated and concurrent identical generations with and without ResponseCache.
+#
+# Usage: python benchmarks/bench_cache.py [repeats] [concurrent]
+
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "code_files"))
+
+from api import OllamaAPI
+from response_cache import ResponseCache
+from stub_server import StubConfig, StubOllamaServer
+
+OPTIONS = {"options": {"seed": 42}}
+
+def _repeated(api, repeats):
+    start = time.perf_counter()
+    for _ in range(repeats):
+        api.generate("Write a function that adds two numbers", **OPTIONS)
+    return time.perf_counter() - start
+
+def _concurrent(api, clients):
+    def stream():
+        "".join(api.generate_stream("Summarise the report", **OPTIONS))
+    threads = [threading.Thread(target=stream) for _ in range(clients)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return time.perf_counter() - start
+
+def _generations(server, before):
+    return server.requests - before
+
+def main(repeats=10, clients=8):
+    config = StubConfig(tokens=64, tokens_per_sec=400, ttft=0.05)
+    with StubOllamaServer(config) as server, tempfile.TemporaryDirectory() as tmp:
+        for label, cache in (("no cache", None), ("ResponseCache", ResponseCache(directory=tmp))):
+            api = OllamaAPI(base_url=server.base_url, cache=cache)
+            api.get_available_models()  # warm the connection pool
+            before = server.requests
+            elapsed = _repeated(api, repeats)
+            print(f"{label:<14} {repeats} identical prompts: {elapsed * 1000:8.1f} ms, "
+                  f"{_generations(server, before)} requests to the server")
+            before = server.requests
+            elapsed = _concurrent(api, clients)
+            print(f"{label:<14} {clients} concurrent identical streams: {elapsed * 1000:8.1f} ms, "
+                  f"{_generations(server, before)} requests to the server")
+            api.close()
+
+if __name__ == "__main__":
+    args = [int(a) for a in sys.argv[1:3]]
+    main(*args)
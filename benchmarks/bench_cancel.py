@@ -0,0 +1,201 @@
+# bench_cancel.py
+# Stop and early-stop controls: how long the server keeps generating after Stop
+# (flag only vs closing the connection, sync and async clients, mid-stream and
+# while waiting for the first token), and num_predict, stop sequences and a
+# deadline against a server that honours them and one that ignores them.
+#
+# Usage: python benchmarks/bench_cancel.py
+#
+# Exits with status 1 if the server went on generating for more than
+# BOUND_MS after Stop or a deadline, or a limit was not enforced.
+
+import os
+import sys
+import threading
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, "..", "code_files"))
+
+from api import OllamaAPI
+from async_api import AsyncOllamaAPI, LoopThread
+from stub_server import StubConfig, StubOllamaServer
+
+PROMPT = "Tell me a long story"
+# Server-side work must stop within this long after Stop or a deadline
+BOUND_MS = 100.0
+# Tokens a server that ignores a limit may produce past it before it notices
+SLACK_TOKENS = 5
+
+def _server_stop_ms(server, aborted, since, wait=1.0):
+    """Milliseconds from ``since`` until the stub gave up on the generation; None if it never did."""
+    end = time.perf_counter() + wait
+    while server.aborted == aborted and time.perf_counter() < end:
+        time.sleep(0.002)
+    return (server.last_abort - since) * 1000 if server.aborted > aborted else None
+
+def _flag_only(server, after):
+    """Stop as a flag checked per chunk, with the response left open: tokens generated after Stop."""
+    api = OllamaAPI(base_url=server.base_url)
+    stream = api.generate_stream(PROMPT)
+    start = time.perf_counter()
+    for _ in stream:
+        if time.perf_counter() - start > after:
+            break
+    generated = server.generated
+    time.sleep(0.5)
+    tokens = server.generated - generated
+    stream.close()
+    return tokens
+
+def _sync_stop(server, after, warm=False, **fields):
+    """``OllamaAPI`` stream with ``cancel`` set from another thread after ``after`` seconds.
+
+    With ``warm`` the request goes out on a pooled keep-alive connection,
+    as it does in the app once the model list has been fetched.
+    """
+    api = OllamaAPI(base_url=server.base_url)
+    if warm:
+        api.get_available_models()
+    cancel = threading.Event()
+    stats = {}
+    returned = []
+    thread = threading.Thread(target=lambda: (list(api.generate_stream(PROMPT, stats=stats, cancel=cancel, **fields)),
+                                              returned.append(time.perf_counter())))
+    thread.start()
+    time.sleep(after)
+    aborted = server.aborted
+    pressed = time.perf_counter()
+    cancel.set()
+    thread.join()
+    return (returned[0] - pressed) * 1000, _server_stop_ms(server, aborted, pressed), stats.get("done_reason")
+
+def _async_stop(server, loop, after, warm=False):
+    """``AsyncOllamaAPI`` stream whose task is cancelled after ``after`` seconds, as ChatApp's Stop does.
+
+    With ``warm`` the pool already holds a connection (ChatApp's catalog
+    and model preload use it at startup), so the request reuses it.
+    """
+    api = AsyncOllamaAPI(base_url=server.base_url)
+    if warm:
+        loop.submit(api.list_models()).result()
+
+    async def consume():
+        async for _ in api.generate_stream(PROMPT):
+            pass
+
+    future = loop.submit(consume())
+    time.sleep(after)
+    aborted = server.aborted
+    pressed = time.perf_counter()
+    future.cancel()
+    return None, _server_stop_ms(server, aborted, pressed), "cancelled"
+
+def _deadline(server, loop, deadline, use_async=False):
+    """Stream with ``deadline`` seconds: ms the client and server went past it."""
+    stats = {}
+    aborted = server.aborted
+    start = time.perf_counter()
+    if use_async:
+        api = AsyncOllamaAPI(base_url=server.base_url)
+
+        async def consume():
+            async for _ in api.generate_stream(PROMPT, stats=stats, deadline=deadline):
+                pass
+
+        loop.submit(consume()).result()
+    else:
+        list(OllamaAPI(base_url=server.base_url).generate_stream(PROMPT, stats=stats, deadline=deadline))
+    late = (time.perf_counter() - start - deadline) * 1000
+    return late, _server_stop_ms(server, aborted, start + deadline), stats.get("done_reason")
+
+def _limited(server, use_async, loop, **options):
+    """Stream with ``options``: ``(chunks, text, done_reason, tokens the server generated, aborted)``."""
+    stats = {}
+    aborted = server.aborted
+    generated = server.generated
+    if use_async:
+        api = AsyncOllamaAPI(base_url=server.base_url)
+
+        async def consume():
+            return [chunk async for chunk in api.generate_stream(PROMPT, stats=stats, options=options)]
+
+        chunks = loop.submit(consume()).result()
+    else:
+        chunks = list(OllamaAPI(base_url=server.base_url).generate_stream(PROMPT, stats=stats, options=options))
+    _server_stop_ms(server, aborted, 0, wait=0.1)
+    return (len(chunks), "".join(chunks), stats.get("done_reason"), server.generated - generated,
+            server.aborted > aborted)
+
+def main():
+    failures = []
+
+    def check(label, ok):
+        if not ok:
+            failures.append(label)
+        return "" if ok else "  FAIL"
+
+    def fmt(ms):
+        return "   never" if ms is None else f"{ms:6.1f} ms"
+
+    loop = LoopThread()
+    # 200 tokens/s for up to 100 s: without a working Stop it would go on and on
+    streaming = StubConfig(tokens=20000, tokens_per_sec=200)
+    # 5 s of prompt evaluation before the first token
+    stalled = StubConfig(tokens=20000, tokens_per_sec=200, ttft=5)
+
+    print(f"Stop: time for the server to stop generating (bound {BOUND_MS:.0f} ms)")
+    with StubOllamaServer(streaming) as server:
+        tokens = _flag_only(server, 0.3)
+        print(f"  {'flag only, response left open':<44} {tokens} tokens generated in the 500 ms after Stop")
+    for label, config, stop in (
+            ("OllamaAPI cancel, mid-stream", streaming, lambda s: _sync_stop(s, 0.3)),
+            ("OllamaAPI cancel, before 1st token", stalled, lambda s: _sync_stop(s, 0.3)),
+            ("OllamaAPI cancel, pooled, before 1st token", stalled, lambda s: _sync_stop(s, 0.3, warm=True)),
+            ("async task cancel, mid-stream", streaming, lambda s: _async_stop(s, loop, 0.3)),
+            ("async task cancel, before 1st token", stalled, lambda s: _async_stop(s, loop, 0.3)),
+            ("async task cancel, pooled, before 1st token", stalled,
+             lambda s: _async_stop(s, loop, 0.3, warm=True))):
+        with StubOllamaServer(config) as server:
+            client_ms, server_ms, reason = stop(server)
+            ok = server_ms is not None and server_ms < BOUND_MS
+            client = f", client returned in {client_ms:5.1f} ms" if client_ms is not None else ""
+            print(f"  {label:<44} server stopped after {fmt(server_ms)}{client} ({reason})"
+                  + check(label, ok))
+
+    print("Deadline of 300 ms: time past it")
+    for label, config, use_async in (
+            ("OllamaAPI, mid-stream              ", streaming, False),
+            ("OllamaAPI, before 1st token        ", stalled, False),
+            ("AsyncOllamaAPI, mid-stream         ", streaming, True),
+            ("AsyncOllamaAPI, before 1st token   ", stalled, True)):
+        with StubOllamaServer(config) as server:
+            late, server_ms, reason = _deadline(server, loop, 0.3, use_async)
+            ok = reason == "deadline" and late < BOUND_MS and server_ms is not None and server_ms < BOUND_MS
+            print(f"  {label}  client {late:5.1f} ms, server {fmt(server_ms)} ({reason})"
+                  + check("deadline " + label.strip(), ok))
+
+    print("num_predict=20 and stop=[\"tok30\"]: chunks received / tokens the server generated")
+    for honor in (True, False):
+        with StubOllamaServer(StubConfig(tokens=200, tokens_per_sec=2000, honor_options=honor)) as server:
+            for use_async in (False, True):
+                client = "async" if use_async else "sync "
+                server_kind = "honouring" if honor else "ignoring "
+                chunks, _, reason, generated, aborted = _limited(server, use_async, loop, num_predict=20)
+                ok = chunks == 20 and reason == "length" and generated <= 20 + SLACK_TOKENS and aborted != honor
+                print(f"  {client} {server_kind} server  num_predict  {chunks:3d} / {generated:3d} ({reason}, "
+                      f"{'connection closed' if aborted else 'done frame read'})"
+                      + check(f"num_predict {client.strip()} honor={honor}", ok))
+                chunks, text, reason, generated, aborted = _limited(server, use_async, loop, stop=["tok30"])
+                ok = text.endswith("tok29 ") and reason == "stop" and generated <= 30 + SLACK_TOKENS
+                print(f"  {client} {server_kind} server  stop         {chunks:3d} / {generated:3d} ({reason}, "
+                      f"{'connection closed' if aborted else 'done frame read'})"
+                      + check(f"stop {client.strip()} honor={honor}", ok))
+
+    if failures:
+        print("FAILED: " + ", ".join(failures))
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,62 @@
+# bench_catalog.py
+# Time to populate the model menu: a synchronous /api/tags call per open
+# (the old show_model_menu) against ModelCatalog's cached, background-refreshed list.
+#
+# Usage: python benchmarks/bench_catalog.py [tags_latency_ms]
+
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "code_files"))
+
+from api import OllamaAPI
+from async_api import AsyncOllamaAPI, LoopThread
+from model_catalog import ModelCatalog, describe
+from stub_server import StubConfig, StubOllamaServer
+
+MODELS = ("tinyllama", "llama3:8b", "mistral:7b", "qwen2:1.5b")
+
+def _p50(samples):
+    return statistics.median(samples) * 1000
+
+def main(tags_latency_ms=150, opens=20):
+    config = StubConfig(models=MODELS, tags_latency=tags_latency_ms / 1000)
+    with StubOllamaServer(config) as server, tempfile.TemporaryDirectory() as tmp:
+        cache_file = os.path.join(tmp, "models.json")
+
+        api = OllamaAPI(base_url=server.base_url)
+        samples = []
+        for _ in range(opens):
+            start = time.perf_counter()
+            [m["name"] for m in api.get_available_models()]
+            samples.append(time.perf_counter() - start)
+        print(f"{'sync get_available_models':<30} p50 {_p50(samples):8.3f} ms per menu open")
+
+        loop = LoopThread()
+        catalog = ModelCatalog(AsyncOllamaAPI(base_url=server.base_url), loop, cache_file=cache_file)
+        catalog.refresh().result()
+        for name in MODELS:
+            catalog.details(name)
+        while catalog._pending:
+            time.sleep(0.01)
+        samples = []
+        for _ in range(opens):
+            start = time.perf_counter()
+            [(m["name"], describe(catalog.details(m["name"]))) for m in catalog.models()]
+            samples.append(time.perf_counter() - start)
+        print(f"{'ModelCatalog (warm)':<30} p50 {_p50(samples):8.3f} ms per menu open")
+
+        # A new catalogue, as after a restart, reads the on-disk cache
+        start = time.perf_counter()
+        restarted = ModelCatalog(AsyncOllamaAPI(base_url=server.base_url), loop, cache_file=cache_file)
+        names = [(m["name"], describe(restarted.details(m["name"]))) for m in restarted.models()]
+        elapsed = (time.perf_counter() - start) * 1000
+        print(f"{'ModelCatalog (from disk)':<30} {elapsed:12.3f} ms  ({len(names)} models, e.g. {names[0][1]})")
+        restarted.refresh().result()
+        loop.stop()
+
+if __name__ == "__main__":
+    main(float(sys.argv[1]) if len(sys.argv) > 1 else 150)
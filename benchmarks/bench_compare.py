@@ -0,0 +1,67 @@
+# bench_compare.py
+# Multi-model comparison: one prompt to three models one after another (switching
+# with set_model and re-sending) vs concurrently through Comparison, with a
+# concurrency limit; then cancelling one lane mid-stream.
+#
+# Usage: python benchmarks/bench_compare.py
+
+import os
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, "..", "code_files"))
+
+from async_api import AsyncOllamaAPI, LoopThread
+from comparison import Comparison
+from metrics import format_status
+from stub_server import StubConfig, StubOllamaServer
+
+MODELS = ["llama3:8b", "mistral:7b", "phi3:mini"]
+
+async def _sequential(api, prompt):
+    for model in MODELS:
+        async for _ in api.generate_stream(prompt, model=model):
+            pass
+
+def _compare(api, loop, prompt, limit, cancel=None):
+    comparison = Comparison(api, loop, prompt, MODELS, max_concurrent=limit)
+    start = time.perf_counter()
+    future = comparison.start()
+    if cancel:
+        time.sleep(0.1)
+        comparison.cancel(cancel)
+    future.result()
+    return time.perf_counter() - start, comparison
+
+def main():
+    config = StubConfig(models=MODELS, tokens=200, tokens_per_sec=1000, ttft=0.05)
+    prompt = "Explain quicksort"
+    loop = LoopThread()
+    with StubOllamaServer(config) as server:
+        api = AsyncOllamaAPI(base_url=server.base_url)
+        loop.submit(_sequential(api, prompt)).result()  # warm up: load models, open connections
+
+        start = time.perf_counter()
+        loop.submit(_sequential(api, prompt)).result()
+        print(f"one model at a time      {(time.perf_counter() - start) * 1000:7.1f} ms")
+        for limit in (2, 3):
+            requests = server.requests
+            connections = len(server.connections)
+            elapsed, comparison = _compare(api, loop, prompt, limit)
+            print(f"Comparison, {limit} at once   {elapsed * 1000:7.1f} ms, "
+                  f"{server.requests - requests} requests, {len(server.connections) - connections} new connections")
+            for lane in comparison.lanes:
+                print(f"    {lane.model:<10} {lane.state:<9} {format_status(lane.record)}")
+
+        aborted = server.aborted
+        elapsed, comparison = _compare(api, loop, prompt, 3, cancel=MODELS[1])
+        time.sleep(0.1)
+        print(f"cancel {MODELS[1]} after 100 ms: run took {elapsed * 1000:.1f} ms, "
+              f"states {[lane.state for lane in comparison.lanes]}, "
+              f"{len(comparison.lane(MODELS[1]).text.split())} of {config.tokens} tokens received, "
+              f"server saw {server.aborted - aborted} aborted stream")
+    loop.stop()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+# bench_conversation.py
+# Time-to-first-token per turn: resending the whole transcript vs ConversationSession.
+#
+# The stub server charges prompt-evaluation time only for tokens that are not
+# already in its KV cache, the way Ollama does.
+#
+# Usage: python benchmarks/bench_conversation.py [turns]
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "code_files"))
+
+from api import OllamaAPI
+from conversation import ConversationSession
+from stub_server import StubConfig, StubOllamaServer
+
+PROMPT = " ".join(f"word{i}" for i in range(30))
+
+def _first_chunk(stream):
+    start = time.perf_counter()
+    ttft = None
+    for _ in stream:
+        if ttft is None:
+            ttft = time.perf_counter() - start
+    return ttft
+
+def run_naive(api, turns):
+    transcript = []
+    results = []
+    for turn in range(turns):
+        transcript.append(f"User: {PROMPT} q{turn}")
+        stats = {}
+        ttft = _first_chunk(api.generate_stream("\n".join(transcript) + "\nAssistant:", stats=stats))
+        transcript.append(f"Assistant: {' '.join(f'tok{i}' for i in range(60))}")
+        results.append((ttft, stats.get("prompt_eval_count")))
+    return results
+
+def run_session(api, turns, mode):
+    session = ConversationSession(mode=mode)
+    results = []
+    for turn in range(turns):
+        session.begin(f"{PROMPT} q{turn}")
+        stats = {}
+        chunks = []
+        start = time.perf_counter()
+        ttft = None
+        for chunk in session.stream(api, stats=stats):
+            if ttft is None:
+                ttft = time.perf_counter() - start
+            chunks.append(chunk)
+        session.complete("".join(chunks), stats, api.model)
+        results.append((ttft, stats.get("prompt_eval_count")))
+    return results
+
+def main(turns=20):
+    config = StubConfig(tokens=60, prompt_token_cost=0.0002)
+    rows = {}
+    for label, runner in (("naive transcript", run_naive),
+                          ("session (context)", lambda api, n: run_session(api, n, "context")),
+                          ("session (chat)", lambda api, n: run_session(api, n, "chat"))):
+        with StubOllamaServer(config) as server, OllamaAPI(base_url=server.base_url) as api:
+            rows[label] = runner(api, turns)
+
+    print(f"{'':<20}" + "".join(f"turn {t:<12}" for t in (1, 5, 10, turns)))
+    for label, results in rows.items():
+        cells = []
+        for t in (1, 5, 10, turns):
+            ttft, evaluated = results[t - 1]
+            cells.append(f"{ttft * 1000:6.1f}ms/{evaluated:<5}")
+        print(f"{label:<20}" + " ".join(cells))
+    print("(time-to-first-token / prompt tokens evaluated)")
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 20)
@@ -0,0 +1,90 @@
+# bench_history.py
+# Save and load cost of the persistent chat history at 100k messages:
+# HistoryStore (one append per message, batched streaming writes) against
+# rewriting the whole history as JSON on every message.
+#
+# Usage: python benchmarks/bench_history.py [messages]
+
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "code_files"))
+
+from history_store import HistoryStore
+from transcript import Transcript
+
+CHUNKS = 40  # streamed chunks per reply
+REPLY = "lorem ipsum dolor sit amet " * 12
+
+def _ms(seconds):
+    return seconds * 1000
+
+def _save_incremental(path, messages):
+    store = HistoryStore(path)
+    transcript = Transcript(store, store.new_conversation())
+    chunk = len(REPLY) // CHUNKS
+    samples = []
+    start = time.perf_counter()
+    for i in range(messages // 2):
+        t0 = time.perf_counter()
+        transcript.add("You", "user", f"question {i}", align="right")
+        samples.append(time.perf_counter() - t0)
+        t0 = time.perf_counter()
+        transcript.add("PyLlamaUI", "bot", open=True)
+        for k in range(CHUNKS):
+            transcript.append_text(REPLY[k * chunk:(k + 1) * chunk])
+        transcript.close()
+        samples.append(time.perf_counter() - t0)
+    total = time.perf_counter() - start
+    store.close()
+    return total, sorted(samples)
+
+def _naive_rewrite(path, history):
+    start = time.perf_counter()
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(history, f)
+    os.replace(tmp, path)
+    return time.perf_counter() - start
+
+def main(messages=100_000):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "history.sqlite3")
+        total, samples = _save_incremental(path, messages)
+        p50 = _ms(statistics.median(samples))
+        p99 = _ms(samples[int(len(samples) * 0.99) - 1])
+        size = os.path.getsize(path) + os.path.getsize(path + "-wal") if os.path.exists(path + "-wal") \
+            else os.path.getsize(path)
+        print(f"HistoryStore save: {messages} messages in {total:.2f} s "
+              f"(per message p50 {p50:.3f} ms, p99 {p99:.3f} ms, {CHUNKS} chunks per reply), "
+              f"{size / 1e6:.1f} MB")
+
+        # Launch: open the store and read the newest page; then scroll back once
+        start = time.perf_counter()
+        store = HistoryStore(path)
+        transcript = Transcript(store, store.latest_conversation())
+        transcript.load(50)
+        launch = time.perf_counter() - start
+        start = time.perf_counter()
+        transcript.load_older(50)
+        older = time.perf_counter() - start
+        print(f"HistoryStore load: newest page {_ms(launch):.3f} ms (incl. open), older page {_ms(older):.3f} ms")
+        store.close()
+
+        # Baseline: the whole history rewritten (and read back) as one JSON file
+        history = [{"speaker": "You", "text": f"question {i}"} if i % 2 == 0
+                   else {"speaker": "PyLlamaUI", "text": REPLY} for i in range(messages)]
+        json_path = os.path.join(tmp, "history.json")
+        for n in (messages // 100, messages // 10, messages):
+            print(f"JSON rewrite at {n:>7} messages: {_ms(_naive_rewrite(json_path, history[:n])):9.3f} ms per save")
+        start = time.perf_counter()
+        with open(json_path, encoding="utf-8") as f:
+            json.load(f)[-50:]
+        print(f"JSON load of {messages} messages for the newest page: {_ms(time.perf_counter() - start):.3f} ms")
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100_000)
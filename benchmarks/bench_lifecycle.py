@@ -0,0 +1,52 @@
+# bench_lifecycle.py
+# Time-to-first-token of the first prompt after a model switch, with and
+# without ModelLifecycle preloading, and eviction under a memory budget.
+#
+# Usage: python benchmarks/bench_lifecycle.py [load_time_s] [think_time_s]
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "code_files"))
+
+from async_api import AsyncOllamaAPI, LoopThread
+from model_lifecycle import ModelLifecycle, format_size
+from stub_server import StubConfig, StubOllamaServer
+
+MODELS = ("llama3:8b", "mistral:7b", "qwen2:7b")
+
+async def _first_token(api, model):
+    start = time.perf_counter()
+    async for _ in api.generate_stream("hello", model=model):
+        return time.perf_counter() - start
+
+def main(load_time=1.0, think_time=1.5):
+    config = StubConfig(models=MODELS, tokens=8, load_time=load_time, model_size=4 << 30)
+    loop = LoopThread()
+    with StubOllamaServer(config) as server:
+        api = AsyncOllamaAPI(base_url=server.base_url)
+        lifecycle = ModelLifecycle(api, loop, memory_budget=8 << 30)
+
+        # Cold: the switch does nothing, the prompt pays the load
+        time.sleep(think_time)
+        cold = loop.submit(_first_token(api, MODELS[0])).result()
+
+        # Warm: the switch starts the load while the user types
+        lifecycle.select(MODELS[1])
+        time.sleep(think_time)
+        warm = loop.submit(_first_token(api, MODELS[1])).result()
+
+        print(f"load {load_time:.1f} s, {think_time:.1f} s between switch and prompt")
+        print(f"{'first prompt, no preload':<28} TTFT {cold * 1000:8.1f} ms")
+        print(f"{'first prompt, preloaded':<28} TTFT {warm * 1000:8.1f} ms")
+
+        # Budget: two 4 GB models fit in 8 GB, the third evicts the oldest
+        lifecycle.select(MODELS[2]).result()
+        resident = ", ".join(entry["name"] for entry in lifecycle.resident)
+        print(f"resident under 8 GB budget: {resident} ({format_size(lifecycle.memory_in_use())})")
+    loop.stop()
+
+if __name__ == "__main__":
+    args = [float(a) for a in sys.argv[1:3]]
+    main(*args)
@@ -0,0 +1,66 @@
+# bench_markdown.py
+# Streams a ~50 KB Markdown response through the renderer and reports time per chunk.
+#
+# Compares IncrementalMarkdown (re-styles only the open line) with naively
+# re-rendering the whole message on every chunk.
+#
+# Usage: python benchmarks/bench_markdown.py [chunk_chars]
+
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "code_files"))
+
+from markdown_render import IncrementalMarkdown, render_markdown
+
+SECTION = """## Section {n}
+
+Some **important** text with `inline code` and a longer sentence that wraps.
+- first item with **bold**
+- second item with `code`
+1. numbered entry
+
+```python
+def handler_{n}(request):
+    return {{"status": "ok", "n": {n}}}
+```
+
+"""
+
+def build_response(target=50_000):
+    parts, n = [], 0
+    while sum(map(len, parts)) < target:
+        parts.append(SECTION.format(n=n))
+        n += 1
+    return "".join(parts)
+
+def _report(label, samples, spans):
+    samples = sorted(samples)
+    print(f"{label:<22} mean {statistics.mean(samples) * 1e6:9.1f} us   "
+          f"p99 {samples[int(len(samples) * 0.99) - 1] * 1e6:9.1f} us   "
+          f"total {sum(samples) * 1000:8.1f} ms   spans/chunk {spans / len(samples):7.1f}")
+
+def main(chunk_chars=4):
+    text = build_response()
+    chunks = [text[i:i + chunk_chars] for i in range(0, len(text), chunk_chars)]
+    print(f"{len(text)} chars in {len(chunks)} chunks of {chunk_chars}")
+
+    md, samples, spans = IncrementalMarkdown(), [], 0
+    for chunk in chunks:
+        start = time.perf_counter()
+        spans += len(md.feed(chunk)[1])
+        samples.append(time.perf_counter() - start)
+    _report("incremental", samples, spans)
+
+    received, samples, spans = "", [], 0
+    for chunk in chunks[:len(chunks) // 4]:
+        received += chunk
+        start = time.perf_counter()
+        spans += len(render_markdown(received))
+        samples.append(time.perf_counter() - start)
+    _report("naive (first 25%)", samples, spans)
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 4)
@@ -0,0 +1,72 @@
+# bench_metrics.py
+# Live metrics on a streamed request: what the status bar would show, the
+# rolling histogram file it leaves behind, and the per-chunk cost of measuring.
+#
+# Usage: python benchmarks/bench_metrics.py
+
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, "..", "code_files"))
+
+from api import OllamaAPI
+from bench_render import FakeRoot, FakeWidget
+from metrics import Metrics, format_status
+from stub_server import StubConfig, StubOllamaServer
+from ui_dispatch import AppendText, UIDispatcher
+
+def _stream(api, metrics, root, ui):
+    finished = threading.Event()
+
+    def worker():
+        stats = {}
+        timer = metrics.request(api.model)
+        for chunk in api.generate_stream("Tell me a story", stats=stats):
+            ui.append_text(chunk)
+            timer.chunk()
+        timer.finish(stats)
+        ui.call(finished.set)
+
+    threading.Thread(target=worker, daemon=True).start()
+    root.run_until(finished.is_set)
+
+def main(requests=10):
+    path = os.path.join(tempfile.mkdtemp(prefix="pyllamaui-metrics-"), "metrics.jsonl")
+    # Short windows so the run spans several lines of the export file
+    metrics = Metrics(path, window=0.5)
+    config = StubConfig(tokens=300, tokens_per_sec=1000, ttft=0.05)
+    with StubOllamaServer(config) as server:
+        api = OllamaAPI(base_url=server.base_url)
+        root, widget = FakeRoot(), FakeWidget()
+        ui = UIDispatcher(root, {AppendText: widget.insert}, metrics=metrics)
+        ui.start()
+        for _ in range(requests):
+            _stream(api, metrics, root, ui)
+            print(format_status(metrics.last, metrics.percentile("render_lag_ms", 0.95)))
+    metrics.flush()
+
+    with open(path) as f:
+        windows = [json.loads(line) for line in f]
+    print(f"{len(windows)} windows written to {path}")
+    last = windows[-1]
+    for name in Metrics.NAMES:
+        if name in last:
+            h = last[name]
+            print(f"  {name:<22} n={h['count']:<5} p50 {h['p50']:8.1f}   p95 {h['p95']:8.1f}   max {h['max']:8.1f}")
+
+    # Cost of measuring: timer.chunk per chunk plus one histogram add per frame
+    probe = Metrics()
+    timer = probe.request()
+    start = time.perf_counter()
+    for _ in range(100000):
+        timer.chunk()
+        probe.record("render_lag_ms", 1.0)
+    print(f"overhead: {(time.perf_counter() - start) / 100000 * 1e6:.2f} us per chunk")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+# bench_render.py
+# Headless benchmark of streamed-token rendering: per-token inserts vs UIDispatcher.
+#
+# A fake Tk root runs ``after`` callbacks on the calling thread and records
+# how late each one fires (main-loop latency). Each widget insert costs a
+# fixed amount of main-thread time, roughly what a Text insert + see() costs.
+#
+# The fake model emits tokens at SOURCE_RATE tokens/s.
+#
+# Usage: python benchmarks/bench_render.py [tokens]
+
+import heapq
+import itertools
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "code_files"))
+
+from ui_dispatch import AppendText, UIDispatcher
+
+INSERT_COST = 0.0003  # seconds of main-thread work per widget insert
+SOURCE_RATE = 2000    # tokens/s produced by the fake model
+
+class FakeRoot:
+    """Just enough of ``tk.Tk`` to drive ``after`` callbacks."""
+
+    def __init__(self):
+        self._timers = []
+        self._ids = itertools.count()
+        self._cancelled = set()
+        self._lock = threading.Lock()
+        self.max_lag = 0.0
+
+    def after(self, ms, fn):
+        timer_id = next(self._ids)
+        with self._lock:
+            heapq.heappush(self._timers, (time.perf_counter() + ms / 1000, timer_id, fn))
+        return timer_id
+
+    def after_cancel(self, timer_id):
+        self._cancelled.add(timer_id)
+
+    def run_until(self, done):
+        while not done():
+            with self._lock:
+                due, timer_id, fn = self._timers[0] if self._timers else (None, None, None)
+                if due is not None and due <= time.perf_counter():
+                    heapq.heappop(self._timers)
+                else:
+                    fn = None
+            if fn is None:
+                time.sleep(0.0005)
+                continue
+            if timer_id in self._cancelled:
+                continue
+            self.max_lag = max(self.max_lag, time.perf_counter() - due)
+            fn()
+
+def token_source(tokens):
+    """Yield tokens paced at SOURCE_RATE, like a fast local model."""
+    start = time.perf_counter()
+    for i in range(tokens):
+        delay = start + i / SOURCE_RATE - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        yield "tok "
+
+class FakeWidget:
+    def __init__(self):
+        self.chars = 0
+        self.inserts = 0
+
+    def insert(self, text):
+        end = time.perf_counter() + INSERT_COST
+        while time.perf_counter() < end:
+            pass
+        self.chars += len(text)
+        self.inserts += 1
+
+def bench_per_token(tokens):
+    """The old path: one insert per chunk plus a 10 ms sleep on the worker."""
+    root, widget = FakeRoot(), FakeWidget()
+    finished = threading.Event()
+
+    def worker():
+        for token in token_source(tokens):
+            root.after(0, lambda t=token: widget.insert(t))
+            time.sleep(0.01)
+        root.after(0, finished.set)
+
+    start = time.perf_counter()
+    threading.Thread(target=worker, daemon=True).start()
+    root.run_until(finished.is_set)
+    return time.perf_counter() - start, widget, root
+
+def bench_dispatcher(tokens):
+    root, widget = FakeRoot(), FakeWidget()
+    ui = UIDispatcher(root, {AppendText: widget.insert})
+    ui.start()
+    finished = threading.Event()
+
+    def worker():
+        for token in token_source(tokens):
+            ui.append_text(token)
+        ui.call(finished.set)
+
+    start = time.perf_counter()
+    threading.Thread(target=worker, daemon=True).start()
+    root.run_until(finished.is_set)
+    stats = ui.stats()
+    print(f"  dispatcher: max queue depth {stats['max_queue_depth']}, "
+          f"worst pump latency {stats['worst_pump_latency_ms']:.2f} ms, "
+          f"worst pump duration {stats['worst_pump_duration_ms']:.2f} ms")
+    return time.perf_counter() - start, widget, root
+
+def main(tokens=2000):
+    for label, bench in (("per-token insert + sleep", bench_per_token),
+                         ("UIDispatcher (16 ms)", bench_dispatcher)):
+        elapsed, widget, root = bench(tokens)
+        print(f"{label:<26} {tokens / elapsed:10.0f} tokens/s   {widget.inserts:6d} inserts   "
+              f"max main-loop lag {root.max_lag * 1000:6.2f} ms")
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 2000)
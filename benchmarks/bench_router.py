@@ -0,0 +1,129 @@
+# bench_router.py
+# Several Ollama instances behind Router: load spreading under concurrent
+# requests, model affinity (TTFT when the model is already loaded somewhere)
+# and failover when an instance goes away mid-session.
+#
+# Usage: python benchmarks/bench_router.py
+
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, "..", "code_files"))
+
+from api import OllamaAPI
+from async_api import LoopThread
+from router import Router, RoutedOllamaAPI, RoutedAsyncOllamaAPI
+from stub_server import StubConfig, StubOllamaServer
+
+# Listed with their tags, as /api/tags and /api/ps do; the app sends the bare
+# names, which must still count as the same models for affinity
+MODELS = ["llama3:latest", "mistral:latest"]
+BARE = [model.split(":")[0] for model in MODELS]
+
+def _servers(count, **config):
+    return [StubOllamaServer(StubConfig(models=MODELS, **config)).start() for _ in range(count)]
+
+def _ttft(api, model):
+    start = time.perf_counter()
+    stream = api.generate_stream("Hello", model=model)
+    next(stream)
+    ttft = time.perf_counter() - start
+    for _ in stream:
+        pass
+    return ttft
+
+def _burst(api, requests=12):
+    def one(_):
+        return "".join(api.generate_stream("Tell me a story", model=MODELS[0]))
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=requests) as pool:
+        replies = list(pool.map(one, range(requests)))
+    return time.perf_counter() - start, sum(reply.startswith("Error:") for reply in replies)
+
+def bench_spread():
+    # Each instance serves 2 generations at once, like OLLAMA_NUM_PARALLEL=2
+    servers = _servers(3, tokens=100, tokens_per_sec=1000, parallel=2)
+    try:
+        elapsed, errors = _burst(OllamaAPI(base_url=servers[0].base_url))
+        print(f"12 concurrent requests, one instance   {elapsed * 1000:7.1f} ms, {errors} errors, "
+              f"max in flight {servers[0].max_in_flight}")
+        router = Router([server.base_url for server in servers], parallel=2)
+        router.check()
+        elapsed, errors = _burst(RoutedOllamaAPI(router))
+        spread = [endpoint["requests"] for endpoint in router.stats()]
+        print(f"12 concurrent requests, Router over 3  {elapsed * 1000:7.1f} ms, {errors} errors, "
+              f"requests per instance {spread}")
+    finally:
+        for server in servers:
+            server.stop()
+
+def bench_affinity():
+    # Loading a model costs 300 ms; each instance holds a different one
+    servers = _servers(2, tokens=20, load_time=0.3)
+    try:
+        servers[0].load(MODELS[0])
+        servers[1].load(MODELS[1])
+        router = Router([server.base_url for server in servers])
+        router.check()
+        api = RoutedOllamaAPI(router)
+        ttfts = [_ttft(api, BARE[i % 2]) for i in range(6)]
+        print(f"model affinity: TTFT p50 {sorted(ttfts)[3] * 1000:6.1f} ms over 6 requests "
+              f"alternating bare model names, {sum(server.loads for server in servers) - 2} extra model loads")
+        # Round robin with no knowledge of what is loaded puts each model on the wrong instance half the time
+        cold = _servers(2, tokens=20, load_time=0.3)
+        try:
+            cold[0].load(MODELS[0])
+            cold[1].load(MODELS[1])
+            ttft = _ttft(OllamaAPI(base_url=cold[1].base_url), MODELS[0])
+            print(f"same request sent to the instance without the model: TTFT {ttft * 1000:6.1f} ms")
+        finally:
+            for server in cold:
+                server.stop()
+    finally:
+        for server in servers:
+            server.stop()
+
+def bench_failover():
+    servers = _servers(3, tokens=20, tokens_per_sec=2000)
+    try:
+        router = Router([server.base_url for server in servers], health_interval=0.5)
+        router.check()
+        api = RoutedOllamaAPI(router)
+        errors = 0
+        latencies = []
+        for i in range(30):
+            if i == 10:
+                servers[1].kill()  # instance dies mid-session
+            start = time.perf_counter()
+            reply = "".join(api.generate_stream("Hello", model=MODELS[0]))
+            latencies.append((time.perf_counter() - start) * 1000)
+            errors += reply.startswith("Error:")
+        healthy = [endpoint["healthy"] for endpoint in router.stats()]
+        print(f"failover: instance 2 stopped after 10 of 30 requests: {errors} errors, "
+              f"worst latency {max(latencies):.1f} ms, healthy now {healthy}")
+
+        loop = LoopThread()
+        async_api = RoutedAsyncOllamaAPI(router)
+
+        async def stream():
+            return "".join([chunk async for chunk in async_api.generate_stream("Hello", model=MODELS[0])])
+
+        replies = [loop.submit(stream()).result() for _ in range(6)]
+        print(f"async client over the same router: {sum(not r.startswith('Error:') for r in replies)} of 6 ok, "
+              f"requests per instance {[endpoint['requests'] for endpoint in router.stats()]}")
+        loop.stop()
+    finally:
+        for server in (servers[0], servers[2]):
+            server.stop()
+
+
+def main():
+    bench_spread()
+    bench_affinity()
+    bench_failover()
+
+if __name__ == "__main__":
+    main()
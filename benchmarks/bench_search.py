@@ -0,0 +1,71 @@
+# bench_search.py
+# Query latency of HistoryStore.search (SQLite FTS5) against a linear scan
+# of every message, on a synthetic history of a few million tokens.
+#
+# Usage: python benchmarks/bench_search.py [messages]
+
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "code_files"))
+
+from history_store import HistoryStore
+
+QUERIES = (
+    ("word", "kubernetes"),
+    ("two words", "python decorator"),
+    ("phrase", '"memory leak"'),
+    ("prefix", "deploy*"),
+    ("as you type", "asyncio ev"),
+)
+
+def _vocabulary(rng, size=20000):
+    letters = "abcdefghijklmnopqrstuvwxyz"
+    words = {"".join(rng.choice(letters) for _ in range(rng.randint(3, 9))) for _ in range(size)}
+    return sorted(words) + ["kubernetes", "python", "decorator", "memory", "leak",
+                            "deployment", "deploying", "asyncio", "event", "loop"]
+
+def _timed(fn, repeat=20):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples) * 1000, result
+
+def main(messages=100_000):
+    rng = random.Random(1)
+    vocab = _vocabulary(rng)
+    with tempfile.TemporaryDirectory() as tmp, HistoryStore(os.path.join(tmp, "history.sqlite3")) as store:
+        tokens = 0
+        start = time.perf_counter()
+        for batch in range(0, messages, 10_000):
+            conversation = store.new_conversation()
+            rows = []
+            for _ in range(10_000):
+                words = rng.choices(vocab, k=rng.randint(5, 60))
+                tokens += len(words)
+                rows.append(("PyLlamaUI", "bot", "left", " ".join(words)))
+            store.add_many(conversation, rows)
+        print(f"indexed {messages} messages, {tokens / 1e6:.1f}M tokens in {time.perf_counter() - start:.1f} s")
+
+        # Incremental update: one more message becomes searchable on insert
+        t0 = time.perf_counter()
+        msg_id = store.add(conversation, "You", "user", "right", "where is the zyzzyva config")
+        added = (time.perf_counter() - t0) * 1000
+        print(f"add + index one message: {added:.3f} ms; found: {store.search('zyzzyva')[0][0] == msg_id}")
+
+        for label, query in QUERIES:
+            fts_ms, hits = _timed(lambda: store.search(query))
+            words = [w.strip('"*') for w in query.split()]
+            where = " AND ".join(["text LIKE ?"] * len(words))
+            scan_ms, _ = _timed(lambda: store.db.execute(
+                f"SELECT id FROM messages WHERE {where}", [f"%{w}%" for w in words]).fetchall(), 3)
+            print(f"{label:<12} {query!r:<22} FTS5 {fts_ms:8.3f} ms ({len(hits)} hits)   linear scan {scan_ms:8.1f} ms")
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100_000)
@@ -0,0 +1,84 @@
+# bench_startup.py
+# Cold-start cost of PyLlamaUI: import time per module and time to the first frame.
+#
+# Import times come from ``python -X importtime``. Time-to-first-frame starts
+# the real app with PYLLAMAUI_STARTUP_PROBE=1, which prints a timestamp once
+# the first frame is painted and exits; it needs a display and the GUI
+# dependencies, and is skipped otherwise.
+#
+# Usage: python benchmarks/bench_startup.py [--app code_files] [--budget-ms N]
+
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+# Modules whose cumulative import time is worth watching
+WATCHED = ("main", "ui_components", "customtkinter", "PIL", "requests", "api", "async_api", "asyncio")
+
+def import_times(app_dir, module="main"):
+    """Cumulative import time (ms) per watched module when importing ``module``."""
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                            cwd=app_dir, capture_output=True, text=True)
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|")
+        name = name.strip()
+        if name in WATCHED and cumulative.strip().isdigit():
+            times[name] = int(cumulative) / 1000
+    error = result.returncode and result.stderr.strip().splitlines()[-1]
+    return times, error
+
+def time_to_first_frame(app_dir, runs=3):
+    samples = []
+    env = dict(os.environ, PYLLAMAUI_STARTUP_PROBE="1")
+    for _ in range(runs):
+        start = time.time()
+        result = subprocess.run([sys.executable, "main.py"], cwd=app_dir, env=env,
+                                capture_output=True, text=True, timeout=60)
+        for line in result.stdout.splitlines():
+            if line.startswith("first_frame "):
+                samples.append((float(line.split()[1]) - start) * 1000)
+                break
+        else:
+            return None, (result.stderr.strip().splitlines() or ["no output"])[-1]
+    return min(samples), None
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--app", default="code_files", help="app directory relative to the repo root")
+    parser.add_argument("--budget-ms", type=float, default=None,
+                        help="fail if time-to-first-frame (or import time of main, if no display) exceeds this")
+    args = parser.parse_args()
+    app_dir = os.path.join(ROOT, args.app)
+
+    times, error = import_times(app_dir)
+    print("cumulative import time (ms):")
+    for name in WATCHED:
+        if name in times:
+            print(f"  {name:<15} {times[name]:8.1f}")
+    if error:
+        print(f"  import main failed: {error}")
+    # The client modules must stay cheap even when the GUI stack is missing
+    client_times, _ = import_times(app_dir, "async_api")
+    print(f"  async_api alone {client_times.get('async_api', float('nan')):8.1f}"
+          f"   (requests loaded: {'requests' in client_times})")
+
+    ttff, error = time_to_first_frame(app_dir)
+    if ttff is None:
+        print(f"time to first frame: skipped ({error})")
+    else:
+        print(f"time to first frame: {ttff:.1f} ms (best of 3)")
+
+    measured = ttff if ttff is not None else times.get("main")
+    if args.budget_ms is not None and measured is not None and measured > args.budget_ms:
+        print(f"REGRESSION: {measured:.1f} ms exceeds budget of {args.budget_ms:.1f} ms")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
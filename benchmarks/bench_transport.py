@@ -0,0 +1,59 @@
+# bench_transport.py
+# Compares per-request latency of fresh connections against OllamaAPI's pooled session.
+#
+# Usage: python benchmarks/bench_transport.py [iterations]
+
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "code_files"))
+
+import requests
+from api import OllamaAPI
+from stub_server import StubConfig, StubOllamaServer
+
+def _timed(fn, iterations):
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+def _report(label, samples):
+    samples = sorted(samples)
+    p50 = statistics.median(samples) * 1000
+    p95 = samples[int(len(samples) * 0.95) - 1] * 1000
+    print(f"{label:<28} p50 {p50:7.3f} ms   p95 {p95:7.3f} ms")
+
+def main(iterations=500):
+    with StubOllamaServer(StubConfig(tokens=8)) as server:
+        url = server.base_url
+
+        def fresh_tags():
+            requests.get(f"{url}/api/tags").json()
+
+        def fresh_generate():
+            r = requests.post(f"{url}/api/generate", json={"model": "tinyllama", "prompt": "hi"}, stream=True)
+            for _ in r.iter_lines():
+                pass
+
+        with OllamaAPI(base_url=url) as api:
+            def pooled_tags():
+                api.get_available_models()
+
+            def pooled_generate():
+                for _ in api.generate_stream("hi"):
+                    pass
+
+            before = len(server.connections)
+            _report("tags: fresh connection", _timed(fresh_tags, iterations))
+            _report("tags: pooled session", _timed(pooled_tags, iterations))
+            _report("generate: fresh connection", _timed(fresh_generate, iterations))
+            _report("generate: pooled session", _timed(pooled_generate, iterations))
+            print(f"client connections opened: {len(server.connections) - before}")
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 500)
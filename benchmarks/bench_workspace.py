@@ -0,0 +1,71 @@
+# bench_workspace.py
+# Agent file writes: the old direct open(..., "w") per action against a
+# Workspace transaction (temp file + rename, one fsync batch, unchanged skip).
+#
+# Usage: python benchmarks/bench_workspace.py
+
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, "..", "agent mode testing"))
+
+from workspace import Workspace, WorkspaceError
+
+def _files(count=50, size=4000, tag=0):
+    return {f"pkg/sub{i % 5}/module{i}.py": f"# {tag}\n" + "x = 1\n" * (size // 6) for i in range(count)}
+
+def _direct(root, files):
+    for name, content in files.items():
+        path = os.path.join(root, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w") as f:
+            f.write(content)
+            f.flush()
+            os.fsync(f.fileno())
+
+def _transaction(workspace, files):
+    with workspace.transaction() as tx:
+        for name, content in files.items():
+            tx.stage(name, content)
+    return tx.stats
+
+def main():
+    root = tempfile.mkdtemp(prefix="pyllamaui-ws-")
+    try:
+        files = _files()
+        size = sum(len(c) for c in files.values())
+        print(f"{len(files)} files, {size / 1000:.0f} KB per reply")
+
+        start = time.perf_counter()
+        _direct(os.path.join(root, "direct"), files)
+        print(f"direct open('w') + fsync each   {(time.perf_counter() - start) * 1000:8.1f} ms (not atomic)")
+
+        workspace = Workspace(os.path.join(root, "tx"))
+        stats = _transaction(workspace, files)
+        print(f"transaction, first write         {stats['elapsed_ms']:8.1f} ms, "
+              f"{stats['files_written']} written, {stats['bytes_written']} bytes, {stats['fsyncs']} fsyncs")
+        stats = _transaction(workspace, files)
+        print(f"transaction, same content again  {stats['elapsed_ms']:8.1f} ms, "
+              f"{stats['files_written']} written, {stats['files_unchanged']} unchanged")
+        changed = dict(files)
+        changed.update(dict(list(_files(tag=1).items())[:5]))
+        stats = _transaction(workspace, changed)
+        print(f"transaction, 5 files changed     {stats['elapsed_ms']:8.1f} ms, "
+              f"{stats['files_written']} written, {stats['files_unchanged']} unchanged")
+
+        # A path outside the root is rejected when staged and never written
+        with workspace.transaction() as tx:
+            try:
+                tx.stage("../escape.txt", "x")
+            except WorkspaceError as e:
+                print(f"rejected: {e}")
+        print(f"escape file exists: {os.path.exists(os.path.join(root, 'escape.txt'))}")
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
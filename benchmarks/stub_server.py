@@ -0,0 +1,429 @@
+# stub_server.py
+# Minimal in-process stand-in for the Ollama REST API, used by the benchmarks
+
+from contextlib import contextmanager
+import hashlib
+import json
+import random
+import select
+import socket
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+class StubConfig:
+    def __init__(self, models=("tinyllama",), tokens=32, tokens_per_sec=0, ttft=0.0,
+                 prompt_token_cost=0.0, tags_latency=0.0, load_time=0.0, model_size=1 << 30,
+                 response=None, chunk_chars=4, write_bytes=None, fail_rate=0.0, fail_status=500,
+                 drop_after=None, seed=0, parallel=None, honor_options=True):
+        self.models = list(models)
+        self.tokens = tokens
+        self.tokens_per_sec = tokens_per_sec  # 0 means "as fast as possible"
+        self.ttft = ttft
+        # Seconds of prompt evaluation per token not already in the KV cache
+        self.prompt_token_cost = prompt_token_cost
+        # Extra delay for /api/tags and /api/show, e.g. a busy or remote server
+        self.tags_latency = tags_latency
+        # Seconds to load a model that is not resident, and its size in bytes
+        self.load_time = load_time
+        self.model_size = model_size
+        # Fixed reply text, streamed ``chunk_chars`` characters per token;
+        # by default the reply is ``tokens`` filler words
+        self.response = response
+        self.chunk_chars = chunk_chars
+        # Split the NDJSON stream into HTTP chunks of at most this many bytes,
+        # so frames arrive cut at arbitrary points
+        self.write_bytes = write_bytes
+        # Failure injection: this fraction of requests gets ``fail_status``
+        # with an Ollama-style error body, and streams are cut without their
+        # done frame after ``drop_after`` tokens. ``seed`` makes it repeatable.
+        self.fail_rate = fail_rate
+        self.fail_status = fail_status
+        self.drop_after = drop_after
+        self.seed = seed
+        # Generations served at once, like OLLAMA_NUM_PARALLEL; the rest queue
+        self.parallel = parallel
+        # Stop at options.num_predict tokens and at options.stop sequences,
+        # as Ollama does; False plays a server that ignores them
+        self.honor_options = honor_options
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, like Ollama
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    @property
+    def config(self):
+        return self.server.config
+
+    def _read_json(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        return json.loads(self.rfile.read(length) or b"{}")
+
+    def _send_json(self, obj, status=200):
+        body = json.dumps(obj).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _write_chunk(self, data):
+        size = self.config.write_bytes
+        if size and len(data) > size:
+            for i in range(0, len(data), size):
+                self._write_chunk(data[i:i + size])
+            return
+        self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+        self.wfile.flush()
+
+    def _inject_failure(self):
+        """Answer with the configured error status if this request is picked to fail."""
+        if not self.server.should_fail():
+            return False
+        if self.command == "POST":
+            self._read_json()
+        self.server.count_failure()
+        self._send_json({"error": "injected failure"}, status=self.config.fail_status)
+        return True
+
+    def _pause(self, seconds):
+        """Sleep like a busy model, but notice the client hanging up, as Ollama does.
+
+        Raises ``ConnectionResetError`` as soon as the client closes the
+        connection, instead of finding out at the next write.
+        """
+        end = time.perf_counter() + seconds
+        while True:
+            readable, _, _ = select.select([self.connection], [], [], max(0.0, min(0.01, end - time.perf_counter())))
+            if readable and not self.connection.recv(1, socket.MSG_PEEK):
+                raise ConnectionResetError("client went away")
+            if time.perf_counter() >= end:
+                return
+
+    def _limit(self, tokens, options):
+        """Apply ``num_predict`` and ``stop``; returns ``(tokens, done_reason)``."""
+        if not self.config.honor_options:
+            return tokens, "stop"
+        stops = options.get("stop") or []
+        stops = [stops] if isinstance(stops, str) else [s for s in stops if s]
+        limit = options.get("num_predict")
+        done_reason = "stop"
+        if limit is not None and 0 <= limit < len(tokens):
+            tokens, done_reason = tokens[:limit], "length"
+        text = "".join(tokens)
+        cut = min((i for i in (text.find(s) for s in stops) if i != -1), default=-1)
+        if cut == -1:
+            return tokens, done_reason
+        # The stop sequence itself is never sent
+        kept, size = [], 0
+        for token in tokens:
+            if size + len(token) >= cut:
+                kept.append(token[:cut - size])
+                break
+            kept.append(token)
+            size += len(token)
+        return [token for token in kept if token], "stop"
+
+    def _stats(self, started, prompt_eval_count, prompt_eval_duration, eval_count, load_duration=0):
+        total = time.perf_counter_ns() - started
+        return {
+            "total_duration": total,
+            "load_duration": load_duration,
+            "prompt_eval_count": prompt_eval_count,
+            "prompt_eval_duration": prompt_eval_duration,
+            "eval_count": eval_count,
+            "eval_duration": max(total - prompt_eval_duration, 1),
+        }
+
+    def _sequence(self, payload, chat):
+        """Token sequence the model would see, templated like a chat model."""
+        tokenize = self.server.tokenize
+        if chat:
+            seq = []
+            for message in payload.get("messages", []):
+                seq += tokenize(f"<|{message.get('role', 'user')}|>") + tokenize(message.get("content", ""))
+            return seq + tokenize("<|assistant|>")
+        seq = list(payload.get("context") or [])
+        if not seq and payload.get("system"):
+            seq += tokenize("<|system|>") + tokenize(payload["system"])
+        return seq + tokenize("<|user|>") + tokenize(payload.get("prompt", "")) + tokenize("<|assistant|>")
+
+    def _frame(self, payload, chat, text, done):
+        frame = {"model": payload.get("model"), "done": done}
+        if chat:
+            frame["message"] = {"role": "assistant", "content": text}
+        else:
+            frame["response"] = text
+        return frame
+
+    @staticmethod
+    def _digest(model):
+        return hashlib.sha256(model.encode()).hexdigest()
+
+    def do_GET(self):
+        self.server.count_request(self)
+        if self._inject_failure():
+            return
+        if self.path == "/api/tags":
+            time.sleep(self.config.tags_latency)
+            self._send_json({"models": [{"name": m, "model": m, "digest": self._digest(m)}
+                                        for m in self.config.models]})
+        elif self.path == "/api/ps":
+            self._send_json({"models": [
+                {"name": m, "model": m, "digest": self._digest(m), "size": size, "size_vram": size}
+                for m, size in self.server.loaded.items()]})
+        else:
+            self._send_json({"error": "not found"}, status=404)
+
+    def _show(self):
+        model = self.server.resolve(self._read_json().get("model"))
+        if model not in self.config.models:
+            self._send_json({"error": f"model '{model}' not found"}, status=404)
+            return
+        time.sleep(self.config.tags_latency)
+        self._send_json({
+            "details": {"family": "llama", "parameter_size": "1.1B", "quantization_level": "Q4_0"},
+            "model_info": {"general.architecture": "llama", "llama.context_length": 2048},
+        })
+
+    def do_POST(self):
+        self.server.count_request(self)
+        if self._inject_failure():
+            return
+        if self.path == "/api/show":
+            self._show()
+            return
+        if self.path not in ("/api/generate", "/api/chat"):
+            self._read_json()  # leave the keep-alive connection clean for the next request
+            self._send_json({"error": "not found"}, status=404)
+            return
+        chat = self.path == "/api/chat"
+        payload = self._read_json()
+        model = self.server.resolve(payload.get("model"))
+        started = time.perf_counter_ns()
+        if payload.get("keep_alive") in (0, "0", "0s"):
+            self.server.loaded.pop(model, None)
+            self._send_json(self._frame(payload, chat, "", True) | {"done_reason": "unload"})
+            return
+        with self.server.slot():
+            self._generate(payload, chat, model, started)
+
+    def _generate(self, payload, chat, model, started):
+        try:
+            self._run_generation(payload, chat, model, started)
+        except (BrokenPipeError, ConnectionResetError):
+            # Client went away (Stop, deadline); stop generating like Ollama does
+            self.server.count_abort()
+            self.close_connection = True
+
+    def _run_generation(self, payload, chat, model, started):
+        config = self.config
+        load_duration = self.server.load(model)
+        if not (payload.get("messages") if chat else payload.get("prompt")):
+            # An empty request only loads the model, as in Ollama
+            self._send_json(self._frame(payload, chat, "", True)
+                            | {"done_reason": "load", "load_duration": load_duration})
+            return
+
+        # Prompt evaluation: only the part that differs from the KV cache costs time
+        seq = self._sequence(payload, chat)
+        prompt_eval_count = len(seq) - self.server.cached_prefix(model, seq)
+        delay = config.ttft + prompt_eval_count * config.prompt_token_cost
+        if delay:
+            self._pause(delay)
+        prompt_eval_duration = time.perf_counter_ns() - started - load_duration
+
+        if config.response is not None:
+            tokens = [config.response[i:i + config.chunk_chars]
+                      for i in range(0, len(config.response), config.chunk_chars)]
+        else:
+            tokens = [f"tok{i} " for i in range(config.tokens)]
+        tokens, done_reason = self._limit(tokens, payload.get("options") or {})
+        seq += self.server.tokenize("".join(tokens))
+        self.server.kv_cache[model] = seq
+        extra = {"done_reason": done_reason}
+        if not chat:
+            extra["context"] = seq
+
+        if not payload.get("stream", True):
+            frame = self._frame(payload, chat, "".join(tokens), True)
+            frame.update(self._stats(started, prompt_eval_count, prompt_eval_duration, len(tokens), load_duration), **extra)
+            self.server.count_tokens(len(tokens))
+            self._send_json(frame)
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        delay = 1.0 / config.tokens_per_sec if config.tokens_per_sec else 0
+        for i, token in enumerate(tokens):
+            if i == config.drop_after:
+                # Simulated crash: the stream ends without a done frame
+                self.server.count_drop()
+                self.close_connection = True
+                self.wfile.flush()
+                self.connection.shutdown(socket.SHUT_RDWR)
+                return
+            if delay:
+                self._pause(delay)
+            self.server.count_tokens(1)
+            self._write_chunk(json.dumps(self._frame(payload, chat, token, False)).encode() + b"\n")
+        done = self._frame(payload, chat, "", True)
+        done.update(self._stats(started, prompt_eval_count, prompt_eval_duration, len(tokens), load_duration), **extra)
+        self._write_chunk(json.dumps(done).encode() + b"\n")
+        self._write_chunk(b"")
+
+class StubOllamaServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, config=None, host="127.0.0.1", port=0):
+        super().__init__((host, port), _Handler)
+        self.config = config or StubConfig()
+        self.connections = set()
+        self.requests = 0
+        self.aborted = 0
+        self.failures = 0
+        self.drops = 0
+        self.generated = 0  # tokens produced, streamed or not
+        self.last_abort = None  # perf_counter() when a generation last stopped for a gone client
+        self._random = random.Random(self.config.seed)
+        self._slots = threading.BoundedSemaphore(self.config.parallel) if self.config.parallel else None
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._sockets = set()
+        self.vocab = {}
+        self.kv_cache = {}  # model -> token ids of the last evaluated sequence
+        self.loaded = {}  # model -> size in bytes of the resident models
+        self.loads = 0
+        self._loading = {}  # model -> Event set once its load finishes
+        self._lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def count_request(self, handler):
+        with self._lock:
+            self.requests += 1
+            self.connections.add(handler.client_address)
+            self._sockets.add(handler.connection)
+
+    def tokenize(self, text):
+        with self._lock:
+            return [self.vocab.setdefault(word, len(self.vocab)) for word in text.split()]
+
+    def cached_prefix(self, model, seq):
+        cached = self.kv_cache.get(model, ())
+        n = 0
+        for a, b in zip(cached, seq):
+            if a != b:
+                break
+            n += 1
+        return n
+
+    def resolve(self, model):
+        """The configured name ``model`` refers to; like Ollama, a bare name means its ``:latest`` tag."""
+        if model and model not in self.config.models and ":" not in model.rsplit("/", 1)[-1]:
+            if model + ":latest" in self.config.models:
+                return model + ":latest"
+        return model
+
+    def load(self, model):
+        """Make ``model`` resident, waiting out ``load_time`` if it was not; returns ns spent."""
+        model = self.resolve(model)
+        started = time.perf_counter_ns()
+        with self._lock:
+            if model in self.loaded:
+                return 0
+            loading = self._loading.get(model)
+            if loading is None:
+                loading = self._loading[model] = threading.Event()
+                self.loads += 1
+                owner = True
+            else:
+                owner = False
+        if owner:
+            time.sleep(self.config.load_time)
+            with self._lock:
+                self.loaded[model] = self.config.model_size
+                del self._loading[model]
+            loading.set()
+        else:
+            # Requests for a model that is still loading wait for it, as in Ollama
+            loading.wait()
+        return time.perf_counter_ns() - started
+
+    @contextmanager
+    def slot(self):
+        """Hold one of the ``parallel`` generation slots, waiting for it if all are busy."""
+        with self._lock:
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        if self._slots is not None:
+            self._slots.acquire()
+        try:
+            yield
+        finally:
+            if self._slots is not None:
+                self._slots.release()
+            with self._lock:
+                self.in_flight -= 1
+
+    def should_fail(self):
+        with self._lock:
+            return self.config.fail_rate > 0 and self._random.random() < self.config.fail_rate
+
+    def count_failure(self):
+        with self._lock:
+            self.failures += 1
+
+    def count_drop(self):
+        with self._lock:
+            self.drops += 1
+
+    def handle_error(self, request, client_address):
+        # Clients hanging up mid-request (Stop, injected drops) are expected
+        if isinstance(sys.exc_info()[1], (BrokenPipeError, ConnectionResetError)):
+            return
+        super().handle_error(request, client_address)
+
+    def count_abort(self):
+        with self._lock:
+            self.aborted += 1
+            self.last_abort = time.perf_counter()
+
+    def count_tokens(self, n):
+        with self._lock:
+            self.generated += n
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def kill(self):
+        """Stop as if the process died: keep-alive connections are cut too."""
+        self.stop()
+        with self._lock:
+            sockets, self._sockets = self._sockets, set()
+        for sock in sockets:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
@@ -0,0 +1,272 @@
+# suite.py
+# Benchmark suite on the stub server: time to first token, end-to-end latency,
+# client CPU per token, UI render throughput and behaviour under injected
+# failures, saved as JSON and compared against a baseline run.
+#
+# Usage: python benchmarks/suite.py [--repeat N] [--out results.json]
+#                                   [--baseline baseline.json] [--tolerance 0.25]
+#
+# Exits with status 1 if any metric regressed past the tolerance.
+
+import argparse
+from datetime import datetime, timezone
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+# Shared modules come from code_files; the agent-only ones from agent mode testing
+sys.path.insert(0, os.path.join(HERE, "..", "agent mode testing"))
+sys.path.insert(0, os.path.join(HERE, "..", "code_files"))
+
+from agentic import AgenticWorkflow
+from api import OllamaAPI
+from bench_render import FakeRoot, FakeWidget
+from stub_server import StubConfig, StubOllamaServer
+from ui_dispatch import AppendText, UIDispatcher
+from workspace import Workspace
+
+# Metrics where a larger value is better; every other number is a cost
+_HIGHER_IS_BETTER = ("_per_s",)
+# Differences smaller than this are noise whatever the ratio
+_MIN_DELTA = 0.5
+# Tail metrics are reported but too noisy over a few dozen runs to gate on
+_INFORMATIONAL = ("_p95_", "max_")
+
+def _percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+def _timed_stream(chunks):
+    """Consume a stream; returns ``(ttft, total, client_cpu, chunk count, text)``."""
+    start = time.perf_counter()
+    cpu = time.thread_time()
+    first = None
+    parts = []
+    for chunk in chunks:
+        if first is None:
+            first = time.perf_counter() - start
+        parts.append(chunk)
+    return first, time.perf_counter() - start, time.thread_time() - cpu, len(parts), "".join(parts)
+
+def _runs(repeat, stream):
+    """``repeat`` timed streams after one untimed warm-up (connection, model load)."""
+    for _ in stream():
+        pass
+    return [_timed_stream(stream()) for _ in range(repeat)]
+
+def _stream_metrics(runs):
+    ttfts = [run[0] * 1000 for run in runs]
+    totals = [run[1] * 1000 for run in runs]
+    tokens = sum(run[3] for run in runs)
+    return {
+        "ttft_p50_ms": _percentile(ttfts, 0.5),
+        "ttft_p95_ms": _percentile(ttfts, 0.95),
+        "latency_p50_ms": _percentile(totals, 0.5),
+        "latency_p95_ms": _percentile(totals, 0.95),
+        "client_cpu_per_token_us": sum(run[2] for run in runs) / tokens * 1e6,
+        "tokens_per_s": tokens / (sum(totals) / 1000),
+    }
+
+def bench_generate(repeat):
+    """``/api/generate`` streamed: 200 tokens at 2000 tokens/s after a 20 ms TTFT."""
+    with StubOllamaServer(StubConfig(tokens=200, tokens_per_sec=2000, ttft=0.02)) as server:
+        api = OllamaAPI(base_url=server.base_url)
+        runs = _runs(repeat, lambda: api.generate_stream("Tell me a story"))
+        return _stream_metrics(runs)
+
+def bench_chat(repeat):
+    """``/api/chat`` streamed with a short message history."""
+    messages = [{"role": "user", "content": "Hello"}, {"role": "assistant", "content": "Hi!"},
+                {"role": "user", "content": "Tell me a story"}]
+    with StubOllamaServer(StubConfig(tokens=200, tokens_per_sec=2000, ttft=0.02)) as server:
+        api = OllamaAPI(base_url=server.base_url)
+        runs = _runs(repeat, lambda: api.chat_stream(messages))
+        return _stream_metrics(runs)
+
+def bench_send_prompt(repeat):
+    """``send_prompt`` without streaming: one JSON reply per request."""
+    with StubOllamaServer(StubConfig(tokens=200, ttft=0.02)) as server:
+        api = OllamaAPI(base_url=server.base_url)
+        latencies = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            api.send_prompt("Tell me a story")
+            latencies.append((time.perf_counter() - start) * 1000)
+        return {"latency_p50_ms": _percentile(latencies, 0.5), "latency_p95_ms": _percentile(latencies, 0.95)}
+
+def bench_tags(repeat):
+    """``/api/tags`` with 50 installed models."""
+    models = [f"model-{i}:latest" for i in range(50)]
+    with StubOllamaServer(StubConfig(models=models)) as server:
+        api = OllamaAPI(base_url=server.base_url)
+        latencies = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            api.get_available_models()
+            latencies.append((time.perf_counter() - start) * 1000)
+        return {"latency_p50_ms": _percentile(latencies, 0.5), "latency_p95_ms": _percentile(latencies, 0.95)}
+
+def bench_split_frames(repeat):
+    """NDJSON frames cut into 7-byte HTTP chunks; the text must arrive intact."""
+    with StubOllamaServer(StubConfig(tokens=200, write_bytes=7)) as server:
+        api = OllamaAPI(base_url=server.base_url)
+        runs = _runs(repeat, lambda: api.generate_stream("Tell me a story"))
+        expected = "".join(f"tok{i} " for i in range(200))
+        metrics = _stream_metrics(runs)
+        metrics["corrupted_replies"] = sum(run[4] != expected for run in runs)
+        return metrics
+
+def bench_failures(repeat):
+    """Injected 500s and streams cut mid-way must end as error text, never as exceptions."""
+    unhandled = 0
+    error_replies = 0
+    with StubOllamaServer(StubConfig(tokens=50, fail_rate=0.3, seed=1)) as server:
+        api = OllamaAPI(base_url=server.base_url)
+        for _ in range(repeat * 2):
+            try:
+                chunks = list(api.generate_stream("Tell me a story"))
+            except Exception:
+                unhandled += 1
+                continue
+            error_replies += chunks[-1].startswith("Error:")
+        injected = server.failures
+    detect = []
+    with StubOllamaServer(StubConfig(tokens=200, tokens_per_sec=2000, drop_after=100)) as server:
+        api = OllamaAPI(base_url=server.base_url)
+        for _ in range(repeat):
+            try:
+                start = time.perf_counter()
+                chunks = list(api.generate_stream("Tell me a story"))
+                detect.append((time.perf_counter() - start) * 1000)
+            except Exception:
+                unhandled += 1
+                continue
+            error_replies += chunks[-1].startswith("Error:")
+            injected += 1
+    return {"unhandled_exceptions": unhandled, "unreported_failures": injected - error_replies,
+            "cut_stream_detect_p50_ms": _percentile(detect, 0.5) if detect else 0.0}
+
+def bench_ui_render(repeat):
+    """Streamed tokens rendered through ``UIDispatcher`` on a fake Tk loop, as ``_stream_response`` does."""
+    config = StubConfig(tokens=2000, tokens_per_sec=4000)
+    rates, lags = [], []
+    with StubOllamaServer(config) as server:
+        api = OllamaAPI(base_url=server.base_url)
+        for _ in range(max(1, repeat // 5)):
+            root, widget = FakeRoot(), FakeWidget()
+            ui = UIDispatcher(root, {AppendText: widget.insert})
+            ui.start()
+            finished = threading.Event()
+
+            def worker():
+                for chunk in api.generate_stream("Tell me a story"):
+                    ui.append_text(chunk)
+                ui.call(finished.set)
+
+            start = time.perf_counter()
+            threading.Thread(target=worker, daemon=True).start()
+            root.run_until(finished.is_set)
+            rates.append(config.tokens / (time.perf_counter() - start))
+            lags.append(root.max_lag * 1000)
+    return {"render_tokens_per_s": _percentile(rates, 0.5), "max_main_loop_lag_ms": max(lags)}
+
+def bench_agent(repeat):
+    """``AgenticWorkflow`` running ``repeat`` file-writing tasks, 4 at a time."""
+    action = {"action": "create_file", "filename": "out/app.py", "language": "python",
+              "content": "print('hello')\n" * 20}
+    config = StubConfig(response=json.dumps(action), chunk_chars=8, tokens_per_sec=4000, ttft=0.01)
+    root = tempfile.mkdtemp(prefix="pyllamaui-suite-")
+    try:
+        with StubOllamaServer(config) as server:
+            agent = AgenticWorkflow(OllamaAPI(base_url=server.base_url), max_parallel=4,
+                                    workspace=Workspace(root))
+            agent.prime()
+            for i in range(repeat):
+                agent.add_task("process", f"Write app {i}")
+            start = time.perf_counter()
+            statuses = [agent.last_run[-1]["status"] for _ in agent.run_tasks()]
+            elapsed = (time.perf_counter() - start) * 1000
+        return {"run_ms": elapsed, "per_task_ms": elapsed / repeat,
+                "failed_tasks": len(statuses) - statuses.count("done")}
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+BENCHMARKS = {
+    "generate_stream": bench_generate,
+    "chat_stream": bench_chat,
+    "send_prompt": bench_send_prompt,
+    "tags": bench_tags,
+    "split_frames": bench_split_frames,
+    "failures": bench_failures,
+    "ui_render": bench_ui_render,
+    "agent": bench_agent,
+}
+
+def run(repeat=20, only=None):
+    results = {}
+    for name, bench in BENCHMARKS.items():
+        if only and name not in only:
+            continue
+        results[name] = {key: round(value, 3) for key, value in bench(repeat).items()}
+    return {
+        "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "repeat": repeat,
+        "results": results,
+    }
+
+def compare(results, baseline, tolerance=0.25):
+    """Lines describing each metric against ``baseline``, and whether any regressed."""
+    lines = []
+    regressed = False
+    for name, metrics in results["results"].items():
+        for key, value in metrics.items():
+            base = baseline.get("results", {}).get(name, {}).get(key)
+            if base is None:
+                lines.append(f"{name + '.' + key:<42} {value:12.3f}   (new)")
+                continue
+            higher_is_better = key.endswith(_HIGHER_IS_BETTER)
+            worse = base - value if higher_is_better else value - base
+            change = (value - base) / base * 100 if base else 0.0
+            gated = not any(marker in key for marker in _INFORMATIONAL)
+            bad = gated and worse > _MIN_DELTA and worse > abs(base) * tolerance
+            regressed = regressed or bad
+            flag = "REGRESSION" if bad else ""
+            lines.append(f"{name + '.' + key:<42} {value:12.3f}   baseline {base:12.3f}   {change:+7.1f}%  {flag}")
+    return lines, regressed
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="PyLlamaUI benchmark suite on a stub Ollama server")
+    parser.add_argument("--repeat", type=int, default=20, help="requests per benchmark")
+    parser.add_argument("--only", nargs="*", choices=list(BENCHMARKS), help="run only these benchmarks")
+    parser.add_argument("--out", help="write results to this JSON file")
+    parser.add_argument("--baseline", help="compare against a previous results file")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="allowed relative slowdown before a metric counts as a regression "
+                             "(p95 and max values are shown but not checked)")
+    args = parser.parse_args(argv)
+
+    results = run(args.repeat, args.only)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        lines, regressed = compare(results, baseline, args.tolerance)
+    else:
+        lines = [f"{name + '.' + key:<42} {value:12.3f}"
+                 for name, metrics in results["results"].items() for key, value in metrics.items()]
+        regressed = False
+    print("\n".join(lines))
+    return 1 if regressed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,41 +1,627 @@
 # api.py
 # Handles interactions with the Ollama REST API, including streaming support
 
-import requests
+import functools
 import json
+import logging
+import math
+import socket
+import threading
+import time
+from lazy_imports import lazy_import
+from response_cache import Flight, model_digests, replay, skip_chars, tagged
+
+# requests is loaded on first use, not at startup
+requests = lazy_import("requests")
+
+log = logging.getLogger(__name__)
+
+# (connect, read) timeouts in seconds. The read timeout applies between bytes
+# received, so long generations are fine as long as Ollama keeps streaming.
+DEFAULT_TIMEOUT = (3.05, 120)
 
 class OllamaAPI:
-    def __init__(self, base_url="http://localhost:11434"):
-        """Initialize the Ollama API client."""
+    def __init__(self, base_url="http://localhost:11434", timeout=DEFAULT_TIMEOUT,
+                 retries=3, backoff_factor=0.25, pool_maxsize=8, cache=None):
+        """Initialize the Ollama API client.
+
+        All calls share one pooled, keep-alive session. Idempotent calls
+        (GET /api/tags) are retried with backoff; generations are never
+        retried once the request has been sent.
+
+        With a ``ResponseCache``, deterministic generations (temperature 0
+        or a fixed seed) are answered from it, streamed ones replayed as a
+        stream, and identical requests in flight at the same time share one
+        call to Ollama.
+        """
         self.base_url = base_url
         self.model = "tinyllama"  # Default model, can be changed later
+        self.timeout = timeout
+        self._session_options = (retries, backoff_factor, pool_maxsize)
+        self._session = None
+        self.cache = cache
+        self._digests = {}  # model name -> digest, for cache keys
+        self._flights = {}  # cache key -> Flight of the request being made
+        self._flights_lock = threading.Lock()
+
+    @property
+    def session(self):
+        """The pooled session, created on first request."""
+        if self._session is None:
+            self._session = self._build_session(*self._session_options)
+        return self._session
+
+    def _build_session(self, retries, backoff_factor, pool_maxsize):
+        from requests.adapters import HTTPAdapter
+        from urllib3.util.retry import Retry
+        retry = Retry(
+            total=retries,
+            connect=retries,
+            read=retries,
+            status=retries,
+            backoff_factor=backoff_factor,
+            status_forcelist=(502, 503, 504),
+            allowed_methods=frozenset({"GET", "HEAD"}),
+            raise_on_status=False,
+        )
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_maxsize, max_retries=retry)
+        adapter.poolmanager.pool_classes_by_scheme = _watched_pools()
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        return session
+
+    def close(self):
+        """Close the pooled connections."""
+        if self._session is not None:
+            self._session.close()
+            self._session = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
 
     def get_available_models(self):
         """Retrieve list of available models from Ollama."""
         try:
-            response = requests.get(f"{self.base_url}/api/tags")
+            response = self.session.get(f"{self.base_url}/api/tags", timeout=self.timeout)
             response.raise_for_status()
             return response.json().get("models", [])
         except requests.RequestException as e:
             return {"error": f"Failed to fetch models: {str(e)}"}
 
-    def send_prompt(self, prompt, stream=False):
-        """Send a prompt to the Ollama API and return the response or stream."""
+    list_models = get_available_models
+
+    def show_model(self, name):
+        """Fetch ``/api/show`` metadata for one model, or ``{"error": ...}``."""
+        try:
+            response = self.session.post(f"{self.base_url}/api/show", json={"model": name},
+                                         timeout=self.timeout)
+            response.raise_for_status()
+            return response.json()
+        except requests.RequestException as e:
+            return {"error": f"Failed to fetch model info: {str(e)}"}
+
+    def _payload(self, prompt, model, stream, fields):
+        payload = {"model": model or self.model, "prompt": prompt, "stream": stream}
+        payload.update(fields)
+        return payload
+
+    def _chat_payload(self, messages, model, stream, fields):
+        payload = {"model": model or self.model, "messages": messages, "stream": stream}
+        payload.update(fields)
+        return payload
+
+    def running_models(self):
+        """Models currently loaded by Ollama (``/api/ps``), or ``{"error": ...}``."""
         try:
-            payload = {
-                "model": self.model,
-                "prompt": prompt,
-                "stream": stream
-            }
-            if stream:
-                response = requests.post(f"{self.base_url}/api/generate", json=payload, stream=True)
-                response.raise_for_status()
-                for line in response.iter_lines():
-                    if line:
-                        yield json.loads(line.decode('utf-8')).get("response", "")
-            else:
-                response = requests.post(f"{self.base_url}/api/generate", json=payload)
-                response.raise_for_status()
-                return response.json().get("response", "No response received")
+            response = self.session.get(f"{self.base_url}/api/ps", timeout=self.timeout)
+            response.raise_for_status()
+            return response.json().get("models", [])
         except requests.RequestException as e:
-            return f"Error: Could not connect to Ollama. Is it running? ({str(e)})"
+            return {"error": f"Failed to fetch running models: {str(e)}"}
+
+    def load_model(self, model=None, keep_alive=None):
+        """Load a model into memory without generating; returns ``(text, stats)``.
+
+        ``keep_alive`` (seconds or a duration such as ``"30m"``) sets how long
+        Ollama keeps it resident afterwards; ``0`` unloads it instead.
+        """
+        payload = {"model": model or self.model, "stream": False}
+        if keep_alive is not None:
+            payload["keep_alive"] = keep_alive
+        return self._post("/api/generate", payload)
+
+    def unload_model(self, model=None):
+        """Evict a model from memory now; returns ``(text, stats)``."""
+        return self.load_model(model, keep_alive=0)
+
+    def _cache_key(self, path, payload):
+        if self.cache is None or not self.cache.deterministic(payload):
+            return None
+        model = tagged(payload.get("model"))
+        if model not in self._digests:
+            models = self.get_available_models()
+            if not isinstance(models, list):
+                return None
+            self._digests.update(model_digests(models))
+            # Remember a model Ollama does not list, so it costs one lookup, not one per call
+            self._digests.setdefault(model, None)
+        digest = self._digests[model]
+        # Without a digest a re-pulled model could be answered from stale entries
+        return self.cache.key(digest, path, payload) if digest else None
+
+    def _join_flight(self, key):
+        """The flight for ``key`` and whether the caller leads it."""
+        with self._flights_lock:
+            flight = self._flights.get(key)
+            if flight is not None:
+                flight.followers += 1
+                return flight, False
+            flight = self._flights[key] = Flight()
+            return flight, True
+
+    def _land(self, key, flight, text, stats):
+        with self._flights_lock:
+            del self._flights[key]
+        if stats:
+            self.cache.put(key, text, stats)
+            flight.finish(stats)
+        else:
+            flight.fail()
+
+    def _post(self, path, payload):
+        key = self._cache_key(path, payload)
+        if key is None:
+            return self._fetch(path, payload)
+        cached = self.cache.get(key)
+        if cached is not None:
+            return cached
+        flight, leader = self._join_flight(key)
+        if not leader:
+            text = "".join(flight.follow())
+            if flight.done:
+                return text, flight.stats
+            return self._fetch(path, payload)
+        text, stats = self._fetch(path, payload)
+        if not text.startswith("Error:"):
+            flight.add(text)
+        self._land(key, flight, text, stats)
+        return text, stats
+
+    def _fetch(self, path, payload):
+        try:
+            response = self.session.post(f"{self.base_url}{path}", json=payload, timeout=self.timeout)
+            if response.status_code >= 400:
+                return f"Error: {http_error(response)}", {}
+            data = response.json()
+        except ValueError as e:
+            return f"Error: Invalid reply from Ollama ({str(e)})", {}
+        except requests.RequestException as e:
+            return f"Error: Could not connect to Ollama. Is it running? ({str(e)})", {}
+        if "error" in data:
+            return f"Error: {data['error']}", {}
+        return frame_text(data), extract_stats(data)
+
+    def _post_stream(self, path, payload, stats, controls=None):
+        key = self._cache_key(path, payload)
+        if key is None:
+            yield from self._stream(path, payload, stats, controls)
+            return
+        cached = self.cache.get(key)
+        if cached is not None:
+            text, cached_stats = cached
+            if stats is not None:
+                stats.update(cached_stats)
+            yield from replay(text)
+            return
+        flight, leader = self._join_flight(key)
+        if leader:
+            yield from self._lead_stream(key, flight, path, payload, stats, controls)
+            return
+        sent = 0
+        for chunk in flight.follow():
+            sent += len(chunk)
+            yield chunk
+        if flight.done:
+            if stats is not None:
+                stats.update(flight.stats)
+        else:
+            # The leader stopped early; regenerate and skip what was already sent
+            yield from skip_chars(self._post_stream(path, payload, stats, controls), sent)
+
+    def _lead_stream(self, key, flight, path, payload, stats, controls=None):
+        parts = []
+        done_stats = {}
+        try:
+            for chunk in self._stream(path, payload, done_stats, controls):
+                if chunk.startswith("Error:") and not parts:
+                    done_stats.clear()
+                else:
+                    parts.append(chunk)
+                    flight.add(chunk)
+                yield chunk
+        finally:
+            # Closing the generator early, or a stream cut by its
+            # StopControls, leaves the flight unfinished
+            cut = controls is not None and controls.closed
+            self._land(key, flight, "".join(parts), {} if cut else done_stats)
+        if stats is not None:
+            stats.update(done_stats)
+
+    def _stream(self, path, payload, stats, controls=None):
+        try:
+            _opening.controls = controls
+            try:
+                response = self.session.post(f"{self.base_url}{path}", json=payload,
+                                             stream=True, timeout=self.timeout)
+            finally:
+                _opening.controls = None
+            if response.status_code >= 400:
+                # An answer from a reachable server (unknown model, out of
+                # memory, ...), not a connection problem
+                with response:
+                    yield f"Error: {http_error(response)}"
+                return
+            with response:
+                sock = None
+                if controls is not None:
+                    sock = getattr(response.raw.connection, "sock", None)
+                    _watchdog.watch(sock, controls)
+                try:
+                    for frame in iter_ndjson(response):
+                        if "error" in frame:
+                            yield f"Error: {frame['error']}"
+                            return
+                        if controls is not None and controls.over(frame):
+                            # Leaving the block closes the half-read response,
+                            # which drops the connection and makes Ollama stop
+                            break
+                        chunk = frame_text(frame)
+                        if controls is not None:
+                            chunk = controls.feed(chunk) + (controls.flush() if frame.get("done") else "")
+                        if chunk:
+                            yield chunk
+                        # Keep reading past the done frame so the connection is
+                        # drained and goes back to the pool instead of being dropped.
+                        if frame.get("done") and stats is not None:
+                            stats.update(extract_stats(frame))
+                finally:
+                    # Before the connection can go back to the pool
+                    _watchdog.unwatch(sock)
+        except requests.RequestException as e:
+            if controls is None or not controls.expired():
+                yield f"Error: Could not connect to Ollama. Is it running? ({str(e)})"
+        except ValueError as e:
+            # A malformed or truncated frame
+            yield f"Error: Invalid reply from Ollama ({str(e)})"
+        finally:
+            if controls is not None:
+                controls.finish(stats)
+
+    def generate(self, prompt, model=None, **fields):
+        """Send a prompt and wait for the complete response.
+
+        Returns ``(text, stats)`` where ``stats`` holds the timing and token
+        counters Ollama reports in its final frame. Extra keyword arguments
+        (``system``, ``options``, ``context``, ...) are passed through as
+        request fields.
+        """
+        return self._post("/api/generate", self._payload(prompt, model, False, fields))
+
+    def generate_stream(self, prompt, model=None, stats=None, **fields):
+        """Send a prompt and yield response chunks as they arrive.
+
+        If ``stats`` is a dict it is filled in from the final ``done`` frame.
+        Connection errors and malformed replies are yielded as a single error chunk.
+
+        ``options={"num_predict": n, "stop": [...]}`` are checked on this
+        side as well as by Ollama, and ``deadline`` (seconds) bounds the
+        whole request; setting ``cancel`` (a ``threading.Event``) from any
+        thread closes the connection at once. ``stats["done_reason"]`` says
+        why a stream ended early (see ``StopControls``).
+        """
+        controls = StopControls.pop(fields)
+        return self._post_stream("/api/generate", self._payload(prompt, model, True, fields), stats, controls)
+
+    def chat(self, messages, model=None, **fields):
+        """Send a ``/api/chat`` message list and return ``(text, stats)``."""
+        return self._post("/api/chat", self._chat_payload(messages, model, False, fields))
+
+    def chat_stream(self, messages, model=None, stats=None, **fields):
+        """Send a ``/api/chat`` message list and yield reply chunks; early stops as in ``generate_stream``."""
+        controls = StopControls.pop(fields)
+        return self._post_stream("/api/chat", self._chat_payload(messages, model, True, fields), stats, controls)
+
+    def send_prompt(self, prompt, stream=False):
+        """Send a prompt to the Ollama API and return the response or stream.
+
+        Kept for older callers; prefer ``generate`` or ``generate_stream``.
+        """
+        if stream:
+            return self.generate_stream(prompt)
+        return self.generate(prompt)[0]
+
+# Counters Ollama attaches to the final frame of a generation
+STAT_FIELDS = (
+    "total_duration", "load_duration",
+    "prompt_eval_count", "prompt_eval_duration",
+    "eval_count", "eval_duration",
+)
+
+def extract_stats(frame):
+    """Pick the timing and token counters out of a final ``done`` frame.
+
+    The ``context`` token array returned by ``/api/generate`` is kept too so
+    the next turn can hand it back to the server.
+    """
+    stats = {key: frame[key] for key in STAT_FIELDS if key in frame}
+    if "done_reason" in frame:
+        stats["done_reason"] = frame["done_reason"]
+    if "context" in frame:
+        stats["context"] = frame["context"]
+    return stats
+
+class StopControls:
+    """Early-stop limits of one streamed request, enforced by the client.
+
+    Ollama ends a generation by itself after ``options.num_predict`` tokens
+    or at one of ``options.stop``. The client counts chunks (one token
+    each) and watches for the stop sequences too, holding back text that
+    could be the start of one, so the reply ends at the same point even
+    if the server ignores them. After a limit is hit one more frame is
+    read: a server that honoured it sends its done frame there, and the
+    stats and keep-alive connection are kept; anything else means it is
+    still generating, and the connection is closed so it stops.
+
+    ``deadline`` is a wall-clock budget in seconds for the whole request,
+    and ``cancel`` an optional ``threading.Event``. Neither exists on the
+    server side: when either fires, the connection is closed, which Ollama
+    treats as the client going away and aborts the generation. The sync
+    client checks both from a watchdog thread as well, so a stream
+    waiting on a stalled server is closed too, not only one that is
+    producing chunks.
+
+    ``reason`` is ``"length"``, ``"stop"``, ``"deadline"`` or
+    ``"cancelled"`` once the client stopped the stream, and is copied to
+    ``stats["done_reason"]``.
+    """
+
+    def __init__(self, num_predict=None, stop=(), deadline=None, cancel=None):
+        # Ollama reads a negative num_predict as "no limit"
+        self.num_predict = num_predict if num_predict is not None and num_predict >= 0 else None
+        self.stop = [s for s in ([stop] if isinstance(stop, str) else stop or ()) if s]
+        self.expires = time.perf_counter() + deadline if deadline is not None else None
+        self.cancel = cancel
+        self.reason = None
+        self.closed = False  # the client cut the stream; its text is partial
+        self.tokens = 0
+        self._held = ""
+
+    @classmethod
+    def pop(cls, fields):
+        """Controls for a request's ``fields``, removing the client-only ones; None if unlimited."""
+        deadline = fields.pop("deadline", None)
+        cancel = fields.pop("cancel", None)
+        options = fields.get("options") or {}
+        controls = cls(options.get("num_predict"), options.get("stop"), deadline, cancel)
+        if controls.num_predict is None and not controls.stop and deadline is None and cancel is None:
+            return None
+        return controls
+
+    def remaining(self):
+        """Seconds left before the deadline, or None without one."""
+        return None if self.expires is None else max(0.0, self.expires - time.perf_counter())
+
+    def expired(self):
+        """True once the deadline has passed or ``cancel`` is set; records the reason."""
+        if self.reason in ("deadline", "cancelled"):
+            return True
+        if self.cancel is not None and self.cancel.is_set():
+            self.reason = "cancelled"
+        elif self.expires is not None and time.perf_counter() >= self.expires:
+            self.reason = "deadline"
+        else:
+            return False
+        self.closed = True
+        return True
+
+    def over(self, frame):
+        """True if the stream must be cut before ``frame`` is used."""
+        if self.expired():
+            return True
+        if self.reason is not None and not frame.get("done"):
+            self.closed = True
+        return self.closed
+
+    def feed(self, chunk):
+        """The part of ``chunk`` that can be shown now."""
+        if not chunk:
+            return ""
+        if self.reason is not None:
+            return ""
+        self.tokens += 1
+        text = self._held + chunk
+        self._held = ""
+        if self.stop:
+            cut = min((i for i in (text.find(s) for s in self.stop) if i != -1), default=-1)
+            if cut != -1:
+                self.reason = "stop"
+                return text[:cut]
+            # Hold back a tail that may be the start of a stop sequence
+            hold = max((n for s in self.stop for n in range(1, len(s)) if text.endswith(s[:n])), default=0)
+            if hold:
+                text, self._held = text[:-hold], text[-hold:]
+        if self.num_predict is not None and self.tokens >= self.num_predict:
+            self.reason = "length"
+            text += self.flush()
+        return text
+
+    def flush(self):
+        """Text held back for a stop sequence that never completed."""
+        held, self._held = self._held, ""
+        return held
+
+    def finish(self, stats):
+        if self.reason is not None and stats is not None:
+            stats["done_reason"] = self.reason
+
+def env_number(environ, name, kind=float):
+    """``environ[name]`` as a ``kind``, or None if unset.
+
+    A float must be a positive number of seconds. A value that cannot be
+    read is logged and ignored rather than stopping the app from starting.
+    """
+    text = environ.get(name)
+    if not text:
+        return None
+    try:
+        value = kind(text)
+        if kind is float and not (value > 0 and math.isfinite(value)):
+            raise ValueError("not a positive number")
+    except ValueError as e:
+        log.warning("Ignoring %s=%r (%s)", name, text, e)
+        return None
+    return value
+
+def early_stop_fields(environ):
+    """Stream fields for the limits in ``PYLLAMAUI_NUM_PREDICT``, ``PYLLAMAUI_STOP`` and ``PYLLAMAUI_DEADLINE``.
+
+    ``PYLLAMAUI_STOP`` holds stop sequences separated by ``|`` and
+    ``PYLLAMAUI_DEADLINE`` a number of seconds. Unset variables and values
+    that cannot be read are left out.
+    """
+    options = {}
+    num_predict = env_number(environ, "PYLLAMAUI_NUM_PREDICT", int)
+    if num_predict is not None:
+        options["num_predict"] = num_predict
+    if environ.get("PYLLAMAUI_STOP"):
+        options["stop"] = environ["PYLLAMAUI_STOP"].split("|")
+    fields = {"options": options} if options else {}
+    deadline = env_number(environ, "PYLLAMAUI_DEADLINE")
+    if deadline is not None:
+        fields["deadline"] = deadline
+    return fields
+
+class _Watchdog:
+    """Closes streams from outside the thread that reads them.
+
+    A generator cannot be closed while another thread is inside it, and a
+    thread blocked on a silent socket (model loading, prompt evaluation)
+    only notices a deadline when the read timeout fires. Every
+    ``interval`` seconds one daemon thread checks the ``StopControls`` of
+    the watched sockets and shuts down any whose stream expired or was
+    cancelled; the blocked read then returns at once.
+    """
+
+    def __init__(self, interval=0.02):
+        self.interval = interval
+        self._sockets = {}  # socket -> StopControls
+        self._changed = threading.Condition()
+        self._thread = None
+
+    def watch(self, sock, controls):
+        if sock is None or (controls.expires is None and controls.cancel is None):
+            return
+        with self._changed:
+            self._sockets[sock] = controls
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="stream-watchdog", daemon=True)
+                self._thread.start()
+            self._changed.notify()
+
+    def unwatch(self, sock):
+        with self._changed:
+            self._sockets.pop(sock, None)
+
+    def _run(self):
+        while True:
+            with self._changed:
+                while not self._sockets:
+                    self._changed.wait()
+                expired = [sock for sock, controls in self._sockets.items() if controls.expired()]
+                for sock in expired:
+                    del self._sockets[sock]
+            for sock in expired:
+                try:
+                    sock.shutdown(socket.SHUT_RDWR)
+                except OSError:
+                    pass
+            time.sleep(self.interval)
+
+_watchdog = _Watchdog()
+
+# StopControls of the stream this thread is opening; see _watched_pools
+_opening = threading.local()
+
+@functools.lru_cache(maxsize=None)
+def _watched_pools():
+    """urllib3 pool classes that watch a stream's socket while it waits for the response head.
+
+    ``requests`` does not expose the socket until the response head has
+    arrived, which for a generation is after the model is loaded and the
+    prompt evaluated; these connections hand it to the watchdog as soon as
+    the request is sent.
+    """
+    from urllib3.connection import HTTPConnection, HTTPSConnection
+    from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+    def watched(base):
+        class WatchedConnection(base):
+            def getresponse(self, *args, **kwargs):
+                controls = getattr(_opening, "controls", None)
+                if controls is None:
+                    return super().getresponse(*args, **kwargs)
+                _watchdog.watch(self.sock, controls)
+                try:
+                    return super().getresponse(*args, **kwargs)
+                finally:
+                    _watchdog.unwatch(self.sock)
+        return WatchedConnection
+
+    return {
+        "http": type("WatchedPool", (HTTPConnectionPool,), {"ConnectionCls": watched(HTTPConnection)}),
+        "https": type("WatchedHTTPSPool", (HTTPSConnectionPool,), {"ConnectionCls": watched(HTTPSConnection)}),
+    }
+
+def frame_text(frame):
+    """Text carried by a ``/api/generate`` or ``/api/chat`` frame."""
+    if "message" in frame:
+        return frame["message"].get("content", "")
+    return frame.get("response", "")
+
+def tokens_per_second(stats):
+    """Generation speed as measured by the server, or None if unknown."""
+    if stats.get("eval_duration"):
+        return stats.get("eval_count", 0) / (stats["eval_duration"] / 1e9)
+    return None
+
+def http_error(response):
+    """The message of an Ollama ``{"error": ...}`` reply, or the HTTP status."""
+    try:
+        message = response.json().get("error")
+    except ValueError:
+        message = None
+    return message or f"HTTP {response.status_code}"
+
+def iter_ndjson(response):
+    """Yield decoded JSON frames from a streamed NDJSON response.
+
+    Works on the raw byte chunks as they come off the socket and splits on
+    newlines in place, so there is no per-line decode or line re-buffering.
+    """
+    buffer = b""
+    for data in response.iter_content(chunk_size=None):
+        buffer += data
+        start = 0
+        newline = buffer.find(b"\n")
+        while newline != -1:
+            if newline > start:
+                yield json.loads(buffer[start:newline])
+            start = newline + 1
+            newline = buffer.find(b"\n", start)
+        buffer = buffer[start:]
+    if buffer.strip():
+        yield json.loads(buffer)
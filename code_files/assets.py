@@ -0,0 +1,35 @@
+# assets.py
+# Image assets for PyLlamaUI, decoded once and cached on disk at display size
+
+import os
+
+from paths import cache_dir
+
+_HERE = os.path.dirname(os.path.abspath(__file__))
+LOGO_CANDIDATES = (
+    os.path.join(_HERE, "PyLlamaUI.png"),
+    os.path.join(_HERE, "..", "PyLlamaUI.png"),
+)
+
+def logo_thumbnail(size=40, scale=2):
+    """Path to a ``size`` px logo thumbnail, creating it on first use.
+
+    The source PNG is large, so it is decoded and downscaled only when no
+    cached thumbnail exists for its current size and mtime. The thumbnail
+    is rendered at ``scale`` x for HiDPI displays. Returns None if the logo
+    is missing.
+    """
+    source = next((path for path in LOGO_CANDIDATES if os.path.exists(path)), None)
+    if source is None:
+        return None
+    info = os.stat(source)
+    pixels = size * scale
+    target = os.path.join(cache_dir("thumbnails"), f"logo-{pixels}-{info.st_size}-{info.st_mtime_ns}.png")
+    if not os.path.exists(target):
+        from PIL import Image  # only needed when the cache is cold
+        with Image.open(source) as image:
+            image.thumbnail((pixels, pixels))
+            tmp = target + ".tmp"
+            image.save(tmp, format="PNG")
+        os.replace(tmp, target)
+    return target
@@ -0,0 +1,266 @@
+# history_store.py
+# Append-only SQLite store for chat transcripts, written one message at a time
+
+import os
+import re
+import sqlite3
+import time
+
+from paths import data_dir
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS conversations (
+    id INTEGER PRIMARY KEY,
+    title TEXT NOT NULL DEFAULT '',
+    created REAL NOT NULL,
+    updated REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS messages (
+    id INTEGER PRIMARY KEY,
+    conversation_id INTEGER NOT NULL REFERENCES conversations(id) ON DELETE CASCADE,
+    speaker TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    align TEXT NOT NULL,
+    text TEXT NOT NULL,
+    complete INTEGER NOT NULL DEFAULT 1,
+    created REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS messages_by_conversation ON messages(conversation_id, id);
+"""
+
+# Full-text index over finished messages. It is an external-content FTS5
+# table, so the text is stored once; the triggers keep it in step with
+# every insert, edit and delete. Streaming messages are indexed once, when
+# they are marked complete.
+_FTS_SCHEMA = """
+CREATE VIRTUAL TABLE messages_fts USING fts5(
+    text, content='messages', content_rowid='id', tokenize='unicode61 remove_diacritics 2'
+);
+CREATE TRIGGER messages_fts_insert AFTER INSERT ON messages WHEN new.complete BEGIN
+    INSERT INTO messages_fts(rowid, text) VALUES (new.id, new.text);
+END;
+CREATE TRIGGER messages_fts_delete AFTER DELETE ON messages WHEN old.complete BEGIN
+    INSERT INTO messages_fts(messages_fts, rowid, text) VALUES ('delete', old.id, old.text);
+END;
+CREATE TRIGGER messages_fts_update AFTER UPDATE OF text, complete ON messages BEGIN
+    INSERT INTO messages_fts(messages_fts, rowid, text) SELECT 'delete', old.id, old.text WHERE old.complete;
+    INSERT INTO messages_fts(rowid, text) SELECT new.id, new.text WHERE new.complete;
+END;
+INSERT INTO messages_fts(rowid, text) SELECT id, text FROM messages WHERE complete;
+"""
+
+_QUERY_TERM = re.compile(r'"([^"]*)"?|(\S+)')
+
+class HistoryStore:
+    """Every conversation and message, persisted as it happens.
+
+    The database runs in WAL mode with ``synchronous=NORMAL``: each write is
+    one small append to the log, no full rewrite and no fsync per message,
+    and it survives an application crash. A finished message is inserted
+    once. A streaming message is inserted when it starts and then extended
+    at most every ``flush_interval`` seconds or ``flush_chars`` characters,
+    never per token; ``finish`` writes the remainder and marks it complete.
+
+    Row ids increase with insertion order, so pages of a conversation are
+    index range scans: ``recent`` reads the newest page on launch and
+    ``older`` walks back from there on demand.
+
+    The connection belongs to the thread that created it (the Tk main loop).
+    """
+
+    def __init__(self, path=None, flush_interval=1.0, flush_chars=4096):
+        self.path = path or os.path.join(data_dir(), "history.sqlite3")
+        self.flush_interval = flush_interval
+        self.flush_chars = flush_chars
+        self.db = sqlite3.connect(self.path, isolation_level=None)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.execute("PRAGMA foreign_keys=ON")
+        self.db.executescript(_SCHEMA)
+        self.fts = self._create_fts()
+        self._pending = {}  # message id -> [unwritten chunks, their length, time of last write]
+
+    def _create_fts(self):
+        """Create the search index on first use; False if SQLite lacks FTS5."""
+        exists = self.db.execute(
+            "SELECT 1 FROM sqlite_master WHERE name = 'messages_fts'").fetchone()
+        if exists:
+            return True
+        try:
+            self.db.executescript("BEGIN;" + _FTS_SCHEMA + "COMMIT;")
+        except sqlite3.OperationalError:
+            if self.db.in_transaction:
+                self.db.execute("ROLLBACK")
+            return False
+        return True
+
+    def close(self):
+        for msg_id in list(self._pending):
+            self._flush(msg_id)
+        self.db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    # Conversations
+
+    def new_conversation(self, title=""):
+        now = time.time()
+        cursor = self.db.execute(
+            "INSERT INTO conversations (title, created, updated) VALUES (?, ?, ?)", (title, now, now))
+        return cursor.lastrowid
+
+    def latest_conversation(self):
+        """Id of the most recently updated conversation, or None."""
+        row = self.db.execute("SELECT id FROM conversations ORDER BY updated DESC, id DESC LIMIT 1").fetchone()
+        return row[0] if row else None
+
+    def conversations(self):
+        """``(id, title, updated)`` of every conversation, newest first."""
+        return self.db.execute(
+            "SELECT id, title, updated FROM conversations ORDER BY updated DESC, id DESC").fetchall()
+
+    def delete_conversation(self, conversation_id):
+        self.db.execute("DELETE FROM conversations WHERE id = ?", (conversation_id,))
+
+    # Messages
+
+    def add(self, conversation_id, speaker, kind, align, text, complete=True):
+        """Insert one message; returns its id."""
+        now = time.time()
+        with self.db:
+            cursor = self.db.execute(
+                "INSERT INTO messages (conversation_id, speaker, kind, align, text, complete, created)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (conversation_id, speaker, kind, align, text, int(complete), now))
+            self.db.execute("UPDATE conversations SET updated = ? WHERE id = ?", (now, conversation_id))
+        if not complete:
+            self._pending[cursor.lastrowid] = [[], 0, time.monotonic()]
+        return cursor.lastrowid
+
+    def add_many(self, conversation_id, messages):
+        """Insert ``(speaker, kind, align, text)`` tuples in one transaction (imports)."""
+        now = time.time()
+        with self.db:
+            self.db.executemany(
+                "INSERT INTO messages (conversation_id, speaker, kind, align, text, complete, created)"
+                " VALUES (?, ?, ?, ?, ?, 1, ?)",
+                ((conversation_id, *message, now) for message in messages))
+            self.db.execute("UPDATE conversations SET updated = ? WHERE id = ?", (now, conversation_id))
+
+    def append(self, msg_id, text):
+        """Buffer streamed text for ``msg_id``; written in batches."""
+        pending = self._pending.get(msg_id)
+        if pending is None:
+            return
+        pending[0].append(text)
+        pending[1] += len(text)
+        if pending[1] >= self.flush_chars or time.monotonic() - pending[2] >= self.flush_interval:
+            self._flush(msg_id)
+
+    def _flush(self, msg_id, complete=False):
+        chunks = self._pending[msg_id][0]
+        if chunks or complete:
+            self.db.execute(
+                "UPDATE messages SET text = text || ?, complete = ? WHERE id = ?",
+                ("".join(chunks), int(complete), msg_id))
+        self._pending[msg_id] = [[], 0, time.monotonic()]
+
+    def finish(self, msg_id):
+        """Write the rest of a streamed message and mark it complete."""
+        if msg_id in self._pending:
+            self._flush(msg_id, complete=True)
+            del self._pending[msg_id]
+
+    def delete(self, msg_id):
+        self._pending.pop(msg_id, None)
+        self.db.execute("DELETE FROM messages WHERE id = ?", (msg_id,))
+
+    def truncate(self, conversation_id, msg_id):
+        """Delete ``msg_id`` and every later message of the conversation."""
+        for pending in [m for m in self._pending if m >= msg_id]:
+            del self._pending[pending]
+        self.db.execute("DELETE FROM messages WHERE conversation_id = ? AND id >= ?",
+                        (conversation_id, msg_id))
+
+    def newer(self, conversation_id, after_id, limit=50):
+        """Up to ``limit`` messages following ``after_id``, oldest first."""
+        return self.db.execute(
+            "SELECT id, speaker, kind, align, text FROM messages WHERE conversation_id = ? AND id > ?"
+            " ORDER BY id LIMIT ?", (conversation_id, after_id, limit)).fetchall()
+
+    def recent(self, conversation_id, limit=50):
+        """The newest ``limit`` messages, oldest first, as ``(id, speaker, kind, align, text)``."""
+        return self.older(conversation_id, None, limit)
+
+    def older(self, conversation_id, before_id, limit=50):
+        """Up to ``limit`` messages preceding ``before_id``, oldest first."""
+        if before_id is None:
+            rows = self.db.execute(
+                "SELECT id, speaker, kind, align, text FROM messages WHERE conversation_id = ?"
+                " ORDER BY id DESC LIMIT ?", (conversation_id, limit)).fetchall()
+        else:
+            rows = self.db.execute(
+                "SELECT id, speaker, kind, align, text FROM messages WHERE conversation_id = ? AND id < ?"
+                " ORDER BY id DESC LIMIT ?", (conversation_id, before_id, limit)).fetchall()
+        rows.reverse()
+        return rows
+
+    def count(self, conversation_id):
+        return self.db.execute("SELECT COUNT(*) FROM messages WHERE conversation_id = ?",
+                               (conversation_id,)).fetchone()[0]
+
+    # Search
+
+    def search(self, query, limit=20, prefix=True):
+        """Finished messages matching ``query``, best match first.
+
+        Words must all appear; ``"quoted text"`` matches a phrase and a word
+        ending in ``*`` matches as a prefix. With ``prefix`` the last word is
+        a prefix too, for search-as-you-type. Returns
+        ``(msg_id, conversation_id, speaker, snippet)`` tuples; the snippet
+        marks matched words with ``[`` and ``]``.
+        """
+        match = fts_query(query, prefix)
+        if not match:
+            return []
+        if not self.fts:
+            return self._scan(query, limit)
+        return self.db.execute(
+            "SELECT m.id, m.conversation_id, m.speaker,"
+            " snippet(messages_fts, 0, '[', ']', '…', 12)"
+            " FROM messages_fts JOIN messages m ON m.id = messages_fts.rowid"
+            " WHERE messages_fts MATCH ? ORDER BY bm25(messages_fts) LIMIT ?",
+            (match, limit)).fetchall()
+
+    def _scan(self, query, limit):
+        # Fallback without FTS5: newest messages containing every word
+        words = [w.strip('"*') for w in query.split() if w.strip('"*')]
+        where = " AND ".join(["text LIKE ?"] * len(words))
+        rows = self.db.execute(
+            f"SELECT id, conversation_id, speaker, text FROM messages WHERE complete AND {where}"
+            " ORDER BY id DESC LIMIT ?", [f"%{w}%" for w in words] + [limit]).fetchall()
+        return [(msg_id, conv, speaker, text[:80]) for msg_id, conv, speaker, text in rows]
+
+def fts_query(text, prefix=True):
+    """Translate search-box input into an FTS5 query, quoting every term.
+
+    Quoting keeps FTS5 operators and punctuation in user input from being
+    parsed as syntax, so any input is a valid query.
+    """
+    terms = []
+    matches = list(_QUERY_TERM.finditer(text))
+    for index, match in enumerate(matches):
+        phrase, word = match.group(1), match.group(2)
+        if phrase is not None:
+            if phrase.strip():
+                terms.append('"' + phrase.replace('"', '""') + '"')
+            continue
+        star = word.endswith("*") or (prefix and index == len(matches) - 1)
+        word = word.rstrip("*").replace('"', '""')
+        if word:
+            terms.append(f'"{word}"' + ("*" if star else ""))
+    return " ".join(terms)
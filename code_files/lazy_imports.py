@@ -0,0 +1,23 @@
+# lazy_imports.py
+# Deferred module loading, so startup only pays for what the first frame needs
+
+import importlib.util
+import sys
+
+def lazy_import(name):
+    """Return module ``name``, executing it only on first attribute access.
+
+    Already-imported modules are returned as is. Used for heavy optional
+    dependencies (requests, PIL) that are not needed to paint the window.
+    """
+    if name in sys.modules:
+        return sys.modules[name]
+    spec = importlib.util.find_spec(name)
+    if spec is None:
+        raise ModuleNotFoundError(f"No module named '{name}'", name=name)
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+    return module
@@ -1,20 +1,43 @@
 # main.py
 # Entry point for PyLlamaUI, initializes the GUI and connects components
 
+import os
+import time
 import tkinter as tk
 from ui_components import ChatApp
 from api import OllamaAPI
+from async_api import AsyncOllamaAPI
+from response_cache import ResponseCache
+from router import Router, RoutedOllamaAPI, RoutedAsyncOllamaAPI
 
 def main():
     # Initialize the main Tkinter window
     root = tk.Tk()
     
-    # Create Ollama API instance
-    api = OllamaAPI(base_url="http://localhost:11434")
+    # Opt-in cache for deterministic generations (temperature 0 or a fixed seed)
+    cache = ResponseCache() if os.environ.get("PYLLAMAUI_RESPONSE_CACHE") else None
+
+    # Create Ollama API instance; PYLLAMAUI_ENDPOINTS lists several Ollama
+    # instances (comma-separated URLs) to spread requests over
+    endpoints = [url.strip() for url in os.environ.get("PYLLAMAUI_ENDPOINTS", "").split(",") if url.strip()]
+    if len(endpoints) > 1:
+        router = Router(endpoints).start()
+        api = RoutedOllamaAPI(router, cache=cache)
+        async_api = RoutedAsyncOllamaAPI(router, cache=cache)
+    else:
+        api = OllamaAPI(base_url=endpoints[0] if endpoints else "http://localhost:11434", cache=cache)
+        async_api = AsyncOllamaAPI(base_url=api.base_url, cache=cache)
     
     # Create and start the chat application
-    app = ChatApp(root, api)
+    app = ChatApp(root, api, async_api=async_api)
     
+    if os.environ.get("PYLLAMAUI_STARTUP_PROBE"):
+        # Used by benchmarks/bench_startup.py: report the first painted frame and exit
+        def probe():
+            print(f"first_frame {time.time()}", flush=True)
+            root.destroy()
+        root.after_idle(lambda: root.after(0, probe))
+
     # Start the Tkinter event loop
     root.mainloop()
 
@@ -0,0 +1,95 @@
+# markdown_render.py
+# Incremental Markdown styling for streamed responses, mapped onto Tk text tags
+
+import re
+
+# Tk tags used for Markdown styling; markup characters themselves stay in the
+# widget and are hidden with the elided "md_hide" tag.
+MARKDOWN_TAGS = ("md_hide", "md_bold", "md_code", "md_code_block",
+                 "md_h1", "md_h2", "md_h3", "md_list")
+
+_FENCE = re.compile(r"\s*```")
+_HEADING = re.compile(r"(#{1,6})\s+")
+_LIST_ITEM = re.compile(r"\s*(?:[-*+]|\d+[.)])\s+")
+_INLINE = re.compile(r"(`)([^`\n]+)`|(\*\*|__)(.+?)\3")
+
+def configure_markdown_tags(widget, family="Arial", size=11):
+    """Set up the tag styles the renderer refers to."""
+    widget.tag_config("md_hide", elide=True)
+    widget.tag_config("md_bold", font=(family, size, "bold"))
+    widget.tag_config("md_code", font=("Courier", size), background="#3a3a3a")
+    widget.tag_config("md_code_block", font=("Courier", size), background="#1e1e1e", lmargin1=12, lmargin2=12)
+    widget.tag_config("md_h1", font=(family, size + 6, "bold"))
+    widget.tag_config("md_h2", font=(family, size + 4, "bold"))
+    widget.tag_config("md_h3", font=(family, size + 2, "bold"))
+    widget.tag_config("md_list", lmargin1=12, lmargin2=28)
+
+class IncrementalMarkdown:
+    """Turns a growing Markdown string into tag spans, one line at a time.
+
+    Completed lines are styled once and never looked at again; only the
+    trailing line that is still being streamed is re-styled on each chunk.
+    Block state that spans lines (an open code fence) is carried forward,
+    so the cost per chunk is proportional to the chunk plus the open line,
+    not to the whole response.
+
+    ``feed`` returns ``(restyle_from, spans)``: the caller clears the
+    Markdown tags from offset ``restyle_from`` to the end of the text and
+    applies ``spans``, a list of ``(start, end, tag)`` character offsets.
+    """
+
+    def __init__(self):
+        self.length = 0
+        self.in_fence = False
+        self._line_start = 0
+        self._line = ""
+
+    def feed(self, text):
+        restyle_from = self._line_start
+        spans = []
+        buffer = self._line + text
+        start = 0
+        newline = buffer.find("\n")
+        while newline != -1:
+            self._style_line(self._line_start, buffer[start:newline + 1], True, spans)
+            self._line_start += newline + 1 - start
+            start = newline + 1
+            newline = buffer.find("\n", start)
+        self._line = buffer[start:]
+        if self._line:
+            self._style_line(self._line_start, self._line, False, spans)
+        self.length = self._line_start + len(self._line)
+        return restyle_from, spans
+
+    def _style_line(self, offset, line, complete, spans):
+        """Append spans for one line; a complete line may change fence state."""
+        end = offset + len(line)
+        if _FENCE.match(line):
+            spans.append((offset, end, "md_hide"))
+            if complete:
+                self.in_fence = not self.in_fence
+            return
+        if self.in_fence:
+            spans.append((offset, end, "md_code_block"))
+            return
+        body = 0
+        heading = _HEADING.match(line)
+        if heading:
+            level = min(len(heading.group(1)), 3)
+            spans.append((offset, offset + heading.end(), "md_hide"))
+            spans.append((offset + heading.end(), end, f"md_h{level}"))
+            body = heading.end()
+        elif _LIST_ITEM.match(line):
+            spans.append((offset, end, "md_list"))
+        for match in _INLINE.finditer(line, body):
+            if match.group(1):
+                marker, inner_start, inner_end, tag = 1, match.start(2), match.end(2), "md_code"
+            else:
+                marker, inner_start, inner_end, tag = 2, match.start(4), match.end(4), "md_bold"
+            spans.append((offset + match.start(), offset + match.start() + marker, "md_hide"))
+            spans.append((offset + inner_start, offset + inner_end, tag))
+            spans.append((offset + inner_end, offset + match.end(), "md_hide"))
+
+def render_markdown(text):
+    """Spans for a complete message, e.g. one redrawn from history."""
+    return IncrementalMarkdown().feed(text)[1]
@@ -0,0 +1,152 @@
+# metrics.py
+# Live per-request performance numbers and rolling histograms exported to disk
+
+from bisect import bisect_left
+import json
+import threading
+import time
+
+from api import tokens_per_second
+
+# Bucket upper bounds on a 1-2-5 scale from 0.1 to 100k; wide enough for
+# milliseconds and tokens per second alike. The last bucket is open-ended.
+BOUNDS = [m * 10 ** e for e in range(-1, 6) for m in (1, 2, 5)]
+
+class Histogram:
+    """Counts of values in fixed log-spaced buckets: constant memory, cheap to add."""
+
+    def __init__(self):
+        self.counts = [0] * (len(BOUNDS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+
+    def add(self, value):
+        self.counts[bisect_left(BOUNDS, value)] += 1
+        self.count += 1
+        self.total += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def percentile(self, fraction):
+        """Upper bound of the bucket holding the ``fraction`` quantile (capped at ``max``)."""
+        if not self.count:
+            return None
+        rank = fraction * self.count
+        seen = 0
+        for index, n in enumerate(self.counts):
+            seen += n
+            if seen >= rank and n:
+                return min(BOUNDS[index], self.max) if index < len(BOUNDS) else self.max
+        return self.max
+
+    def to_dict(self):
+        return {
+            "count": self.count, "mean": self.total / self.count if self.count else None,
+            "min": self.min, "max": self.max,
+            "p50": self.percentile(0.5), "p95": self.percentile(0.95),
+            "buckets": {str(bound): n for bound, n in zip(BOUNDS + ["inf"], self.counts) if n},
+        }
+
+class RequestTimer:
+    """Timing of one streamed request, filled in as chunks arrive."""
+
+    def __init__(self, metrics, model):
+        self.metrics = metrics
+        self.model = model
+        self.start = time.perf_counter()
+        self.first = None
+        self.chunks = 0
+
+    def chunk(self):
+        now = time.perf_counter()
+        if self.first is None:
+            self.first = now
+        self.chunks += 1
+        return now
+
+    def snapshot(self):
+        """TTFT and client tokens/s so far, for a live display."""
+        now = time.perf_counter()
+        ttft = (self.first - self.start) * 1000 if self.first is not None else None
+        # Ollama sends one token per chunk
+        rate = (self.chunks - 1) / (now - self.first) if self.first is not None and self.chunks > 1 else None
+        return {"model": self.model, "ttft_ms": ttft, "client_tokens_per_s": rate, "streaming": True}
+
+    def finish(self, stats=None):
+        """Record the finished request; ``stats`` are Ollama's final-frame numbers."""
+        record = self.snapshot()
+        record["streaming"] = False
+        server = tokens_per_second(stats or {})
+        record["server_tokens_per_s"] = server or None
+        if record["ttft_ms"] is not None:
+            self.metrics.record("ttft_ms", record["ttft_ms"])
+        if record["client_tokens_per_s"]:
+            self.metrics.record("client_tokens_per_s", record["client_tokens_per_s"])
+        if server:
+            self.metrics.record("server_tokens_per_s", server)
+        self.metrics.last = record
+        return record
+
+class Metrics:
+    """Rolling histograms of TTFT, server and client tokens/s and UI render lag.
+
+    Values are collected into histograms covering ``window`` seconds. When
+    a window ends, it is appended to ``path`` as one JSON line (windows
+    with no data are skipped), so the file grows by at most one line per
+    window and can be analysed offline. ``last`` holds the most recent
+    request's numbers for the status bar.
+    """
+
+    NAMES = ("ttft_ms", "server_tokens_per_s", "client_tokens_per_s", "render_lag_ms")
+
+    def __init__(self, path=None, window=60.0):
+        self.path = path
+        self.window = window
+        self.last = {}
+        self._lock = threading.Lock()
+        self._window_start = time.time()
+        self._histograms = {name: Histogram() for name in self.NAMES}
+
+    def request(self, model=None):
+        return RequestTimer(self, model)
+
+    def record(self, name, value):
+        with self._lock:
+            self._roll()
+            self._histograms[name].add(value)
+
+    def percentile(self, name, fraction):
+        with self._lock:
+            return self._histograms[name].percentile(fraction)
+
+    def _roll(self, force=False):
+        now = time.time()
+        if not force and now - self._window_start < self.window:
+            return
+        line = {"start": self._window_start, "end": now}
+        line.update({name: h.to_dict() for name, h in self._histograms.items() if h.count})
+        if self.path and len(line) > 2:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(line) + "\n")
+        self._window_start = now
+        self._histograms = {name: Histogram() for name in self.NAMES}
+
+    def flush(self):
+        """Write out the current, partial window; call on exit."""
+        with self._lock:
+            self._roll(force=True)
+
+def format_status(record, render_lag_p95=None):
+    """One line for the status bar, e.g. ``TTFT 182 ms · server 48.2 tok/s · client 47.9 tok/s``."""
+    parts = []
+    if record.get("ttft_ms") is not None:
+        parts.append(f"TTFT {record['ttft_ms']:.0f} ms")
+    if record.get("server_tokens_per_s"):
+        parts.append(f"server {record['server_tokens_per_s']:.1f} tok/s")
+    if record.get("client_tokens_per_s"):
+        parts.append(f"client {record['client_tokens_per_s']:.1f} tok/s")
+    if render_lag_p95 is not None:
+        parts.append(f"render lag p95 {render_lag_p95:.0f} ms")
+    return " · ".join(parts)
@@ -0,0 +1,125 @@
+# model_lifecycle.py
+# Keeps the selected model loaded in Ollama and the resident set within a memory budget
+
+import time
+
+class ModelLifecycle:
+    """Preloads models on selection and tracks which ones Ollama has in memory.
+
+    ``select(model)`` loads the model in the background straight away, so
+    the first prompt after a switch does not pay the load as first-token
+    latency. Every load and every prompt carry a ``keep_alive`` (the default
+    or a per-model override from ``set_keep_alive``); Ollama itself unloads
+    a model once it has been idle that long.
+
+    With a ``memory_budget`` in bytes, loading a model that pushes the
+    resident set over budget unloads the least recently used other models
+    until it fits again. ``resident`` mirrors ``/api/ps``: name, size and
+    VRAM use of every loaded model.
+
+    Network work runs as coroutines on the UI's ``LoopThread``; functions
+    in ``listeners`` are called on that loop whenever ``resident`` changes.
+    """
+
+    def __init__(self, async_api, loop, keep_alive="30m", memory_budget=None):
+        self.async_api = async_api
+        self.loop = loop
+        self.keep_alive = keep_alive
+        self.memory_budget = memory_budget
+        self.resident = []
+        self.error = None
+        self.listeners = []
+        self._keep_alive = {}  # model -> keep_alive override
+        self._last_used = {}  # model -> time.monotonic() of the last load or prompt
+        self._warming = {}  # model -> future of the running preload
+
+    def keep_alive_for(self, model):
+        return self._keep_alive.get(model, self.keep_alive)
+
+    def set_keep_alive(self, model, keep_alive):
+        """Per-model keep_alive; ``None`` goes back to the default."""
+        if keep_alive is None:
+            self._keep_alive.pop(model, None)
+        else:
+            self._keep_alive[model] = keep_alive
+
+    def touch(self, model):
+        """Record that ``model`` was just used, e.g. for a prompt."""
+        self._last_used[model] = time.monotonic()
+
+    def is_loaded(self, model):
+        return any(entry.get("name") == model or entry.get("model") == model
+                   for entry in self.resident)
+
+    def memory_in_use(self):
+        return sum(entry.get("size", 0) for entry in self.resident)
+
+    def select(self, model):
+        """Start loading ``model`` in the background; returns the future."""
+        future = self._warming.get(model)
+        if future is None or future.done():
+            future = self._warming[model] = self.loop.submit(self._warm(model))
+        return future
+
+    def refresh(self):
+        """Re-read the resident set from ``/api/ps`` in the background."""
+        return self.loop.submit(self._refresh())
+
+    async def _warm(self, model):
+        self.touch(model)
+        text, stats = await self.async_api.load_model(model, self.keep_alive_for(model))
+        self.error = text if text.startswith("Error:") else None
+        await self._refresh()
+        await self._enforce_budget(keep=model)
+        return stats
+
+    async def _refresh(self):
+        models = await self.async_api.running_models()
+        if isinstance(models, dict):
+            self.error = models.get("error")
+        else:
+            self.resident = models
+        for listener in self.listeners:
+            listener()
+
+    async def _enforce_budget(self, keep):
+        if self.memory_budget is None:
+            return
+        in_use = self.memory_in_use()
+        if in_use <= self.memory_budget:
+            return
+        # Evict the least recently used first; models loaded by someone
+        # else (never touched here) count as oldest
+        candidates = sorted((entry for entry in self.resident if entry.get("name") != keep),
+                            key=lambda entry: self._last_used.get(entry.get("name"), 0))
+        for entry in candidates:
+            if in_use <= self.memory_budget:
+                break
+            await self.async_api.unload_model(entry.get("name"))
+            in_use -= entry.get("size", 0)
+        await self._refresh()
+
+def format_size(size):
+    """Bytes as a short human-readable string, e.g. ``4.1 GB``."""
+    for unit in ("B", "KB", "MB", "GB"):
+        if size < 1024 or unit == "GB":
+            return f"{size:.0f} {unit}" if unit == "B" else f"{size:.1f} {unit}"
+        size /= 1024
+
+def parse_size(text):
+    """A size such as ``12G``, ``8.5 GB`` or ``4096MB`` in bytes; None for an empty value.
+
+    Raises ``ValueError`` for anything else.
+    """
+    if not text or not text.strip():
+        return None
+    number = text.strip().upper().rstrip("B").rstrip()
+    scale = 1
+    for power, unit in enumerate("KMGT", 1):
+        if number.endswith(unit):
+            number, scale = number[:-1], 1024 ** power
+            break
+    size = float(number) * scale
+    if not 0 <= size < float("inf"):  # also false for NaN
+        raise ValueError(f"Invalid size: {text!r}")
+    return int(size)
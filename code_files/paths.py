@@ -0,0 +1,26 @@
+# paths.py
+# Per-user locations for PyLlamaUI's caches and data
+
+import os
+import sys
+
+def _base(env_var, windows_var, xdg_var, fallback):
+    override = os.environ.get(env_var)
+    if override:
+        return override
+    if sys.platform == "win32" and os.environ.get(windows_var):
+        return os.path.join(os.environ[windows_var], "PyLlamaUI")
+    root = os.environ.get(xdg_var) or os.path.join(os.path.expanduser("~"), fallback)
+    return os.path.join(root, "pyllamaui")
+
+def cache_dir(*parts):
+    """Directory for data that can be rebuilt (thumbnails, metadata); created on demand."""
+    path = os.path.join(_base("PYLLAMAUI_CACHE_DIR", "LOCALAPPDATA", "XDG_CACHE_HOME", ".cache"), *parts)
+    os.makedirs(path, exist_ok=True)
+    return path
+
+def data_dir(*parts):
+    """Directory for user data that must survive restarts; created on demand."""
+    path = os.path.join(_base("PYLLAMAUI_DATA_DIR", "APPDATA", "XDG_DATA_HOME", os.path.join(".local", "share")), *parts)
+    os.makedirs(path, exist_ok=True)
+    return path
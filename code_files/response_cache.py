@@ -0,0 +1,211 @@
+# response_cache.py
+# Opt-in cache of deterministic generations, with single-flight for identical requests
+
+from collections import OrderedDict
+import hashlib
+import json
+import os
+import threading
+
+from paths import cache_dir
+
+# Request fields that do not change what the model generates
+_IGNORED_FIELDS = ("model", "stream", "keep_alive")
+
+class ResponseCache:
+    """Two-tier cache of complete responses, keyed by what determines them.
+
+    The key is a SHA-256 over the model digest, the endpoint and every
+    request field that affects the output (prompt or messages, system,
+    context, format, options including ``seed``). Only deterministic
+    requests are cached: ``options.temperature`` is 0 or ``options.seed``
+    is set. Anything else would replay one sample of a random process.
+
+    Up to ``max_entries`` responses are kept in an in-memory LRU. Every
+    entry is also written as a small JSON file under ``directory``, and the
+    least recently used files are deleted once they exceed ``max_disk_bytes``.
+    """
+
+    def __init__(self, max_entries=256, directory=None, max_disk_bytes=64 << 20):
+        self.max_entries = max_entries
+        self.directory = directory or cache_dir("responses")
+        self.max_disk_bytes = max_disk_bytes
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._disk_bytes = None  # measured on the first write
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def deterministic(payload):
+        options = payload.get("options") or {}
+        return options.get("temperature") == 0 or options.get("seed") is not None
+
+    @staticmethod
+    def key(digest, path, payload):
+        fields = {name: value for name, value in payload.items() if name not in _IGNORED_FIELDS}
+        blob = json.dumps([digest, path, fields], sort_keys=True, separators=(",", ":"))
+        return hashlib.sha256(blob.encode()).hexdigest()
+
+    def _file(self, key):
+        return os.path.join(self.directory, key + ".json")
+
+    def get(self, key):
+        """``(text, stats)`` for ``key``, or None."""
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return entry
+        try:
+            with open(self._file(key), encoding="utf-8") as f:
+                text, stats = json.load(f)
+            os.utime(self._file(key))  # recency for disk eviction
+        except (OSError, ValueError):
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+            self._remember(key, (text, stats))
+        return text, stats
+
+    def put(self, key, text, stats):
+        with self._lock:
+            self._remember(key, (text, stats))
+        path = self._file(key)
+        tmp = f"{path}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump([text, stats], f)
+            os.replace(tmp, path)
+            size = os.path.getsize(path)
+        except OSError:
+            return
+        with self._lock:
+            if self._disk_bytes is None:
+                self._disk_bytes = self._measure()
+            else:
+                self._disk_bytes += size
+            if self._disk_bytes > self.max_disk_bytes:
+                self._evict_disk()
+
+    def _remember(self, key, entry):
+        self._memory[key] = entry
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def _entries(self):
+        with os.scandir(self.directory) as it:
+            return [entry for entry in it if entry.name.endswith(".json")]
+
+    def _measure(self):
+        return sum(entry.stat().st_size for entry in self._entries())
+
+    def _evict_disk(self):
+        # Oldest first, down to 90% of the budget so eviction is not run per write
+        entries = sorted(self._entries(), key=lambda entry: entry.stat().st_mtime)
+        target = self.max_disk_bytes * 0.9
+        for entry in entries:
+            if self._disk_bytes <= target:
+                break
+            try:
+                size = entry.stat().st_size
+                os.remove(entry.path)
+            except OSError:
+                continue
+            self._disk_bytes -= size
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            for entry in self._entries():
+                try:
+                    os.remove(entry.path)
+                except OSError:
+                    pass
+            self._disk_bytes = 0
+
+class Flight:
+    """One in-progress request that identical requests wait on (single-flight).
+
+    The leader ``add``s chunks as they arrive and ends with ``finish`` or
+    ``fail``; followers iterate ``follow()`` to receive the same chunks as
+    they are produced, from the start.
+    """
+
+    def __init__(self):
+        self.chunks = []
+        self.stats = {}
+        self.done = False
+        self.failed = False
+        self.followers = 0
+        self._cond = threading.Condition()
+
+    def add(self, chunk):
+        with self._cond:
+            self.chunks.append(chunk)
+            self._cond.notify_all()
+
+    def finish(self, stats):
+        with self._cond:
+            self.stats = stats
+            self.done = True
+            self._cond.notify_all()
+
+    def fail(self):
+        with self._cond:
+            self.failed = True
+            self._cond.notify_all()
+
+    def follow(self):
+        index = 0
+        while True:
+            with self._cond:
+                while index >= len(self.chunks) and not (self.done or self.failed):
+                    self._cond.wait()
+                chunks = self.chunks[index:]
+                ended = self.done or self.failed
+            index += len(chunks)
+            yield from chunks
+            if ended and index >= len(self.chunks):
+                return
+
+def tagged(name):
+    """``name`` with Ollama's implied ``:latest`` tag added, as ``/api/tags`` lists it."""
+    if not name or ":" in name.rsplit("/", 1)[-1]:
+        return name
+    return name + ":latest"
+
+def model_digests(models):
+    """Digest of each model in an ``/api/tags`` list, by its ``name`` and ``model`` fields."""
+    digests = {}
+    for model in models:
+        for field in ("name", "model"):
+            if model.get(field):
+                digests[tagged(model[field])] = model.get("digest")
+    return digests
+
+def replay(text, size=16):
+    """Yield a cached response in small pieces, as if it were being streamed."""
+    start = 0
+    while start < len(text):
+        end = text.find(" ", start + size)
+        end = len(text) if end == -1 else end
+        yield text[start:end]
+        start = end
+
+def skip_chars(chunks, count):
+    """Yield ``chunks`` without their first ``count`` characters.
+
+    Used when a follower has to regenerate a response the leader abandoned:
+    the output is deterministic, so what was already sent is skipped.
+    """
+    for chunk in chunks:
+        if count >= len(chunk):
+            count -= len(chunk)
+            continue
+        yield chunk[count:]
+        count = 0
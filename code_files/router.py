@@ -0,0 +1,333 @@
+# router.py
+# Spreads requests over several Ollama instances: model affinity, least load, failover
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import threading
+import time
+
+from api import OllamaAPI
+from async_api import AsyncOllamaAPI
+from response_cache import tagged
+
+# Error texts that mean the instance itself could not be reached (connection
+# refused or reset, timeouts); HTTP error replies come from a live server and
+# carry Ollama's own message instead
+_UNREACHABLE = ("Error: Could not connect", "Error: Connection to Ollama lost")
+
+class Endpoint:
+    """One Ollama instance as the router sees it."""
+
+    def __init__(self, base_url, timeout):
+        self.base_url = base_url
+        # Short timeouts and no retries: a dead instance must be noticed fast
+        self.probe = OllamaAPI(base_url=base_url, timeout=timeout, retries=0)
+        self.healthy = True
+        self.models = []  # /api/tags entries
+        self.running = []  # /api/ps entries
+        self.loaded = set()  # tagged names of the models in memory
+        self.in_flight = 0
+        self.requests = 0
+        self.failures = 0
+        self.checked = 0.0
+        self.error = None
+
+    @property
+    def names(self):
+        """Tagged names of the installed models, as ``/api/tags`` lists them."""
+        return {tagged(model.get("name")) for model in self.models}
+
+class Router:
+    """Chooses an Ollama instance for each request.
+
+    Health checks (``/api/tags`` and ``/api/ps`` on every endpoint, in
+    parallel) run every ``health_interval`` seconds once ``start`` is
+    called, and ``check`` can be called at any time. ``candidates(model)``
+    orders the endpoints for a request: healthy ones that have the model
+    installed and fewer than ``parallel`` requests in flight (Ollama's
+    ``OLLAMA_NUM_PARALLEL``) come first, those already holding the model in
+    memory ahead of the others, then by fewest requests in flight, rotating
+    between equals. Saturated endpoints follow, shortest queue first, and
+    unhealthy ones or those without the model come last, as a last resort. Clients walk that list until one answers,
+    and report back through ``begin`` and ``end``, so an
+    instance that goes away mid-session stops receiving requests until a
+    health check sees it again. Model names are compared with Ollama's
+    implied ``:latest`` tag, so "tinyllama" matches "tinyllama:latest".
+    """
+
+    def __init__(self, base_urls, parallel=4, health_interval=10.0, timeout=(1, 5)):
+        self.endpoints = [Endpoint(url.rstrip("/"), timeout) for url in base_urls]
+        self.parallel = parallel
+        self.health_interval = health_interval
+        self._lock = threading.Lock()
+        self._turn = 0
+        self._stop = threading.Event()
+        self._thread = None
+        self._pool = ThreadPoolExecutor(max_workers=len(self.endpoints), thread_name_prefix="router")
+
+    def start(self):
+        """Check every endpoint in the background, now and then every ``health_interval``."""
+        self._thread = threading.Thread(target=self._watch, name="router-health", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._pool.shutdown(wait=False)
+
+    def _watch(self):
+        self.check()
+        while not self._stop.wait(self.health_interval):
+            self.check()
+
+    def check(self):
+        """Probe every endpoint in parallel; returns how many are healthy."""
+        list(self._pool.map(self._probe, self.endpoints))
+        return sum(endpoint.healthy for endpoint in self.endpoints)
+
+    def _probe(self, endpoint):
+        models = endpoint.probe.get_available_models()
+        running = endpoint.probe.running_models() if isinstance(models, list) else models
+        with self._lock:
+            endpoint.checked = time.time()
+            if isinstance(models, dict) or isinstance(running, dict):
+                endpoint.healthy = False
+                endpoint.error = (models if isinstance(models, dict) else running).get("error")
+                return
+            endpoint.healthy = True
+            endpoint.error = None
+            endpoint.models = models
+            endpoint.running = running
+            endpoint.loaded = {tagged(model.get("name")) for model in running}
+
+    def candidates(self, model):
+        """Endpoints to try for ``model``, best first."""
+        model = tagged(model)
+        with self._lock:
+            self._turn += 1
+            count = len(self.endpoints)
+
+            def rank(item):
+                index, endpoint = item
+                usable = (not endpoint.healthy, model not in endpoint.names and bool(endpoint.models))
+                cold = model not in endpoint.loaded
+                turn = (index - self._turn) % count
+                if endpoint.in_flight < self.parallel:
+                    return usable + (0, cold, endpoint.in_flight, turn)
+                return usable + (1, endpoint.in_flight, cold, turn)
+
+            return [endpoint for _, endpoint in sorted(enumerate(self.endpoints), key=rank)]
+
+    def begin(self, endpoint):
+        with self._lock:
+            endpoint.in_flight += 1
+            endpoint.requests += 1
+
+    def end(self, endpoint, model, text):
+        """Record how a request ended; an unreachable endpoint is marked down."""
+        with self._lock:
+            endpoint.in_flight -= 1
+            if text.startswith(_UNREACHABLE):
+                endpoint.failures += 1
+                endpoint.healthy = False
+                endpoint.error = text
+            elif not text.startswith("Error:") and model:
+                # Ollama keeps a model in memory after serving it
+                endpoint.loaded.add(tagged(model))
+
+    def forget(self, endpoint, model):
+        """``model`` was unloaded from ``endpoint``."""
+        with self._lock:
+            endpoint.loaded.discard(tagged(model))
+
+    def models(self):
+        """Installed models across all healthy endpoints, without duplicates."""
+        if not any(endpoint.checked for endpoint in self.endpoints):
+            self.check()
+        seen = {}
+        with self._lock:
+            for endpoint in self.endpoints:
+                if endpoint.healthy:
+                    for model in endpoint.models:
+                        seen.setdefault(model.get("name"), model)
+        if not seen and not any(endpoint.healthy for endpoint in self.endpoints):
+            return {"error": f"No Ollama instance reachable ({self.endpoints[0].error})"}
+        return list(seen.values())
+
+    def holding(self, model):
+        """Healthy endpoints that have ``model`` in memory."""
+        model = tagged(model)
+        with self._lock:
+            return [e for e in self.endpoints if e.healthy and model in e.loaded]
+
+    def stats(self):
+        with self._lock:
+            return [{"base_url": e.base_url, "healthy": e.healthy, "in_flight": e.in_flight,
+                     "requests": e.requests, "failures": e.failures, "loaded": sorted(e.loaded)}
+                    for e in self.endpoints]
+
+class RoutedOllamaAPI(OllamaAPI):
+    """``OllamaAPI`` over a ``Router``: every request goes to the endpoint it picks.
+
+    A request that fails before any text arrived is retried on the next
+    candidate, so an instance dying mid-session costs no more than one
+    failed connection attempt. Text already streamed cannot be taken back,
+    so a stream cut after its first chunk ends with the error as usual.
+    """
+
+    def __init__(self, router, **kwargs):
+        super().__init__(base_url=router.endpoints[0].base_url, **kwargs)
+        self.router = router
+        # The cache, if any, sits in front of the routing, not in each endpoint;
+        # failing over beats retrying a dead instance with backoff
+        options = {key: value for key, value in kwargs.items() if key != "cache"}
+        options["retries"] = 0
+        self._clients = {endpoint.base_url: OllamaAPI(base_url=endpoint.base_url, **options)
+                         for endpoint in router.endpoints}
+
+    def _client(self, endpoint):
+        return self._clients[endpoint.base_url]
+
+    def get_available_models(self):
+        return self.router.models()
+
+    list_models = get_available_models
+
+    def show_model(self, name):
+        info = {"error": f"Failed to fetch model info: no instance has {name}"}
+        for endpoint in self.router.candidates(name):
+            info = self._client(endpoint).show_model(name)
+            if "error" not in info:
+                return info
+        return info
+
+    def running_models(self):
+        running = []
+        for endpoint in self.router.endpoints:
+            models = self._client(endpoint).running_models()
+            if isinstance(models, list):
+                running += [dict(model, endpoint=endpoint.base_url) for model in models]
+        return running
+
+    def unload_model(self, model=None):
+        model = model or self.model
+        result = "", {}
+        for endpoint in self.router.holding(model):
+            result = self._client(endpoint).unload_model(model)
+            self.router.forget(endpoint, model)
+        return result
+
+    def _fetch(self, path, payload):
+        model = payload.get("model")
+        text, stats = "Error: No Ollama instance configured", {}
+        for endpoint in self.router.candidates(model):
+            self.router.begin(endpoint)
+            text, stats = self._client(endpoint)._fetch(path, payload)
+            self.router.end(endpoint, model, text)
+            if not text.startswith("Error:"):
+                break
+        return text, stats
+
+    def _stream(self, path, payload, stats, controls=None):
+        model = payload.get("model")
+        error = "Error: No Ollama instance configured"
+        for endpoint in self.router.candidates(model):
+            self.router.begin(endpoint)
+            last = ""
+            sent = False
+            stream = self._client(endpoint)._stream(path, payload, stats, controls)
+            try:
+                for chunk in stream:
+                    last = chunk
+                    if chunk.startswith("Error:") and not sent:
+                        error = chunk
+                        break
+                    sent = True
+                    yield chunk
+            finally:
+                stream.close()
+                self.router.end(endpoint, model, last)
+            if sent or (controls is not None and controls.reason is not None):
+                return
+        yield error
+
+class RoutedAsyncOllamaAPI(AsyncOllamaAPI):
+    """``AsyncOllamaAPI`` over a ``Router``, with the same failover as ``RoutedOllamaAPI``.
+
+    Each endpoint has its own connection pool and concurrency limit.
+    """
+
+    def __init__(self, router, **kwargs):
+        super().__init__(base_url=router.endpoints[0].base_url, **kwargs)
+        self.router = router
+        options = {key: value for key, value in kwargs.items() if key != "cache"}
+        self._clients = {endpoint.base_url: AsyncOllamaAPI(base_url=endpoint.base_url, **options)
+                         for endpoint in router.endpoints}
+
+    def _client(self, endpoint):
+        return self._clients[endpoint.base_url]
+
+    async def list_models(self):
+        return await asyncio.get_running_loop().run_in_executor(None, self.router.models)
+
+    async def show_model(self, name):
+        info = {"error": f"Failed to fetch model info: no instance has {name}"}
+        for endpoint in self.router.candidates(name):
+            info = await self._client(endpoint).show_model(name)
+            if "error" not in info:
+                return info
+        return info
+
+    async def running_models(self):
+        results = await asyncio.gather(*(self._client(e).running_models() for e in self.router.endpoints))
+        running = []
+        for endpoint, models in zip(self.router.endpoints, results):
+            if isinstance(models, list):
+                running += [dict(model, endpoint=endpoint.base_url) for model in models]
+        return running
+
+    async def unload_model(self, model=None):
+        model = model or self.model
+        result = "", {}
+        for endpoint in self.router.holding(model):
+            result = await self._client(endpoint).unload_model(model)
+            self.router.forget(endpoint, model)
+        return result
+
+    async def _fetch(self, path, payload):
+        model = payload.get("model")
+        text, stats = "Error: No Ollama instance configured", {}
+        for endpoint in self.router.candidates(model):
+            self.router.begin(endpoint)
+            text, stats = await self._client(endpoint)._fetch(path, payload)
+            self.router.end(endpoint, model, text)
+            if not text.startswith("Error:"):
+                break
+        return text, stats
+
+    async def _stream(self, path, payload, stats, controls=None):
+        model = payload.get("model")
+        error = "Error: No Ollama instance configured"
+        for endpoint in self.router.candidates(model):
+            self.router.begin(endpoint)
+            last = ""
+            sent = False
+            stream = self._client(endpoint)._stream(path, payload, stats, controls)
+            try:
+                async for chunk in stream:
+                    last = chunk
+                    if chunk.startswith("Error:") and not sent:
+                        error = chunk
+                        break
+                    sent = True
+                    yield chunk
+            finally:
+                await stream.aclose()
+                self.router.end(endpoint, model, last)
+            if sent or (controls is not None and controls.reason is not None):
+                return
+        yield error
+
+    async def aclose(self):
+        for client in self._clients.values():
+            await client.aclose()